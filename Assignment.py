@@ -0,0 +1,334 @@
+import re
+from bisect import bisect_left
+
+from Package import Package, PackageStatus, deadline_to_minutes
+from Data import Data
+
+TRUCK_ONLY_PATTERN = re.compile(r"only be on truck\s+(\d+)", re.IGNORECASE)
+DELAYED_PATTERN = re.compile(r"until\s+(\d{1,2}:\d{2}\s*[ap]m)", re.IGNORECASE)
+GROUPED_PATTERN = re.compile(r"must be delivered with\s+([\d,\s]+)", re.IGNORECASE)
+WRONG_ADDRESS_PATTERN = re.compile(r"wrong address", re.IGNORECASE)
+
+
+# PackageRule holds the constraints from a package's note, parsed once
+class PackageRule:
+    def __init__(self, truck_only=None, available_at=None, grouped_with=(), wrong_address=False):
+        self.truck_only = truck_only  # the only truck the package may go on
+        self.available_at = available_at  # minutes after midnight the package reaches the HUB
+        self.grouped_with = grouped_with  # IDs of packages that must go on the same truck
+        self.wrong_address = wrong_address  # held back until the address is corrected
+
+
+# given a package note, returns the PackageRule it describes
+# O(1)
+def parse_note(note):
+    truck_only = None
+    available_at = None
+    grouped_with = ()
+    match = TRUCK_ONLY_PATTERN.search(note)
+    if match:
+        truck_only = int(match.group(1))
+    match = DELAYED_PATTERN.search(note)
+    if match:
+        available_at = deadline_to_minutes(re.sub(r"\s*([AP]M)$", r" \1", match.group(1).upper()))
+    match = GROUPED_PATTERN.search(note)
+    if match:
+        grouped_with = tuple(int(package_id) for package_id in re.findall(r"\d+", match.group(1)))
+    return PackageRule(truck_only, available_at, grouped_with, bool(WRONG_ADDRESS_PATTERN.search(note)))
+
+
+# TruckPlan describes one truck load to be filled: its truck, how many packages it holds and when it leaves
+class TruckPlan:
+    def __init__(self, truck_id, capacity=16, departure_minutes=8 * 60):
+        self.truck_id = truck_id
+        self.capacity = capacity
+        self.departure_minutes = departure_minutes
+
+
+# Unit is a set of packages that must travel together, on one truck, because their notes group them
+class Unit:
+    def __init__(self, packages: [Package], rules, data: Data):
+        self.packages = packages
+        self.address_index = min(data.get_address_index(package.get_address()) for package in packages)
+        self.truck_only = None
+        self.available_at = 0
+        self.deadline = None
+        for package in packages:
+            rule = rules[package.get_id()]
+            if rule.truck_only is not None:
+                if self.truck_only is not None and self.truck_only != rule.truck_only:
+                    raise ValueError("packages grouped with package " + str(package.get_id())
+                                     + " are restricted to different trucks")
+                self.truck_only = rule.truck_only
+            if rule.available_at is not None:
+                self.available_at = max(self.available_at, rule.available_at)
+            deadline = package.get_deadline_minutes()
+            if deadline is not None and (self.deadline is None or deadline < self.deadline):
+                self.deadline = deadline
+
+    # O(1)
+    def size(self):
+        return len(self.packages)
+
+
+# Cluster is a set of units the savings heuristic has merged to go on one truck
+class Cluster:
+    def __init__(self, unit: Unit):
+        self.units = [unit]
+        self.size = unit.size()
+        self.truck_only = unit.truck_only
+        self.available_at = unit.available_at
+        self.deadline = unit.deadline
+
+    # returns True if the two clusters can go on the same truck of the given capacity
+    # O(1)
+    def can_merge(self, other, capacity):
+        if self.size + other.size > capacity:
+            return False
+        if self.truck_only is not None and other.truck_only is not None and self.truck_only != other.truck_only:
+            return False
+        return True
+
+    # O(U) in the number of units
+    def merge(self, other):
+        self.units.extend(other.units)
+        self.size += other.size
+        if self.truck_only is None:
+            self.truck_only = other.truck_only
+        self.available_at = max(self.available_at, other.available_at)
+        if other.deadline is not None and (self.deadline is None or other.deadline < self.deadline):
+            self.deadline = other.deadline
+
+
+# AssignmentEngine splits the packages at a depot, the HUB unless another address is given, across truck loads
+# note constraints are parsed once into PackageRules; grouped packages become units;
+# units are merged into clusters by Clarke-Wright savings over each unit's nearest units,
+# so packages at the same address, with the largest saving, are merged first;
+# and clusters go, restricted then earliest deadline first, to a truck they are allowed on with room for them
+class AssignmentEngine:
+    def __init__(self, data: Data, neighbour_count=10, depot="HUB"):
+        self.data = data
+        self.neighbour_count = neighbour_count
+        self.depot_index = data.get_address_index(depot)
+        self.truck_plans = []
+        self.departures = {}  # truck ID: departure minutes
+        self.departure_times = []  # every departure minutes, sorted
+
+    # given the packages to assign and a TruckPlan per load,
+    # returns {truck_id: [Package]}, the packages that did not fit, and the packages held for a wrong address
+    # O(N * K log(N * K)) for N packages and K neighbour_count
+    def assign(self, packages: [Package], truck_plans: [TruckPlan]):
+        self.truck_plans = truck_plans
+        self.departures = {truck_plan.truck_id: truck_plan.departure_minutes for truck_plan in truck_plans}
+        self.departure_times = sorted(set(self.departures.values()))
+        rules = {}
+        for package in packages:
+            rules[package.get_id()] = parse_note(package.get_note())
+
+        held = [package for package in packages if rules[package.get_id()].wrong_address]
+        assignable = [package for package in packages if not rules[package.get_id()].wrong_address]
+        units = self.build_units(assignable, rules)
+
+        capacity = max(truck_plan.capacity for truck_plan in truck_plans)
+        clusters = self.build_clusters(units, capacity)
+
+        loads = {truck_plan.truck_id: [] for truck_plan in truck_plans}
+        room = {truck_plan.truck_id: truck_plan.capacity for truck_plan in truck_plans}
+        unassigned = []
+        # clusters restricted to one truck go first, so they are not crowded out by clusters that could go anywhere
+        clusters.sort(key=lambda c: (c.truck_only is None, c.deadline if c.deadline is not None else 24 * 60, -c.size))
+        for cluster in clusters:
+            truck_id = self.choose_truck(cluster, cluster.size, truck_plans, loads, room)
+            if truck_id is not None and (cluster.deadline is None or self.departure_of(truck_id) ==
+                                         self.earliest_departure(cluster.truck_only, cluster.available_at)):
+                for unit in cluster.units:
+                    self.load(unit, truck_id, loads, room)
+                continue
+
+            # the cluster does not fit on any one truck, or only on one leaving later than its deadlines want,
+            # so its units are placed separately, earliest deadline first
+            cluster.units.sort(key=lambda u: u.deadline if u.deadline is not None else 24 * 60)
+            for unit in cluster.units:
+                truck_id = self.choose_truck(Cluster(unit), unit.size(), truck_plans, loads, room)
+                if truck_id is None:
+                    unassigned.extend(unit.packages)
+                else:
+                    self.load(unit, truck_id, loads, room)
+
+        return loads, unassigned, held
+
+    # groups packages into units with a union-find over the groups named in their notes
+    # O(N α(N))
+    def build_units(self, packages: [Package], rules):
+        parent = {package.get_id(): package.get_id() for package in packages}
+
+        def find(package_id):
+            while parent[package_id] != package_id:
+                parent[package_id] = parent[parent[package_id]]
+                package_id = parent[package_id]
+            return package_id
+
+        def union(package_id1, package_id2):
+            if package_id1 in parent and package_id2 in parent:
+                parent[find(package_id1)] = find(package_id2)
+
+        for package in packages:
+            for other_id in rules[package.get_id()].grouped_with:
+                union(package.get_id(), other_id)
+
+        members = {}
+        for package in packages:
+            members.setdefault(find(package.get_id()), []).append(package)
+        return [Unit(unit_packages, rules, self.data) for unit_packages in members.values()]
+
+    # merges units into clusters by Clarke-Wright savings,
+    # d(depot, a) + d(depot, b) - d(a, b), over each unit's neighbour_count nearest units
+    # the nearest units are found among the addresses that have units, sorted by distance from each of them,
+    # and addresses at the same distance in address index order, as in a neighbour list
+    # the sorted addresses are kept only while the clusters are built
+    # O(U^2 log U) for U addresses with units, plus O(N * K log(N * K)) to sort the savings
+    def build_clusters(self, units: [Unit], capacity):
+        hub_index = self.depot_index
+        units_at = {}
+        for i, unit in enumerate(units):
+            units_at.setdefault(unit.address_index, []).append(i)
+
+        distance_matrix = self.data.distance_matrix
+        address_count = self.data.address_count
+        unit_addresses = sorted(units_at)
+        nearest_addresses = {}  # address index: the addresses with units, nearest first
+
+        savings = []
+        for i, unit in enumerate(units):
+            found = 0
+            if unit.address_index not in nearest_addresses:
+                distance_row = unit.address_index * address_count
+                nearest_addresses[unit.address_index] = sorted(
+                    unit_addresses, key=lambda address_index: distance_matrix[distance_row + address_index])
+            for address_index in nearest_addresses[unit.address_index]:
+                for j in units_at[address_index]:
+                    if j <= i:
+                        continue
+                    saving = (self.data.get_distance_by_index(hub_index, unit.address_index)
+                              + self.data.get_distance_by_index(hub_index, units[j].address_index)
+                              - self.data.get_distance_by_index(unit.address_index, units[j].address_index))
+                    savings.append((-saving, i, j))
+                    found += 1
+                if found >= self.neighbour_count:
+                    break
+        savings.sort()
+
+        clusters = [Cluster(unit) for unit in units]
+        owner = list(range(len(units)))
+
+        def find(i):
+            while owner[i] != i:
+                owner[i] = owner[owner[i]]
+                i = owner[i]
+            return i
+
+        # units restricted to the same truck start in one cluster, as they must share that truck anyway
+        first_for_truck = {}
+        for i, unit in enumerate(units):
+            if unit.truck_only is None:
+                continue
+            if unit.truck_only not in first_for_truck:
+                first_for_truck[unit.truck_only] = i
+                continue
+            root = find(first_for_truck[unit.truck_only])
+            if self.can_merge(clusters[root], clusters[i], capacity):
+                clusters[root].merge(clusters[i])
+                owner[i] = root
+
+        for negative_saving, i, j in savings:
+            root_i = find(i)
+            root_j = find(j)
+            if root_i == root_j or not self.can_merge(clusters[root_i], clusters[root_j], capacity):
+                continue
+            clusters[root_i].merge(clusters[root_j])
+            owner[root_j] = root_i
+
+        return [clusters[i] for i in range(len(units)) if find(i) == i]
+
+    # returns True if the two clusters can go on one truck,
+    # without a package with a deadline having to leave later than it could have on its own
+    # O(T) for T trucks
+    def can_merge(self, cluster1: Cluster, cluster2: Cluster, capacity):
+        if not cluster1.can_merge(cluster2, capacity):
+            return False
+        truck_only = cluster1.truck_only if cluster1.truck_only is not None else cluster2.truck_only
+        available_at = max(cluster1.available_at, cluster2.available_at)
+        departure = self.earliest_departure(truck_only, available_at)
+        for cluster in (cluster1, cluster2):
+            if cluster.deadline is not None and departure != self.earliest_departure(cluster.truck_only,
+                                                                                     cluster.available_at):
+                return False
+        return departure is not None
+
+    # returns the earliest departure of a truck that a cluster with the given restrictions may go on,
+    # or None if there is no such truck
+    # O(log T)
+    def earliest_departure(self, truck_only, available_at):
+        if truck_only is not None:
+            departure = self.departures.get(truck_only)
+            return departure if departure is not None and departure >= available_at else None
+        i = bisect_left(self.departure_times, available_at)
+        return self.departure_times[i] if i < len(self.departure_times) else None
+
+    # O(1)
+    def departure_of(self, truck_id):
+        return self.departures.get(truck_id)
+
+    # returns the truck a cluster of the given size should go on, or None if none can take it
+    # a cluster with a deadline goes on the earliest truck it may use;
+    # other clusters go on the truck whose load is nearest to them
+    # O(T * L) for T trucks with L addresses loaded
+    def choose_truck(self, cluster: Cluster, size, truck_plans: [TruckPlan], loads, room):
+        best_truck_id = None
+        best_key = None
+        for truck_plan in truck_plans:
+            truck_id = truck_plan.truck_id
+            if room[truck_id] < size:
+                continue
+            if cluster.truck_only is not None and cluster.truck_only != truck_id:
+                continue
+            if truck_plan.departure_minutes < cluster.available_at:
+                continue
+            if cluster.deadline is not None:
+                key = (truck_plan.departure_minutes, -room[truck_id])
+            else:
+                key = (self.distance_to_load(cluster, loads[truck_id]), truck_plan.departure_minutes)
+            if best_key is None or key < best_key:
+                best_key = key
+                best_truck_id = truck_id
+        return best_truck_id
+
+    # returns the distance from a cluster to the nearest package already loaded, or from the depot if none are
+    # O(L)
+    def distance_to_load(self, cluster: Cluster, load: [Package]):
+        address_index = cluster.units[0].address_index
+        if not load:
+            return self.data.get_distance_by_index(self.depot_index, address_index)
+        return min(self.data.get_distance_by_index(address_index, self.data.get_address_index(p.get_address()))
+                   for p in load)
+
+    # O(U) in the unit's size
+    def load(self, unit: Unit, truck_id, loads, room):
+        loads[truck_id].extend(unit.packages)
+        room[truck_id] -= unit.size()
+
+
+# fills data.package_list1, package_list2 and package_list3 with the AssignmentEngine,
+# in place of the note and nearest-package rules of Data.determine_package_lists
+# truck_plans describe the three loads, with truck_id being the package list number
+# only packages still at the HUB are assigned; returns the packages that could not be
+# O(N * K log(N * K))
+def assign_package_lists(data: Data, truck_plans: [TruckPlan], neighbour_count=10):
+    packages = [package for package in data.hash_table if package.get_status_code() == PackageStatus.AT_HUB]
+    loads, unassigned, held = AssignmentEngine(data, neighbour_count).assign(packages, truck_plans)
+    package_lists = {1: data.package_list1, 2: data.package_list2, 3: data.package_list3}
+    for truck_id, load in loads.items():
+        for package in load:
+            package.load_package()
+            package_lists[truck_id].append(package)
+    return unassigned + held
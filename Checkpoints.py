@@ -0,0 +1,140 @@
+# writes the state of every package and truck at each of several times of the simulated day
+# run with: python Checkpoints.py 0900 1000 1230 [--output checkpoints.csv]
+# times are in 24-hour HHMM format; the day is simulated once, and each checkpoint is written as soon as it is read,
+# to a CSV file, or to a JSON Lines file if the output ends in .jsonl
+#
+# each row is one package or one truck at one checkpoint, with the columns
+# time,kind,id,status,address,route,miles,delivered
+# a package row has its status and address; a truck row has its status, "at hub" or "en route",
+# the route it is driving or last drove, the miles it has driven and the packages it has delivered
+
+import argparse
+import bisect
+import csv
+import datetime
+import json
+
+from Data import Data
+from Scheduler import DeliveryDay
+from StatusService import StatusTimeline, simulate_day
+from Scenarios import parse_time
+
+FIELDS = ["time", "kind", "id", "status", "address", "route", "miles", "delivered"]
+
+
+# CsvCheckpointWriter writes checkpoint rows to an open file as CSV, under a header row
+class CsvCheckpointWriter:
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = checkpoint_file
+        self.writer = csv.writer(checkpoint_file, lineterminator='\n')
+        self.writer.writerow(FIELDS)
+
+    # O(1)
+    def write(self, row):
+        self.writer.writerow([row.get(field, "") for field in FIELDS])
+
+    # O(1)
+    def flush(self):
+        self.checkpoint_file.flush()
+
+
+# JsonLinesCheckpointWriter writes checkpoint rows to an open file as one JSON object per line
+class JsonLinesCheckpointWriter:
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = checkpoint_file
+
+    # O(1)
+    def write(self, row):
+        self.checkpoint_file.write(json.dumps(row) + "\n")
+
+    # O(1)
+    def flush(self):
+        self.checkpoint_file.flush()
+
+
+# returns the writer for an open file, JSON Lines if its path ends in .jsonl and CSV otherwise
+# O(1)
+def make_checkpoint_writer(checkpoint_file, file_path):
+    if file_path.endswith(".jsonl"):
+        return JsonLinesCheckpointWriter(checkpoint_file)
+    return CsvCheckpointWriter(checkpoint_file)
+
+
+# TruckStates answers where each truck of a simulated day was, and what it had done, at a given time
+# trucks drive without stopping, so the miles a truck has driven follow from the minutes since it left
+class TruckStates:
+    # O(N log N) in the number of packages
+    def __init__(self, day: DeliveryDay):
+        self.day = day
+        self.truck_routes = {}  # truck ID: [route number] in the order they left
+        self.delivery_times = {}  # route number: sorted delivery times of its packages
+        for route_number in sorted(day.truck_routes, key=lambda number: day.departure_times[number]):
+            truck_route = day.truck_routes[route_number]
+            self.truck_routes.setdefault(truck_route.truck_id, []).append(route_number)
+            delivery_times = []
+            for node in truck_route.route.get_nodes():
+                delivery_time = day.data.lookup_package(node.package_id).get_delivery_time()
+                if delivery_time != -1:
+                    delivery_times.append(delivery_time)
+            self.delivery_times[route_number] = sorted(delivery_times)
+
+    # returns a checkpoint row for each truck that leaves during the day, in truck ID order
+    # O(R log N) for R routes
+    def rows_at(self, time: datetime.datetime):
+        rows = []
+        for truck_id, route_numbers in sorted(self.truck_routes.items()):
+            status = "at hub"
+            last_route = None
+            miles = 0.0
+            delivered = 0
+            for route_number in route_numbers:
+                departure = self.day.departure_times[route_number]
+                if departure > time:
+                    break
+                last_route = route_number
+                truck_route = self.day.truck_routes[route_number]
+                hub_return = self.day.hub_return_times.get(route_number)
+                if hub_return is None or hub_return > time:
+                    status = "en route"
+                    # the truck moves on the minute it leaves
+                    minutes = int((time - departure).total_seconds() // 60) + 1
+                    miles += min(truck_route.route.sum_length(), minutes * truck_route.MILES_PER_MINUTE)
+                else:
+                    miles += truck_route.route.sum_length()
+                delivered += bisect.bisect_right(self.delivery_times[route_number], time)
+            rows.append({"kind": "truck", "id": truck_id, "status": status,
+                         "route": "" if last_route is None else last_route,
+                         "miles": round(miles, 1), "delivered": delivered})
+        return rows
+
+
+# writes a checkpoint of every package and truck at each of the sorted times,
+# flushing the writer after each one, and returns the number of rows written
+# O(T * (P + R log N) + E) for T times, P packages and E timeline entries
+def write_checkpoints(day: DeliveryDay, timeline: StatusTimeline, times, writer):
+    truck_states = TruckStates(day)
+    row_count = 0
+    for time, package_states in timeline.sweep(times):
+        time_text = datetime.datetime.strftime(time, "%H:%M")
+        for package_id, status, address in package_states:
+            writer.write({"time": time_text, "kind": "package", "id": package_id, "status": status,
+                          "address": address})
+        for row in truck_states.rows_at(time):
+            writer.write({"time": time_text, **row})
+        row_count += len(package_states) + len(truck_states.truck_routes)
+        writer.flush()
+    return row_count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write package and truck checkpoints for the simulated day.")
+    parser.add_argument("times", nargs="+", help="checkpoint times in HHMM format")
+    parser.add_argument("--output", default="checkpoints.csv", help="a .csv or .jsonl file")
+    args = parser.parse_args()
+
+    checkpoint_times = sorted(parse_time(hhmm) for hhmm in args.times)
+    checkpoint_day = simulate_day(Data(snapshot_file='data_snapshot.bin'))
+    with open(args.output, mode='w', encoding='utf-8', newline='') as output_file:
+        rows = write_checkpoints(checkpoint_day, StatusTimeline(checkpoint_day), checkpoint_times,
+                                 make_checkpoint_writer(output_file, args.output))
+    print(rows, "rows written to", args.output)
@@ -0,0 +1,171 @@
+# writes synthetic address_list.csv, distance_data.csv and package_data.csv files
+# run with: python CityGenerator.py directory [--addresses N] [--packages N] [--seed N] [--roads] [--no-distances]
+# the same seed always gives the same files
+#
+# addresses are points on a grid of tenth-mile blocks, and the distance between two addresses
+# is the city-block distance between them, so every distance is an exact tenth of a mile
+# and the distances are a metric: d(a, c) <= d(a, b) + d(b, c)
+# the HUB is the first address, as in address_list.csv
+# each row of address_list.csv has the address's x and y in miles after it, for Data's coordinates mode,
+# where the "grid" metric gives the same distances as distance_data.csv, see SpatialIndex.py;
+# with --no-distances, distance_data.csv is not written, for cities too large for a full distance table
+# with --roads, a roads.csv road graph of the city's streets is written too, see RoadGraph.py,
+# a tenth-mile block between each pair of neighbouring grid points, whose shortest paths are those distances
+#
+# the deadlines and notes of the packages are mixed in about the proportions of package_data.csv
+
+import argparse
+import csv
+import math
+import os
+import random
+
+STREET_NAMES = ["Main St", "State St", "Oakland Ave", "Canyon Rd", "Parkway Blvd", "Dalton Ave S",
+                "Bringhurst St", "Barton Blvd", "Research Way", "Taylorsville Blvd"]
+
+# the share of packages with each deadline, the rest being due at the end of the day
+DEADLINE_SHARES = [("9:00 AM", 0.025), ("10:30 AM", 0.3)]
+
+# the share of packages with each kind of note, the rest having none
+TRUCK_ONLY_SHARE = 0.05
+DELAYED_SHARE = 0.1
+WRONG_ADDRESS_SHARE = 0.025
+# one package in GROUP_EVERY starts a group of three that must be delivered together
+GROUP_EVERY = 40
+
+DELAYED_NOTE = "Delayed on flight---will not arrive to depot until 9:05 am"
+WRONG_ADDRESS_NOTE = "Wrong address listed"
+TRUCK_CAPACITY = 16
+
+
+# returns address_count distinct points, in tenths of a mile, on a square span_miles across
+# O(N)
+def generate_points(address_count, generator: random.Random, span_miles=15.0):
+    span = max(int(span_miles * 10), math.isqrt(address_count) + 1)
+    points = [(span // 2, span // 2)]
+    seen = set(points)
+    while len(points) < address_count:
+        point = (generator.randrange(span + 1), generator.randrange(span + 1))
+        if point not in seen:
+            seen.add(point)
+            points.append(point)
+    return points
+
+
+# returns the name of each address, starting with the HUB
+# O(N)
+def generate_addresses(address_count, generator: random.Random):
+    addresses = ["HUB"]
+    for i in range(1, address_count):
+        addresses.append(str(100 * i + generator.randrange(100)) + " " + generator.choice(STREET_NAMES))
+    return addresses
+
+
+# yields the rows of a package manifest laid out like package_data.csv
+# packages are spread over every address but the HUB
+# truck-only notes name one of the trucks needed to carry every package
+# O(N)
+def generate_package_rows(addresses, package_count, generator: random.Random):
+    truck_count = max(1, math.ceil(package_count / TRUCK_CAPACITY))
+    for package_id in range(1, package_count + 1):
+        address_index = generator.randrange(1, len(addresses))
+        address = addresses[address_index]
+        zipcode = str(84100 + address_index % 100)
+
+        deadline = "EOD"
+        roll = generator.random()
+        for deadline_text, share in DEADLINE_SHARES:
+            if roll < share:
+                deadline = deadline_text
+                break
+            roll -= share
+
+        # the other two packages of a group have no note of their own
+        note = ""
+        roll = generator.random()
+        if package_id % GROUP_EVERY == 1 and package_id + 2 <= package_count:
+            note = "Must be delivered with " + str(package_id + 1) + ", " + str(package_id + 2)
+        elif package_id % GROUP_EVERY in (2, 3) and package_id > 1:
+            pass
+        elif roll < TRUCK_ONLY_SHARE:
+            note = "Can only be on truck " + str(generator.randrange(1, truck_count + 1))
+        elif roll < TRUCK_ONLY_SHARE + DELAYED_SHARE:
+            note = DELAYED_NOTE
+        elif roll < TRUCK_ONLY_SHARE + DELAYED_SHARE + WRONG_ADDRESS_SHARE:
+            note = WRONG_ADDRESS_NOTE
+
+        yield [str(package_id), address, "Salt Lake City", "UT", zipcode, deadline,
+               str(generator.randrange(1, 89)), note]
+
+
+# writes address, distance and package CSV files for a city of address_count addresses into directory,
+# and returns their paths
+# returns the paths of the files written, with None for distance_data.csv when distances is False
+# O(A^2 + P) for A addresses and P packages, O(A + P) without distances
+def write_city_files(directory, address_count, package_count, seed=0, distances=True):
+    generator = random.Random(seed)
+    points = generate_points(address_count, generator)
+    addresses = generate_addresses(address_count, generator)
+
+    address_file = os.path.join(directory, 'address_list.csv')
+    distance_file = os.path.join(directory, 'distance_data.csv') if distances else None
+    package_file = os.path.join(directory, 'package_data.csv')
+    with open(address_file, 'w') as address_csv:
+        for address, (x, y) in zip(addresses, points):
+            address_csv.write('"' + address + '",' + str(x / 10) + ',' + str(y / 10) + '\n')
+    if distances:
+        with open(distance_file, 'w') as distance_csv:
+            padding = [''] * address_count
+            for i, (x1, y1) in enumerate(points):
+                row = [str((abs(x1 - x2) + abs(y1 - y2)) / 10) for x2, y2 in points[:i + 1]]
+                distance_csv.write(','.join(row + padding[i + 1:]) + '\n')
+    with open(package_file, 'w', newline='') as package_csv:
+        package_writer = csv.writer(package_csv, lineterminator='\n')
+        package_writer.writerows(generate_package_rows(addresses, package_count, generator))
+    return address_file, distance_file, package_file
+
+
+# writes roads.csv into directory, the road graph of the streets of the city write_city_files writes for the same
+# address count and seed, and returns its path
+# grid points with an address are named by it, and the others by their position
+# O(S^2) for a city S blocks across
+def write_road_file(directory, address_count, seed=0):
+    generator = random.Random(seed)
+    points = generate_points(address_count, generator)
+    addresses = generate_addresses(address_count, generator)
+    span = max(x for x, y in points + [(0, 0)])
+    span = max(span, max(y for x, y in points))
+    names = {point: address for point, address in zip(points, addresses)}
+
+    def name(x, y):
+        return names.get((x, y)) or "X" + str(x) + " Y" + str(y)
+
+    road_file = os.path.join(directory, 'roads.csv')
+    with open(road_file, 'w', newline='') as road_csv:
+        road_writer = csv.writer(road_csv, lineterminator='\n')
+        road_writer.writerow(["from", "to", "miles"])
+        for x in range(span + 1):
+            for y in range(span + 1):
+                if x < span:
+                    road_writer.writerow([name(x, y), name(x + 1, y), "0.1"])
+                if y < span:
+                    road_writer.writerow([name(x, y), name(x, y + 1), "0.1"])
+    return road_file
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a synthetic city and package manifest.")
+    parser.add_argument("directory")
+    parser.add_argument("--addresses", type=int, default=27)
+    parser.add_argument("--packages", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--roads", action="store_true", help="also write a road graph of the city")
+    parser.add_argument("--no-distances", action="store_true", help="do not write distance_data.csv")
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    for path in write_city_files(args.directory, args.addresses, args.packages, args.seed, not args.no_distances):
+        if path is not None:
+            print(path)
+    if args.roads:
+        print(write_road_file(args.directory, args.addresses, args.seed))
@@ -1,163 +1,441 @@
+import copy
 import csv
 import datetime
+from array import array
 
-from Package import Package
+from Package import Package, PackageStatus
+from PackageTable import PackageTable
+from Snapshot import is_snapshot_fresh, load_snapshot, write_snapshot
+from DistanceKernels import make_kernels
+from RoadGraph import read_road_graph, manifest_addresses, build_road_distance_matrix, RowCache
+from SpatialIndex import read_coordinates, LazyDistanceMatrix, UniformGrid, NeighbourList
+
+
+# the first package list is filled with packages due at this time, in minutes after midnight
+TEN_THIRTY_AM = 10 * 60 + 30
+
+
+# given a file path or an open file object, yields the rows of that CSV file one at a time
+# a file opened here is closed once every row has been read
+# O(N), holding one row at a time
+def iter_csv_rows(source):
+    if hasattr(source, 'read'):
+        yield from csv.reader(source, delimiter=',')
+    else:
+        with open(source, mode='r', encoding='utf-8-sig', newline='') as csv_file:
+            yield from csv.reader(csv_file, delimiter=',')
 
 
 # populate address list with data from address_list.csv
 # O(N)
-def populate_address_list(address_list):
-    with open('address_list.csv', mode='r', encoding='utf-8-sig') as address_file:
-        address_reader = csv.reader(address_file, delimiter=',')
-        for row in address_reader:
-            address_list.append(row[0])
+def populate_address_list(address_list, file_path='address_list.csv'):
+    for row in iter_csv_rows(file_path):
+        address_list.append(row[0])
 
 
 # populate distance table with data from distance_data.csv
 # O(N)
-def populate_distance_table(distance_table):
-    with open('distance_data.csv', mode='r', encoding='utf-8-sig') as distance_file:
-        distance_reader = csv.reader(distance_file, delimiter=',')
-        for row in distance_reader:
-            distance_table.append(row)
+def populate_distance_table(distance_table, file_path='distance_data.csv'):
+    for row in iter_csv_rows(file_path):
+        distance_table.append(row)
+
+
+# builds a dictionary mapping each address to its row in the distance table
+# O(N)
+def build_address_index(address_list):
+    address_index = {}
+    for i, address in enumerate(address_list):
+        address_index[address] = i
+    return address_index
+
+
+# builds a flat, symmetric matrix of floats from the lower-triangular distance table
+# the distance between addresses i and j is stored at i * N + j and j * N + i
+# O(N^2)
+def build_distance_matrix(distance_table):
+    size = len(distance_table)
+    distance_matrix = array('d', bytes(8 * size * size))
+    for i in range(size):
+        for j in range(i + 1):
+            if distance_table[i][j]:
+                distance = float(distance_table[i][j])
+            else:
+                distance = float(distance_table[j][i])
+            distance_matrix[i * size + j] = distance
+            distance_matrix[j * size + i] = distance
+    return distance_matrix
+
+
+# given a row of package_data.csv, returns the Package it describes
+# raises ValueError if the row is malformed
+# O(1)
+def parse_package_row(row):
+    if len(row) < 8:
+        raise ValueError("expected 8 columns, found " + str(len(row)))
+    package_id = int(row[0])
+    if package_id <= 0:
+        raise ValueError("package ID must be positive, found " + str(package_id))
+    address = row[1]
+    if not address:
+        raise ValueError("package " + str(package_id) + " has no address")
+    city = row[2]
+    state = row[3]
+    zipcode = row[4]
+    deadline = row[5]
+    weight = int(row[6])
+    note = row[7]
+    return Package(package_id, address, city, state, zipcode, deadline, weight, note)
+
+
+# reads packages from a file path or file object laid out like package_data.csv,
+# and yields them in lists of up to batch_size as each list fills,
+# so only one batch is held by the reader however large the file is
+# malformed rows raise ValueError
+# O(N)
+def read_package_batches(source, batch_size=1000):
+    batch = []
+    for line_number, row in enumerate(iter_csv_rows(source), start=1):
+        if not row:
+            continue
+        try:
+            batch.append(parse_package_row(row))
+        except ValueError as error:
+            raise ValueError("line " + str(line_number) + ": " + str(error)) from error
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 
 # populate hash table with data from package_data.csv
 # O(N)
-def populate_hash_table(hash_table):
-    with open('package_data.csv', mode='r', encoding='utf-8-sig') as package_file:
-        package_reader = csv.reader(package_file, delimiter=',')
-        for row in package_reader:
-            package_id = int(row[0])
-            address = row[1]
-            city = row[2]
-            state = row[3]
-            zipcode = row[4]
-            deadline = row[5]
-            weight = int(row[6])
-            note = row[7]
-            p = Package(package_id, address, city, state, zipcode, deadline, weight, note)
+def populate_hash_table(hash_table, file_path='package_data.csv'):
+    for batch in read_package_batches(file_path):
+        for p in batch:
             insert_package_into_hash_table(p, hash_table)
 
 
 # inserts Package object into hash_table
-# O(N)
-def insert_package_into_hash_table(package: Package, hash_table):
-    # determine bucket
-    bucket = hash(package.get_id()) % len(hash_table)
-    bucket_list = hash_table[bucket]
-
-    # insert
-    bucket_list.append([package.get_id(), package])
+# O(1) average
+def insert_package_into_hash_table(package: Package, hash_table: PackageTable):
+    hash_table.insert(package)
 
 
 # Data class handles all data about packages, locations, and distances
 class Data:
     # initializes Data class
-    # O(N)
-    def __init__(self):
+    # the packages in package_file are read straight away
+    # with package_file set to None, packages can be streamed in later through ingest_packages
+    # with snapshot_file set, the parsed tables are loaded from that snapshot if it is up to date,
+    # and otherwise parsed from the CSV files and written to it for next time
+    # distance_table, the CSV cells, is only filled when the CSV files are parsed
+    # kernel_backend picks the DistanceKernels used for nearest-package searches and route lengths
+    # with road_graph_file set, distances are the shortest paths over that road graph, see RoadGraph.py,
+    # distance_file is not read, and only the HUB and the addresses in package_file are kept
+    # with road_rows set as well, the distances are found on demand as they are needed rather than all at once,
+    # keeping the shortest paths from the road_rows addresses routed from most recently, see RowCache;
+    # snapshot_file is not read, and only the Python kernels can be used
+    # with coordinates set to a metric of SpatialIndex.py, distances are computed from coordinates in address_file
+    # as they are needed, and nearest searches use a grid index over them, see SpatialIndex.py;
+    # distance_file and snapshot_file are not read, and only the Python kernels can be used
+    # with package_store set to a PackageStore, package states are kept in it, see PackageStore.py,
+    # and if it already holds packages, they are loaded from it, in the state they were left in,
+    # rather than from package_file
+    # O(N) from a snapshot, O(N^2) from the CSV files, O(N * E log V) from a road graph,
+    # O(N + E) with road_rows, O(N) from coordinates
+    def __init__(
+            self,
+            address_file='address_list.csv',
+            distance_file='distance_data.csv',
+            package_file='package_data.csv',
+            snapshot_file=None,
+            kernel_backend='python',
+            road_graph_file=None,
+            road_rows=None,
+            coordinates=None,
+            package_store=None):
         self.address_list = []
         self.distance_table = []
-        self.hash_table = []
-
-        for i in range(10):
-            self.hash_table.append([])
-        populate_address_list(self.address_list)
-        populate_distance_table(self.distance_table)
-        populate_hash_table(self.hash_table)
+        self.hash_table = PackageTable()
+        self.rejected_rows = []
+        self.snapshot = None
+        self.spatial_index = None
+        self.package_store = package_store
+
+        resume = package_store is not None and package_store.package_count() > 0
+        if resume:
+            for p in package_store.load_packages():
+                insert_package_into_hash_table(p, self.hash_table)
+        read_packages = package_file is not None and not resume
+
+        source_files = [address_file, road_graph_file or distance_file, package_file]
+        if coordinates:
+            if kernel_backend == 'numpy':
+                raise ValueError("the numpy backend needs a distance matrix, not coordinates")
+            kernel_backend = 'python'
+            populate_address_list(self.address_list, address_file)
+            points = read_coordinates(address_file, coordinates)
+            if read_packages:
+                populate_hash_table(self.hash_table, package_file)
+            self.distance_matrix = LazyDistanceMatrix(points, coordinates)
+            self.spatial_index = UniformGrid(points)
+        elif road_graph_file and road_rows:
+            if kernel_backend == 'numpy':
+                raise ValueError("the numpy backend needs a distance matrix, not on-demand road distances")
+            kernel_backend = 'python'
+            populate_address_list(self.address_list, address_file)
+            if read_packages:
+                populate_hash_table(self.hash_table, package_file)
+            if package_file is not None or resume:
+                self.address_list = manifest_addresses(self.address_list, self.hash_table)
+            self.distance_matrix = RowCache(read_road_graph(road_graph_file), self.address_list, road_rows)
+        elif snapshot_file and is_snapshot_fresh(snapshot_file, source_files):
+            self.snapshot, self.address_list, self.distance_matrix, packages = load_snapshot(snapshot_file)
+            for p in packages if not resume else ():
+                insert_package_into_hash_table(p, self.hash_table)
+        elif road_graph_file:
+            populate_address_list(self.address_list, address_file)
+            if read_packages:
+                populate_hash_table(self.hash_table, package_file)
+            if package_file is not None or resume:
+                self.address_list = manifest_addresses(self.address_list, self.hash_table)
+            self.distance_matrix = build_road_distance_matrix(read_road_graph(road_graph_file), self.address_list)
+            if snapshot_file:
+                write_snapshot(snapshot_file, source_files, self.address_list, self.distance_matrix,
+                               list(self.hash_table))
+        else:
+            populate_address_list(self.address_list, address_file)
+            populate_distance_table(self.distance_table, distance_file)
+            if read_packages:
+                populate_hash_table(self.hash_table, package_file)
+
+            # parsed once here so lookups never scan address_list or call float()
+            self.distance_matrix = build_distance_matrix(self.distance_table)
+            if snapshot_file:
+                write_snapshot(snapshot_file, source_files, self.address_list, self.distance_matrix,
+                               list(self.hash_table))
+
+        self.address_index = build_address_index(self.address_list)
+        self.address_count = len(self.address_list)
+        self.kernel_backend = kernel_backend
+        self.kernels = make_kernels(self.distance_matrix, self.address_count, kernel_backend)
+        if package_store is not None and not resume:
+            package_store.insert_packages(self.hash_table)
+
+        # neighbour lists are sorted lazily, the first time an address is routed from
+        self.neighbour_lists = {}
 
         self.package_list1 = []
         self.package_list2 = []
         self.package_list3 = []
 
-    # Given a package ID, return that package
+    # returns a new Data with its own copy of every package and empty package lists
+    # the address and distance tables are read-only, so they are shared rather than parsed again
+    # the copy keeps no package store, as its packages are its own
     # O(N)
+    def copy(self):
+        data = Data.__new__(Data)
+        data.address_list = self.address_list
+        data.distance_table = self.distance_table
+        data.address_index = self.address_index
+        data.distance_matrix = self.distance_matrix
+        data.address_count = self.address_count
+        data.kernel_backend = self.kernel_backend
+        data.kernels = self.kernels
+        data.neighbour_lists = self.neighbour_lists
+        data.spatial_index = self.spatial_index
+        data.package_store = None
+        data.snapshot = self.snapshot
+        data.rejected_rows = []
+        data.hash_table = PackageTable(len(self.hash_table) * 2)
+        for package in self.hash_table:
+            data.hash_table.insert(copy.copy(package))
+        data.package_list1 = []
+        data.package_list2 = []
+        data.package_list3 = []
+        return data
+
+    # a distance matrix mapped from a snapshot or shared memory cannot be pickled,
+    # so a Data sent to another process takes a copy of it,
+    # unless it is attached to SharedTables, when the other process attaches to them too
+    # the kernels view the matrix, so they are made again on the other side
+    # neighbour lists taken from a grid index are part read, so the other side starts its own,
+    # and a package store's connection stays with this process
+    # O(N^2) with a snapshot, O(1) attached to SharedTables, O(N) otherwise
+    def __getstate__(self):
+        if getattr(self, 'shared_tables', None) is not None:
+            return {'shared_tables': self.shared_tables, 'kernel_backend': self.kernel_backend}
+        state = self.__dict__.copy()
+        del state['kernels']
+        state['package_store'] = None
+        if self.spatial_index is not None:
+            state['neighbour_lists'] = {}
+        elif not isinstance(self.distance_matrix, array):
+            state['snapshot'] = None
+            state['distance_matrix'] = array('d', self.distance_matrix)
+        if not isinstance(self.address_index, dict):
+            state['address_index'] = build_address_index(self.address_list)
+        return state
+
+    # O(1)
+    def __setstate__(self, state):
+        if 'shared_tables' in state:
+            self.__dict__.update(state['shared_tables'].attach_data(state['kernel_backend']).__dict__)
+            return
+        self.__dict__.update(state)
+        self.kernels = make_kernels(self.distance_matrix, self.address_count, self.kernel_backend)
+
+    # reads packages from a file path or file object in batches of batch_size,
+    # adds each batch to the hash table as it fills, and yields it
+    # routing can start on a batch while later batches are still unread
+    # rows that are malformed, repeat a package ID or have an unknown address
+    # are recorded in rejected_rows as (line number, reason) and skipped
+    # O(N), holding one batch of rows at a time
+    def ingest_packages(self, source, batch_size=1000):
+        batch = []
+        for line_number, row in enumerate(iter_csv_rows(source), start=1):
+            if not row:
+                continue
+            try:
+                package = parse_package_row(row)
+                if package.get_address() not in self.address_index:
+                    raise ValueError("package " + str(package.get_id()) + " has an unknown address")
+                if self.hash_table.lookup(package.get_id()) is not None:
+                    raise ValueError("package " + str(package.get_id()) + " is already loaded")
+            except ValueError as error:
+                self.rejected_rows.append((line_number, str(error)))
+                continue
+
+            insert_package_into_hash_table(package, self.hash_table)
+            batch.append(package)
+            if len(batch) >= batch_size:
+                if self.package_store is not None:
+                    self.package_store.insert_packages(batch)
+                yield batch
+                batch = []
+        if batch:
+            if self.package_store is not None:
+                self.package_store.insert_packages(batch)
+            yield batch
+
+    # Given a package ID, return that package
+    # O(1) average
     def lookup_package(self, package_id) -> Package or None:
-        # get bucket
-        package_id = int(package_id)
-        bucket = hash(package_id) % len(self.hash_table)
-        bucket_list = self.hash_table[bucket]
-
-        # search for key_value in bucket list
-        # key_value is [package_id, package]
-        for key_value in bucket_list:
-            if key_value[0] == package_id:
-                return key_value[1]
-        return None
+        return self.hash_table.lookup(package_id)
 
     # returns the list of all addresses
     # O(1)
     def get_address_list(self): return self.address_list
 
-    # given two packages, returns the distance between them
-    # O(N)
-    def get_distance_between_packages(self, package1: Package, package2: Package):
+    # given an address, returns its index in the distance matrix
+    # O(1)
+    def get_address_index(self, address):
+        return self.address_index[address]
 
-        address1 = package1.get_address()  # O(1)
-        address2 = package2.get_address()
-        address1_index = self.address_list.index(address1)  # O(N)
-        address2_index = self.address_list.index(address2)
+    # given two address indexes, returns the distance between them
+    # O(1)
+    def get_distance_by_index(self, address1_index, address2_index):
+        return self.distance_matrix[address1_index * self.address_count + address2_index]
 
-        # O(1)
-        if self.distance_table[address1_index][address2_index]:
-            return float(self.distance_table[address1_index][address2_index])
-        else:
-            return float(self.distance_table[address2_index][address1_index])
+    # given two packages, returns the distance between them
+    # O(1)
+    def get_distance_between_packages(self, package1: Package, package2: Package):
+        return self.get_distance_between(package1.get_address(), package2.get_address())
 
     # given two address, returns the distannce between them
-    # O(N)
+    # O(1)
     def get_distance_between(self, address1, address2):
-        address1_index = self.address_list.index(address1)  # O(N)
-        address2_index = self.address_list.index(address2)
-
-        # O(1)
-        if self.distance_table[address1_index][address2_index]:
-            return float(self.distance_table[address1_index][address2_index])
-        else:
-            return float(self.distance_table[address2_index][address1_index])
+        address1_index = self.address_index[address1]
+        address2_index = self.address_index[address2]
+        return self.distance_matrix[address1_index * self.address_count + address2_index]
 
     # given a package, returns the distance between it and the HUB
-    # O(N)
+    # O(1)
     def get_distance_from_hub(self, package: Package):
         return self.get_distance_between("HUB", package.get_address())
 
     # given a package, it searches the hash_table for that package and removes it
-    # O(N)
+    # O(1) average
     def remove_package_from_hash_table(self, package: Package):
-        # get bucket
-        package_id = int(package.get_id())
-        bucket = hash(package_id) % len(self.hash_table)
-        bucket_list = self.hash_table[bucket]
-
-        # remove item from bucket if present
-        for key_value in bucket_list:
-            if key_value[0] == package_id:
-                bucket_list.remove(key_value)
+        self.hash_table.remove(package.get_id())
 
     # given an address and a list of packages,
     # returns the nearest package
     # O(N)
     def find_nearest_in(self, current_address, package_list: {Package}) -> Package:
-        current_index = self.get_address_list().index(current_address)  # O(N)
-
-        nearest_package: Package() = None
-        smallest_distance = 1000
-        for package in package_list:
-            address = package.get_address()
-            address_index = self.get_address_list().index(address)  # O(N)
-            if int(address_index) < current_index:
-                if float(self.distance_table[current_index][address_index]) < smallest_distance:
-                    nearest_package = package
-                    smallest_distance = float(self.distance_table[current_index][address_index])
-            elif int(address_index) > current_index:
-                if float(self.distance_table[address_index][current_index]) < smallest_distance:
-                    nearest_package = package
-                    smallest_distance = float(self.distance_table[address_index][current_index])
-            elif int(address_index) == current_index:
-                nearest_package = package
-                smallest_distance = 0
-
-        return nearest_package
+        return self.find_nearest_in_by_index(self.address_index[current_address], package_list)
+
+    # given an address index and a list of packages,
+    # returns the nearest package
+    # a package at the current address is always chosen
+    # O(N)
+    def find_nearest_in_by_index(self, current_index, package_list: {Package}) -> Package:
+        address_index = self.address_index
+        packages = list(package_list)
+        candidate_indexes = []
+        nearest_position = -1
+        for position, package in enumerate(packages):
+            _address_index = address_index[package.get_address()]
+            if _address_index == current_index:
+                nearest_position = position
+            candidate_indexes.append(_address_index)
+
+        if nearest_position == -1:
+            # with a grid index, the cells around the current address are searched,
+            # and None returned if a few candidates spread over many addresses are quicker to compare
+            if self.spatial_index is not None:
+                first_positions = {}
+                for position, _address_index in enumerate(candidate_indexes):
+                    first_positions.setdefault(_address_index, position)
+                nearest_position = self.find_nearest_by_grid(current_index, first_positions.get, 1000,
+                                                             len(first_positions) // 4)
+            if self.spatial_index is None or nearest_position is None:
+                nearest_position = self.kernels.nearest(current_index, candidate_indexes, 1000)
+            if nearest_position == -1:
+                return None
+        return packages[nearest_position]
+
+    # given an address index and a function giving the position of the candidate at an address, or None,
+    # returns the position of the nearest candidate closer than limit, or -1,
+    # the lowest position of those at the same distance, as the kernels choose
+    # only the cells of the grid index around the current address are searched,
+    # and None is returned if the answer is not known after max_steps addresses
+    # O(K log K) for the K addresses nearer than the nearest candidate
+    def find_nearest_by_grid(self, current_index, position_at, limit, max_steps=None):
+        distance_matrix = self.distance_matrix
+        nearest_position = -1
+        smallest_distance = limit
+        for step, _address_index in enumerate(self.get_neighbour_list(current_index)):
+            if step == max_steps:
+                return None
+            distance = distance_matrix.distance(current_index, _address_index)
+            if distance >= limit or distance > smallest_distance:
+                break
+            if _address_index == current_index:
+                continue
+            position = position_at(_address_index)
+            if position is not None and (nearest_position == -1 or position < nearest_position):
+                nearest_position = position
+                smallest_distance = distance
+        return nearest_position
+
+    # given an address index, returns every address index sorted by distance from it
+    # addresses at the same distance are in address list order
+    # each list is built once and kept, so over every address the lists hold A^2 entries;
+    # routing only asks for them with a grid index, where each list is a NeighbourList, found only as far as it is read
+    # O(A log A) the first time for each address, O(1) after that
+    def get_neighbour_list(self, address_index):
+        neighbour_list = self.neighbour_lists.get(address_index)
+        if neighbour_list is None and self.spatial_index is not None:
+            neighbour_list = NeighbourList(self.spatial_index, address_index, self.distance_matrix)
+            self.neighbour_lists[address_index] = neighbour_list
+        elif neighbour_list is None:
+            distance_row = address_index * self.address_count
+            distance_matrix = self.distance_matrix
+            neighbour_list = sorted(range(self.address_count), key=lambda i: distance_matrix[distance_row + i])
+            self.neighbour_lists[address_index] = neighbour_list
+        return neighbour_list
 
     # given a list of packages,
     # returns the package nearest to the HUB
@@ -167,19 +445,14 @@ class Data:
 
     # given a package and a package list,
     # calls load_package for packages at the same address as the given package
-    # O(N)
+    # O(N), or O(K log N) for K packages at the address with a package store
     # this method and load_package call each other,
     # but the calls are limited to the number of packages,
     # so the methods scale linearly with the number of packages
     def get_packages_at_same_address(self, package: Package, package_list):
         package_address = package.get_address()
-        for bucket in self.hash_table:
-            for key_value in bucket:
-                _package: Package = key_value[1]
-                _package_address = _package.get_address()
-                _package_status = _package.get_status()
-                if package_address == _package_address and _package_status == "At Hub":
-                    self.load_package(_package, package_list)
+        for _package in self.find_packages(address=package_address, status_code=PackageStatus.AT_HUB):
+            self.load_package(_package, package_list)
 
     # given a package and a package_list, the package is appended to the package list, if not already in it
     # the package status is updated with the load_package method
@@ -192,17 +465,46 @@ class Data:
             pass
         elif package_list is self.package_list1 and package not in self.package_list1:
             package.load_package()
+            self.stage_packages([package])
             self.package_list1.append(package)
             self.get_packages_at_same_address(package, self.package_list1)
         elif package_list is self.package_list2:
             package.load_package()
+            self.stage_packages([package])
             self.package_list2.append(package)
             self.get_packages_at_same_address(package, self.package_list2)
         elif package_list is self.package_list3:
             package.load_package()
+            self.stage_packages([package])
             self.package_list3.append(package)
             self.get_packages_at_same_address(package, self.package_list3)
 
+    # yields the packages at the given address, with the given status code and deadline, for those given,
+    # in package ID order
+    # with a package store the matching IDs are found through its indexes, and otherwise every package is checked
+    # a package's status may change while the packages are yielded, so each is checked again as it is reached
+    # O(N), or O(K log N) for K packages found with a package store
+    def find_packages(self, address=None, status_code=None, deadline_minutes=None):
+        if self.package_store is not None:
+            packages = [self.hash_table.lookup(package_id) for package_id in
+                        self.package_store.find_ids(address, status_code, deadline_minutes)]
+        else:
+            packages = self.hash_table
+        for _package in packages:
+            if address is not None and _package.get_address() != address:
+                continue
+            if status_code is not None and _package.get_status_code() != status_code:
+                continue
+            if deadline_minutes is not None and _package.get_deadline_minutes() != deadline_minutes:
+                continue
+            yield _package
+
+    # stages the state of the given packages in the package store, if there is one
+    # O(P)
+    def stage_packages(self, packages):
+        if self.package_store is not None:
+            self.package_store.stage(packages)
+
     # called in main.py
     # creates the package lists for the trucks by calling their respective function
     # O(N^2)
@@ -222,116 +524,125 @@ class Data:
     # O(N)
     def determine_first_package_list(self):
         # print("Determining first list")
-        for bucket in self.hash_table:
-            for key_value in bucket:
-                _package: Package = key_value[1]
-                _package_note = _package.get_note()
-                must_be_id_list = [13, 15, 19]
-                _package_id = _package.get_id()
-                if ("Must be" in _package_note) or (_package_id in must_be_id_list):
-                    self.load_package(_package, self.package_list1)
+        for _package in self.hash_table:
+            _package_note = _package.get_note()
+            must_be_id_list = [13, 15, 19]
+            _package_id = _package.get_id()
+            if ("Must be" in _package_note) or (_package_id in must_be_id_list):
+                self.load_package(_package, self.package_list1)
 
     # appends packages into package_list2
     # packages that must be on truck 2
     # O(N)
     def determine_second_package_list(self):
         # print("Determining third list")
-        for bucket in self.hash_table:
-            for key_value in bucket:
-                _package: Package = key_value[1]
-                _package_id = _package.get_id()
-                _package_note = _package.get_note()
-                if "truck 2" in _package_note:
-                    self.load_package(_package, self.package_list2)
+        for _package in self.hash_table:
+            _package_id = _package.get_id()
+            _package_note = _package.get_note()
+            if "truck 2" in _package_note:
+                self.load_package(_package, self.package_list2)
 
     # appends packages into package_list3
     # packages that have been delayed
     # O(N)
     def determine_third_package_list(self):
         # print("Determining second list")
-        for bucket in self.hash_table:
-            for key_value in bucket:
-                _package: Package = key_value[1]
-                _package_note = _package.get_note()
-                _package_id = _package.get_id()
-                _package_deadline = _package.get_deadline()
-                if "Delayed" in _package_note:
-                    # self.package_list2.append(_package_id)
-                    self.load_package(_package, self.package_list3)
+        for _package in self.hash_table:
+            _package_note = _package.get_note()
+            _package_id = _package.get_id()
+            _package_deadline = _package.get_deadline()
+            if "Delayed" in _package_note:
+                # self.package_list2.append(_package_id)
+                self.load_package(_package, self.package_list3)
 
     # given a package list and a starting address
     # appends the closest packages to the package list
     # until the package list has 16 packages or there are no more packages
     # O(N^2)
     def fill_route(self, package_list, starting_address):
-        current_index = self.address_list.index(starting_address)
+        if self.spatial_index is not None:
+            return self.fill_route_by_grid(package_list, starting_address)
+        current_index = self.address_index[starting_address]
 
         while len(package_list) < 16:
-            nearest_index = -1
-            nearest_distance = 100
-            closest_package_id = -1
-
-            # O(N)
-            for bucket in self.hash_table:
-                for key_value in bucket:
-                    _package: Package = key_value[1]
-                    _package_address = _package.get_address()
-                    _package_address_index = self.address_list.index(_package_address)
-                    _package_id = _package.get_id()
-                    _package_status = _package.get_status()
-                    _package_note = _package.get_note()
-                    _package_deadline = _package.get_deadline()
-                    if _package_id not in package_list and _package_status == "At Hub":
-                        if package_list is self.package_list1:
-                            if "10:30" in _package_deadline:
-                                if int(_package_address_index) < current_index:
-                                    if float(self.distance_table[current_index][
-                                                 _package_address_index]) < nearest_distance:
-                                        nearest_index = _package_address_index
-                                        nearest_distance = float(
-                                            self.distance_table[current_index][_package_address_index])
-                                        closest_package_id = _package_id
-                                elif int(_package_address_index) > current_index:
-                                    if float(self.distance_table[_package_address_index][
-                                                 current_index]) < nearest_distance:
-                                        nearest_index = _package_address_index
-                                        nearest_distance = float(
-                                            self.distance_table[_package_address_index][current_index])
-                                        closest_package_id = _package_id
-                        else:
-                            if int(_package_address_index) < current_index:
-                                if float(self.distance_table[current_index][_package_address_index]) < nearest_distance:
-                                    nearest_index = _package_address_index
-                                    nearest_distance = float(self.distance_table[current_index][_package_address_index])
-                                    closest_package_id = _package_id
-                            elif int(_package_address_index) > current_index:
-                                if float(self.distance_table[_package_address_index][current_index]) < nearest_distance:
-                                    nearest_index = _package_address_index
-                                    nearest_distance = float(self.distance_table[_package_address_index][current_index])
-                                    closest_package_id = _package_id
-                        # print(closest_package_id)
-                        # print(nearest_distance)
-            # print(self.package_list1)
-            if closest_package_id == -1:
+            candidate_indexes = []
+            candidate_ids = []
+
+            # O(N), or O(K log N) for the K packages still at the hub with a package store
+            for _package in self.find_packages(
+                    status_code=PackageStatus.AT_HUB,
+                    deadline_minutes=TEN_THIRTY_AM if package_list is self.package_list1 else None):
+                _package_address_index = self.address_index[_package.get_address()]
+                _package_id = _package.get_id()
+                _package_status = _package.get_status_code()
+                _package_deadline = _package.get_deadline_minutes()
+                if _package_address_index == current_index or _package_status != PackageStatus.AT_HUB:
+                    continue
+                if package_list is self.package_list1 and _package_deadline != TEN_THIRTY_AM:
+                    continue
+                if _package_id not in package_list:
+                    candidate_indexes.append(_package_address_index)
+                    candidate_ids.append(_package_id)
+
+            nearest_position = self.kernels.nearest(current_index, candidate_indexes, 100)
+            if nearest_position == -1:
                 break
+            nearest_index = candidate_indexes[nearest_position]
+            closest_package_id = candidate_ids[nearest_position]
 
-            # O(N^2)
-            if self.lookup_package(closest_package_id):  # O(N)
-                self.load_package(self.lookup_package(closest_package_id), package_list)  # O(N)
-                # print(self.package_list1)
-                # package_list.append(closest_package_id)
-                closest_package: Package = self.lookup_package(closest_package_id)
+            # O(1) average
+            closest_package: Package = self.lookup_package(closest_package_id)
+            if closest_package:
+                self.load_package(closest_package, package_list)
                 closest_package.load_package()
+                self.stage_packages([closest_package])
                 current_index = nearest_index
 
         return package_list
 
+    # fill_route for a Data with a grid index, choosing the same packages
+    # the packages that could be loaded are grouped by address once,
+    # and each step searches the cells around the current stop rather than every package
+    # O(N) to group the packages, then O(K log K) a step for the K addresses nearer than the nearest package
+    def fill_route_by_grid(self, package_list, starting_address):
+        current_index = self.address_index[starting_address]
+        packages = list(self.hash_table)
+
+        # address index: hash table positions of the packages there that could be loaded, last first
+        waiting = {}
+        for position in range(len(packages) - 1, -1, -1):
+            _package = packages[position]
+            if _package.get_status_code() != PackageStatus.AT_HUB:
+                continue
+            if package_list is self.package_list1 and _package.get_deadline_minutes() != TEN_THIRTY_AM:
+                continue
+            waiting.setdefault(self.address_index[_package.get_address()], []).append(position)
+
+        # packages loaded since they were grouped are dropped as they are met
+        def position_at(address_index):
+            positions = waiting.get(address_index)
+            while positions and packages[positions[-1]].get_status_code() != PackageStatus.AT_HUB:
+                positions.pop()
+            return positions[-1] if positions else None
+
+        while len(package_list) < 16:
+            nearest_position = self.find_nearest_by_grid(current_index, position_at, 100)
+            if nearest_position == -1:
+                break
+            closest_package: Package = packages[nearest_position]
+            self.load_package(closest_package, package_list)  # O(N)
+            closest_package.load_package()
+            current_index = self.address_index[closest_package.get_address()]
+
+        return package_list
+
     # prints package info in package ID order
-    # O(N^2)
-    def print_all(self):
+    # given a StatusTimeline and a time, the status and address are those at that time
+    # O(N), or O(N log E) with a timeline
+    def print_all(self, timeline=None, time=None):
         p_id = 1
-        while self.lookup_package(p_id):  # O(N)
-            p: Package = self.lookup_package(p_id)
+        p: Package = self.lookup_package(p_id)
+        while p:  # O(1)
             p_address = p.get_address()
             p_city = p.city
             p_state = p.state
@@ -341,6 +652,8 @@ class Data:
             p_note = p.get_note()
             p_delivery = p.get_delivery_time()
             p_status = p.get_status()
+            if timeline is not None:
+                p_status, p_address = timeline.status_at(p_id, time)
             print("ID:", p_id, end="   |   ")
             print("Address:", p_address + ",", p_city + ",", p_state, p_zip, end="   |   ")
             print("Deadline:", p_deadline, end="   |   ")
@@ -352,39 +665,39 @@ class Data:
             #     print("Delivery: Not Delivered", end="   |   ")
             print("Status:", p_status)
             p_id += 1
+            p = self.lookup_package(p_id)
 
     # prints package info by bucket
     # O(N)
     def print_all_by_bucket(self):
-        for bucket in self.hash_table:
-            for key_value in bucket:
-                p: Package = key_value[1]
-                p_id = p.get_id()
-                p_address = p.get_address()
-                p_city = p.city
-                p_state = p.state
-                p_zip = p.zipcode
-                p_deadline = p.get_deadline()
-                p_weight = p.weight
-                p_note = p.get_note()
-                p_delivery = p.get_delivery_time()
-                p_status = p.get_status()
-                print("ID:", p_id, end="   |   ")
-                print("Address:", p_address + ",", p_city + ",", p_state, p_zip, end="   |   ")
-                print("Deadline:", p_deadline, end="   |   ")
-                print("Weight:", p_weight, end="   |   ")
-                print("Note:", p_note, end="   |   ")
-                # if p_delivery != -1:
-                #     print("Delivery:", datetime.datetime.strftime(p_delivery, "%H:%M"), end=" | ")
-                # else:
-                #     print("Delivery: Not Delivered", end=" | ")
-                print("Status:", p_status)
+        for p in self.hash_table.iter_by_slot():
+            p_id = p.get_id()
+            p_address = p.get_address()
+            p_city = p.city
+            p_state = p.state
+            p_zip = p.zipcode
+            p_deadline = p.get_deadline()
+            p_weight = p.weight
+            p_note = p.get_note()
+            p_delivery = p.get_delivery_time()
+            p_status = p.get_status()
+            print("ID:", p_id, end="   |   ")
+            print("Address:", p_address + ",", p_city + ",", p_state, p_zip, end="   |   ")
+            print("Deadline:", p_deadline, end="   |   ")
+            print("Weight:", p_weight, end="   |   ")
+            print("Note:", p_note, end="   |   ")
+            # if p_delivery != -1:
+            #     print("Delivery:", datetime.datetime.strftime(p_delivery, "%H:%M"), end=" | ")
+            # else:
+            #     print("Delivery: Not Delivered", end=" | ")
+            print("Status:", p_status)
 
     # prints specific package info
-    # O(N)
-    def print_package(self, p_id):
-        if self.lookup_package(p_id):
-            p = self.lookup_package(p_id)  # O(N)
+    # given a StatusTimeline and a time, the status and address are those at that time
+    # O(1), or O(log E) with a timeline
+    def print_package(self, p_id, timeline=None, time=None):
+        p = self.lookup_package(p_id)  # O(1)
+        if p:
             p_address = p.get_address()
             p_city = p.city
             p_state = p.state
@@ -394,6 +707,8 @@ class Data:
             p_note = p.get_note()
             p_delivery = p.get_delivery_time()
             p_status = p.get_status()
+            if timeline is not None:
+                p_status, p_address = timeline.status_at(p_id, time)
             print("ID:", p_id, end="   |   ")
             print("Address:", p_address + ",", p_city + ",", p_state, p_zip, end="   |   ")
             print("Deadline:", p_deadline, end="   |   ")
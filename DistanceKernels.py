@@ -0,0 +1,88 @@
+# the two inner loops of routing, over a flat distance matrix:
+# picking the nearest of a list of candidate addresses, and summing the length of a tour
+# the "python" backend is always available; the "numpy" backend is used only if NumPy is installed
+# the backends pick the same candidates, but a tour length may differ in the last bits,
+# as NumPy adds the legs in a different order
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+BACKENDS = ("python", "numpy")
+
+
+# PythonKernels loops over the candidates in Python
+class PythonKernels:
+    name = "python"
+
+    def __init__(self, distance_matrix, address_count):
+        self.distance_matrix = distance_matrix
+        self.address_count = address_count
+
+    # given an address index and a list of candidate address indexes,
+    # returns the position in the list of the nearest candidate closer than limit, or -1 if there is none
+    # the first of several candidates at the same distance is chosen
+    # O(N) in the number of candidates
+    def nearest(self, current_index, candidate_indexes, limit):
+        distance_row = current_index * self.address_count
+        distance_matrix = self.distance_matrix
+        nearest_position = -1
+        smallest_distance = limit
+        for position, candidate_index in enumerate(candidate_indexes):
+            distance = distance_matrix[distance_row + candidate_index]
+            if distance < smallest_distance:
+                nearest_position = position
+                smallest_distance = distance
+        return nearest_position
+
+    # given the address indexes of a tour in order, returns the sum of the distances between them
+    # O(N) in the length of the tour
+    def tour_length(self, address_indexes):
+        distance_matrix = self.distance_matrix
+        address_count = self.address_count
+        length = 0.0
+        for i in range(1, len(address_indexes)):
+            length += distance_matrix[address_indexes[i - 1] * address_count + address_indexes[i]]
+        return length
+
+
+# NumpyKernels gathers the distances it needs from a view of the distance matrix
+# and reduces them with argmin or sum, so the loops run in C
+class NumpyKernels:
+    name = "numpy"
+
+    # the matrix is viewed, not copied, whether it is an array or a snapshot mapping
+    def __init__(self, distance_matrix, address_count):
+        self.address_count = address_count
+        self.matrix = numpy.frombuffer(distance_matrix, dtype=numpy.float64).reshape(address_count, address_count)
+
+    # O(N) in the number of candidates
+    def nearest(self, current_index, candidate_indexes, limit):
+        if len(candidate_indexes) == 0:
+            return -1
+        distances = self.matrix[current_index, candidate_indexes]
+        nearest_position = int(distances.argmin())
+        return nearest_position if distances[nearest_position] < limit else -1
+
+    # O(N) in the length of the tour
+    def tour_length(self, address_indexes):
+        if len(address_indexes) < 2:
+            return 0.0
+        address_indexes = numpy.asarray(address_indexes)
+        return float(self.matrix[address_indexes[:-1], address_indexes[1:]].sum())
+
+
+# returns the kernels for the given backend: "python", "numpy",
+# or "auto" for NumPy when it is installed and Python otherwise
+# O(1)
+def make_kernels(distance_matrix, address_count, backend="python"):
+    if backend == "auto":
+        backend = "numpy" if numpy is not None else "python"
+    if backend == "python":
+        return PythonKernels(distance_matrix, address_count)
+    if backend == "numpy":
+        if numpy is None:
+            raise ImportError("the numpy backend needs NumPy, which is not installed")
+        return NumpyKernels(distance_matrix, address_count)
+    raise ValueError("unknown backend " + str(backend) + ", expected one of " + ", ".join(BACKENDS) + " or auto")
@@ -0,0 +1,221 @@
+# plans the day for a fleet of trucks spread over one or more depots
+# run with: python Fleet.py [fleet.csv] [--workers N]
+# each row of fleet.csv is
+# truck_id,depot,capacity,mph,start_time
+# where depot is an address from address_list.csv and start_time is in 24-hour HHMM format;
+# every column after truck_id may be left empty to use the default
+#
+# packages, with those their notes group them with, go to the nearest depot with room left on its trucks,
+# or to the depot of the truck their note restricts them to,
+# each depot's packages are split over its trucks by the AssignmentEngine,
+# and then every truck's route is built and driven in a pool of worker processes
+
+import argparse
+import csv
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from Package import Package, PackageStatus
+from Data import Data
+from TruckRoute import TruckRoute
+from Assignment import AssignmentEngine, TruckPlan, parse_note
+from Scenarios import minutes_of, parse_time
+
+
+# Truck holds one truck of the fleet: where it is based, how much it carries, how fast it goes and when it leaves
+class Truck:
+    def __init__(self, truck_id, depot="HUB", capacity=16, mph=18, start_time="0800"):
+        self.truck_id = int(truck_id)
+        self.depot = depot
+        self.capacity = int(capacity)
+        self.mph = float(mph)
+        self.start_time = start_time
+
+
+# FleetRoute holds the outcome of one truck's route
+class FleetRoute:
+    def __init__(self, truck_id, depot, package_ids, miles, deliveries, return_time):
+        self.truck_id = truck_id
+        self.depot = depot
+        self.package_ids = package_ids  # in delivery order
+        self.miles = miles
+        self.deliveries = deliveries  # [(package ID, delivery time)]
+        self.return_time = return_time
+
+    # O(1)
+    def format_row(self):
+        return (str(self.truck_id).rjust(6) + "  " + self.depot[:28].ljust(28) + str(len(self.package_ids)).rjust(9)
+                + format(self.miles, ".1f").rjust(9) + datetime.datetime.strftime(self.return_time, "%H:%M").rjust(8))
+
+
+# FleetPlan holds every truck's route, and the packages no truck could take
+class FleetPlan:
+    def __init__(self, routes: [FleetRoute], unassigned: [Package], held: [Package]):
+        self.routes = routes
+        self.unassigned = unassigned
+        self.held = held
+
+    # returns the miles driven by the whole fleet
+    # O(T)
+    def total_miles(self):
+        total_miles = 0.0
+        for route in self.routes:
+            total_miles += route.miles
+        return total_miles
+
+
+# returns {depot: [Package]}, each package going to the depot nearest it that has a truck leaving
+# after the package arrives and room left on its trucks,
+# unless its note restricts it to a truck, when it goes to that truck's depot
+# packages grouped by their notes go to one depot together, as the AssignmentEngine of a depot only sees its own
+# O(N * M) for M depots
+def assign_to_depots(data: Data, trucks: [Truck], packages: [Package]):
+    depots = []
+    truck_depots = {}
+    last_departures = {}
+    room = {}
+    for truck in trucks:
+        truck_depots[truck.truck_id] = truck.depot
+        if truck.depot not in depots:
+            depots.append(truck.depot)
+        last_departures[truck.depot] = max(last_departures.get(truck.depot, 0), minutes_of(truck.start_time))
+        room[truck.depot] = room.get(truck.depot, 0) + truck.capacity
+    depot_indexes = {depot: data.get_address_index(depot) for depot in depots}
+
+    # restricted units are placed first, so the room they need is not taken by units that could go anywhere
+    # a unit is restricted if any of its packages is
+    rules = {package.get_id(): parse_note(package.get_note()) for package in packages}
+    units = AssignmentEngine(data, depot=depots[0]).build_units(packages, rules)
+    depot_packages = {depot: [] for depot in depots}
+    unrestricted = []
+    for unit in units:
+        if unit.truck_only in truck_depots:
+            depot_packages[truck_depots[unit.truck_only]].extend(unit.packages)
+            room[truck_depots[unit.truck_only]] -= unit.size()
+        else:
+            unrestricted.append(unit)
+
+    # a unit goes to the depot with the fewest miles from it to all of its packages' addresses
+    for unit in unrestricted:
+        candidates = [depot for depot in depots if last_departures[depot] >= unit.available_at]
+        candidates = [depot for depot in candidates if room[depot] >= unit.size()] or candidates or depots
+        address_indexes = [data.get_address_index(package.get_address()) for package in unit.packages]
+        nearest = min(candidates, key=lambda depot: sum(data.get_distance_by_index(depot_indexes[depot], address_index)
+                                                        for address_index in address_indexes))
+        depot_packages[nearest].extend(unit.packages)
+        room[nearest] -= unit.size()
+    return depot_packages
+
+
+# builds the route for a truck with the given packages and drives it from the truck's start time
+# the packages are marked delivered in data as the truck reaches them
+# O(N log N) to build the route, O(M) to drive it for M minutes of driving
+def build_truck_route(data: Data, truck: Truck, package_ids) -> FleetRoute:
+    packages = [data.lookup_package(package_id) for package_id in package_ids]
+    departure_time = parse_time(truck.start_time)
+    truck_route = TruckRoute(truck.truck_id, data, packages, departure_time=departure_time, depot=truck.depot,
+                             mph=truck.mph)
+
+    current_time = truck_route.drive_from(departure_time, departing=True)
+    deliveries = []
+    while True:
+        package_id = truck_route.arrive(current_time)
+        if truck_route.at_hub:
+            break
+        deliveries.append((package_id, current_time))
+        current_time = truck_route.drive_from(current_time)
+
+    return FleetRoute(truck.truck_id, truck.depot, [package_id for package_id, time in deliveries],
+                      truck_route.route.sum_length(), deliveries, current_time)
+
+
+# the Data of each worker process, set once by init_worker
+worker_data = None
+
+
+# O(1)
+def init_worker(data: Data):
+    global worker_data
+    worker_data = data
+
+
+# O(N log N)
+def build_truck_route_in_worker(truck: Truck, package_ids) -> FleetRoute:
+    return build_truck_route(worker_data, truck, package_ids)
+
+
+# plans the day for the given trucks, over every package still at a depot
+# packages are assigned here, then the trucks' routes are built and driven by max_workers processes,
+# or in this process if max_workers is 1; either way the deliveries are recorded on the packages in data
+# O(N * K log(N * K)) to assign, then O(N log N / W) for W workers to route
+def plan_fleet(data: Data, trucks: [Truck], max_workers=None) -> FleetPlan:
+    packages = [package for package in data.hash_table if package.get_status_code() == PackageStatus.AT_HUB]
+    loads = {}
+    unassigned = []
+    held = []
+    for depot, depot_packages in assign_to_depots(data, trucks, packages).items():
+        depot_trucks = [truck for truck in trucks if truck.depot == depot]
+        truck_plans = [TruckPlan(truck.truck_id, truck.capacity, minutes_of(truck.start_time))
+                       for truck in depot_trucks]
+        depot_loads, depot_unassigned, depot_held = AssignmentEngine(data, depot=depot).assign(depot_packages,
+                                                                                              truck_plans)
+        loads.update(depot_loads)
+        unassigned.extend(depot_unassigned)
+        held.extend(depot_held)
+
+    routed_trucks = [truck for truck in trucks if loads.get(truck.truck_id)]
+    package_ids = [[package.get_id() for package in loads[truck.truck_id]] for truck in routed_trucks]
+    if max_workers == 1:
+        # one copy for every truck, as no two trucks carry the same package
+        route_data = data.copy()
+        routes = [build_truck_route(route_data, truck, ids) for truck, ids in zip(routed_trucks, package_ids)]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(data,)) as executor:
+            routes = list(executor.map(build_truck_route_in_worker, routed_trucks, package_ids,
+                                       chunksize=max(1, len(routed_trucks) // 64)))
+
+    for route in routes:
+        for package_id, delivery_time in route.deliveries:
+            data.lookup_package(package_id).unload_package(delivery_time)
+    return FleetPlan(routes, unassigned, held)
+
+
+# reads trucks from a CSV file laid out as described at the top of this file
+# O(T)
+def read_fleet(file_path) -> [Truck]:
+    trucks = []
+    with open(file_path, mode='r', encoding='utf-8-sig') as fleet_file:
+        for row in csv.reader(fleet_file, delimiter=','):
+            if not row or not row[0].strip() or row[0].strip() == "truck_id":
+                continue
+            values = [value.strip() for value in row]
+            options = {}
+            for i, option in enumerate(("depot", "capacity", "mph", "start_time"), start=1):
+                if i < len(values) and values[i]:
+                    options[option] = values[i]
+            trucks.append(Truck(values[0], **options))
+    return trucks
+
+
+# the fleet planned when no fleet file is given: the three trucks of main.py, all at the HUB
+DEFAULT_FLEET = [
+    Truck(1, start_time="0800"),
+    Truck(2, start_time="0800"),
+    Truck(3, start_time="0905"),
+]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plan the day for a fleet of trucks over one or more depots.")
+    parser.add_argument("fleet_file", nargs="?", help="CSV file of trucks")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    fleet = read_fleet(args.fleet_file) if args.fleet_file else DEFAULT_FLEET
+    plan = plan_fleet(Data(snapshot_file='data_snapshot.bin'), fleet, args.workers)
+    print("truck".rjust(6) + "  " + "depot".ljust(28) + "packages".rjust(9) + "miles".rjust(9) + "back".rjust(8))
+    for fleet_route in plan.routes:
+        print(fleet_route.format_row())
+    print("Distance:")
+    print(plan.total_miles())
+    if plan.unassigned or plan.held:
+        print("Not routed:", ", ".join(str(package.get_id()) for package in plan.unassigned + plan.held))
@@ -0,0 +1,185 @@
+from array import array
+
+from Data import Data
+from TruckRoute import stop_delivery_order, drive_minutes
+
+INFINITY = float('inf')
+
+# miles smaller than this are rounding error
+EPSILON = 1e-9
+
+# routes with more stops than this are left to the nearest neighbour heuristic
+# the tables grow as 2^N * N, so 12 stops take 49,152 entries and a fraction of a second
+STOP_LIMIT = 12
+
+
+# HeldKarpSolver finds the shortest order to visit a truck's stops in, from its depot and back,
+# by dynamic programming over the subsets of stops (Held-Karp), for routes of at most stop_limit stops
+# an order that makes a package late is never chosen, and when every order does, no order is returned
+# distance[subset * N + stop] is the fewest miles to visit the stops of subset, a bitmask, ending at stop,
+# and parent[subset * N + stop] the stop before it on that path, in flat arrays rather than dictionaries
+# when a stop has a deadline, minutes[subset * N + stop] is the minutes from departure that path takes
+# to deliver the last package at stop, and counters[subset * N + stop] the miles left on the truck's counter,
+# timed as DeliveryDay times the truck, a minute for each extra package at a stop, see delivery_minutes
+# only the path with the fewest miles to each subset and last stop is kept, though the unload minutes can make
+# a longer path to it sooner, so an on-time order that needs such a path can be missed
+# each order found is kept, keyed on the depot, the stops with their deadlines and, if any stop has a deadline,
+# the departure time, speed and package counts, so planning the same load again costs a dictionary lookup
+class HeldKarpSolver:
+    def __init__(self, data: Data, stop_limit=STOP_LIMIT):
+        self.data = data
+        self.stop_limit = stop_limit
+        self.plans = {}  # key: tuple of address indexes in visiting order, or None for no on-time order
+        self.hits = 0
+        self.misses = 0
+
+    # given the depot's address index and {address index: [package]} of the stops,
+    # returns the address indexes of the stops in the order to visit them,
+    # or None if there are more than stop_limit stops or every order makes a package late
+    # departure_time is when the truck leaves its depot and mph is its speed
+    # O(1) for a load planned before, O(2^N * N^2) for N stops otherwise
+    def solve(self, depot_index, stops, departure_time=None, mph=18):
+        if not 0 < len(stops) <= self.stop_limit:
+            return None
+        stop_addresses = sorted(stops)
+        package_counts = [len(stops[address_index]) for address_index in stop_addresses]
+
+        # the latest minute of the day the first package at each stop can be delivered
+        # with every package there delivered by its deadline, a minute apart
+        stop_deadlines = []
+        for address_index in stop_addresses:
+            deadlines = [package.get_deadline_minutes() - position
+                         for position, package in enumerate(stop_delivery_order(stops[address_index]))
+                         if package.get_deadline_minutes() is not None]
+            stop_deadlines.append(min(deadlines) if deadlines else INFINITY)
+
+        has_deadlines = any(deadline != INFINITY for deadline in stop_deadlines)
+        departure_minutes = departure_time.hour * 60 + departure_time.minute if departure_time else 0
+        key = (depot_index, tuple(stop_addresses), tuple(stop_deadlines),
+               (departure_minutes, mph, tuple(package_counts)) if has_deadlines else None)
+        if key in self.plans:
+            self.hits += 1
+            return self.plans[key]
+
+        self.misses += 1
+        order = self.find_order(depot_index, stop_addresses, stop_deadlines, package_counts, departure_minutes,
+                                mph / 60, has_deadlines)
+        self.plans[key] = order
+        return order
+
+    # returns {package ID: minute of the day it is delivered} for the stops visited in the given order,
+    # as the solver times them, which is the minute DeliveryDay delivers them in
+    # O(M + N) where M is the minutes driven
+    def delivery_minutes(self, depot_index, order, stops, departure_time, mph=18):
+        miles_per_minute = mph / 60
+        # the truck moves on the minute it departs, see TruckRoute.drive_from
+        minute = departure_time.hour * 60 + departure_time.minute - 1
+        counter = 0.0
+        last_index = depot_index
+        delivered = {}
+        for address_index in order:
+            for package in stop_delivery_order(stops[address_index]):
+                counter += self.data.get_distance_by_index(last_index, address_index)
+                driven, counter = drive_minutes(counter, miles_per_minute)
+                minute += driven
+                delivered[package.get_id()] = minute
+                last_index = address_index
+        return delivered
+
+    # returns the shortest on-time order of the stops as address indexes, or None
+    # with timed unset, no stop has a deadline, and the minutes are not counted
+    # O(2^N * N^2), times the minutes driven per leg when timed
+    def find_order(self, depot_index, stop_addresses, stop_deadlines, package_counts, departure_minutes,
+                   miles_per_minute, timed):
+        stop_count = len(stop_addresses)
+        full_set = (1 << stop_count) - 1
+        get_distance = self.data.get_distance_by_index
+        from_depot = [get_distance(depot_index, address_index) for address_index in stop_addresses]
+        to_depot = [get_distance(address_index, depot_index) for address_index in stop_addresses]
+        between = [[get_distance(address1, address2) for address2 in stop_addresses] for address1 in stop_addresses]
+
+        # the most minutes after departure the first package at each stop can be delivered in and still be on time,
+        # as the truck moves on the minute it departs
+        minute_limits = [deadline - departure_minutes + 1 for deadline in stop_deadlines]
+        # and the most miles from the depot it can be reached within, as a truck drives no more than
+        # miles_per_minute a minute, so a path longer than this is late without counting its minutes
+        mile_limits = [limit * miles_per_minute + EPSILON for limit in minute_limits]
+
+        # each extra package at a stop takes a minute, as the stop is no miles from itself
+        extra_packages = [package_count - 1 for package_count in package_counts]
+
+        # the minutes to drive down each counter value and the counter after, as the same value is often
+        # driven down again by another path
+        drives = {}
+
+        size = (full_set + 1) * stop_count
+        distance = array('d', [INFINITY]) * size
+        parent = array('b', [-1]) * size
+        minutes = array('i', bytes(4 * size)) if timed else None
+        counters = array('d', bytes(8 * size)) if timed else None
+        for stop in range(stop_count):
+            position = (1 << stop) * stop_count + stop
+            if timed:
+                first, counter = drive_minutes(from_depot[stop], miles_per_minute)
+                if first > minute_limits[stop]:
+                    continue
+                for extra in range(extra_packages[stop]):
+                    counter -= miles_per_minute
+                minutes[position] = first + extra_packages[stop]
+                counters[position] = counter
+            distance[position] = from_depot[stop]
+
+        # subsets are visited in increasing order, so every subset is finished before a larger one uses it
+        for subset in range(1, full_set + 1):
+            row = subset * stop_count
+            for last in range(stop_count):
+                miles = distance[row + last]
+                if miles == INFINITY:
+                    continue
+                from_last = between[last]
+                for stop in range(stop_count):
+                    if subset & (1 << stop):
+                        continue
+                    next_miles = miles + from_last[stop]
+                    position = (subset | (1 << stop)) * stop_count + stop
+                    if next_miles >= distance[position]:
+                        continue
+                    if timed:
+                        if next_miles > mile_limits[stop]:
+                            continue
+                        counter = counters[row + last] + from_last[stop]
+                        drive = drives.get(counter)
+                        if drive is None:
+                            drive = drives[counter] = drive_minutes(counter, miles_per_minute)
+                        first = minutes[row + last] + drive[0]
+                        if first > minute_limits[stop]:
+                            continue
+                        counter = drive[1]
+                        for extra in range(extra_packages[stop]):
+                            counter -= miles_per_minute
+                        minutes[position] = first + extra_packages[stop]
+                        counters[position] = counter
+                    distance[position] = next_miles
+                    parent[position] = last
+
+        best_last = -1
+        best_miles = INFINITY
+        row = full_set * stop_count
+        for last in range(stop_count):
+            miles = distance[row + last] + to_depot[last]
+            if miles < best_miles:
+                best_last = last
+                best_miles = miles
+        if best_last == -1:
+            return None
+
+        order = []
+        subset = full_set
+        last = best_last
+        while last != -1:
+            order.append(stop_addresses[last])
+            previous = parent[subset * stop_count + last]
+            subset &= ~(1 << last)
+            last = previous
+        order.reverse()
+        return tuple(order)
@@ -0,0 +1,176 @@
+import datetime
+import functools
+import json
+import time
+from contextlib import contextmanager
+
+from Data import Data
+from TruckRoute import TruckRoute
+from DistanceKernels import PythonKernels, NumpyKernels
+
+# the methods timed while instrumentation is enabled, as (class, method name)
+# these are the ones the event simulation calls: distances by address index,
+# the nearest of a list of candidate addresses, which fill_route and StopIndex ask the distance kernels for,
+# and drive_to_next_address and arrive, the countdown to each stop and the delivery there, in place of increment
+HOT_PATHS = [
+    (Data, "get_distance_by_index"),
+    (Data, "lookup_package"),
+    (PythonKernels, "nearest"),
+    (NumpyKernels, "nearest"),
+    (Data, "fill_route"),
+    (TruckRoute, "determine_route"),
+    (TruckRoute, "drive_to_next_address"),
+    (TruckRoute, "arrive"),
+]
+
+
+# Instrumentation counts calls to the hot paths and the wall time spent in them,
+# times the phases of a run, and records each truck's miles, stops and idle minutes
+# it is off until enable is called: the hot paths are only wrapped while it is enabled,
+# so a run without it calls the original methods and pays nothing
+# times are inclusive, so a method's time includes the instrumented methods it calls
+class Instrumentation:
+    def __init__(self, hot_paths=None):
+        self.hot_paths = HOT_PATHS if hot_paths is None else hot_paths
+        self.enabled = False
+        self.originals = {}
+        self.calls = {}  # "Class.method": [calls, seconds]
+        self.phases = {}  # phase name: seconds
+        self.trucks = {}  # truck ID: {"miles", "stops", "busy_minutes", "idle_minutes"}
+        self.routes = {}  # route number: [delivery], as print_route in main.py used to print them
+        self.events = []  # ("HH:MM", message), as annotate_route in main.py used to print them
+
+    # wraps every hot path in a timer
+    # O(H) in the number of hot paths
+    def enable(self):
+        if self.enabled:
+            return
+        for owner, method_name in self.hot_paths:
+            method = owner.__dict__[method_name]
+            self.originals[(owner, method_name)] = method
+            setattr(owner, method_name, self.timed(owner.__name__ + "." + method_name, method))
+        self.enabled = True
+
+    # puts the original hot paths back
+    # O(H)
+    def disable(self):
+        for (owner, method_name), method in self.originals.items():
+            setattr(owner, method_name, method)
+        self.originals.clear()
+        self.enabled = False
+
+    # returns method wrapped to count its calls and time them under name
+    # O(1)
+    def timed(self, name, method):
+        counter = self.calls.setdefault(name, [0, 0.0])
+        perf_counter = time.perf_counter
+
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                counter[0] += 1
+                counter[1] += perf_counter() - start
+
+        return timed_method
+
+    # times the body of a with statement as a phase of the run, such as ingestion or simulation
+    # O(1)
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - start
+
+    # records something that happened at the given time of the simulated day
+    # O(1)
+    def event(self, event_time: datetime.datetime, message):
+        if self.enabled:
+            self.events.append((datetime.datetime.strftime(event_time, "%H:%M"), message))
+
+    # records the miles, stops and idle minutes of each truck, and the deliveries of each route,
+    # once the day has been simulated
+    # a truck is idle whenever it is at the HUB between the first departure and the time every truck is back
+    # O(N) in the number of packages
+    def record_day(self, day):
+        if not self.enabled:
+            return
+        day_end = day.finish_time or day.end_of_day
+        for route_number, truck_route in sorted(day.truck_routes.items()):
+            departure = day.departure_times[route_number]
+            truck = self.trucks.setdefault(truck_route.truck_id, {"miles": 0.0, "stops": 0, "busy_minutes": 0})
+            truck["miles"] += truck_route.route.sum_length()
+            hub_return = day.hub_return_times.get(route_number, day_end)
+            truck["busy_minutes"] += int((hub_return - departure).total_seconds() // 60)
+
+            deliveries = []
+            previous_address = None
+            for node in truck_route.route.get_nodes():
+                if node.address_index != previous_address:
+                    truck["stops"] += 1
+                    previous_address = node.address_index
+                package = day.data.lookup_package(node.package_id)
+                delivery_time = package.get_delivery_time()
+                deliveries.append({
+                    "id": package.get_id(),
+                    "delivered": None if delivery_time == -1 else datetime.datetime.strftime(delivery_time, "%H:%M"),
+                    "deadline": package.get_deadline(),
+                    "note": package.get_note(),
+                })
+            self.routes[route_number] = deliveries
+
+        day_minutes = int((day_end - day.first_departure).total_seconds() // 60)
+        for truck in self.trucks.values():
+            truck["idle_minutes"] = max(0, day_minutes - truck["busy_minutes"])
+
+    # returns everything recorded, as a dictionary ready for json
+    # O(H + T + E)
+    def report(self):
+        return {
+            "calls": {name: {"calls": calls, "seconds": seconds} for name, (calls, seconds) in self.calls.items()},
+            "phases": dict(self.phases),
+            "trucks": {str(truck_id): truck for truck_id, truck in sorted(self.trucks.items())},
+            "routes": {str(route_number): deliveries for route_number, deliveries in sorted(self.routes.items())},
+            "events": [{"time": event_time, "message": message} for event_time, message in self.events],
+        }
+
+    # returns the counters and truck figures in the Prometheus text format
+    # O(H + T)
+    def prometheus_text(self):
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append("# HELP " + name + " " + description)
+            lines.append("# TYPE " + name + " " + kind)
+            for label, value in samples:
+                lines.append(name + "{" + label + "} " + repr(value))
+
+        metric("c950_calls_total", "counter", "Calls to an instrumented method.",
+               [('method="' + name + '"', calls) for name, (calls, seconds) in self.calls.items()])
+        metric("c950_call_seconds_total", "counter", "Wall time spent in an instrumented method.",
+               [('method="' + name + '"', seconds) for name, (calls, seconds) in self.calls.items()])
+        metric("c950_phase_seconds", "gauge", "Wall time spent in a phase of the run.",
+               [('phase="' + name + '"', seconds) for name, seconds in self.phases.items()])
+        for figure, description in (("miles", "Miles driven by a truck."),
+                                    ("stops", "Stops made by a truck."),
+                                    ("idle_minutes", "Minutes a truck spent at the HUB during the day.")):
+            metric("c950_truck_" + figure, "gauge", description,
+                   [('truck="' + str(truck_id) + '"', truck[figure]) for truck_id, truck in sorted(self.trucks.items())])
+        return "\n".join(lines) + "\n"
+
+    # writes the report to file_path, in the Prometheus text format if it ends in .prom and as JSON otherwise
+    # O(H + T + E)
+    def write_report(self, file_path):
+        with open(file_path, mode='w', encoding='utf-8') as report_file:
+            if file_path.endswith(".prom"):
+                report_file.write(self.prometheus_text())
+            else:
+                json.dump(self.report(), report_file, indent=2)
+                report_file.write("\n")
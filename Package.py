@@ -1,8 +1,70 @@
 import datetime
+import sys
+from enum import IntEnum
+
+
+# every deadline parsed so far, and the minutes it falls on
+# a day's packages share a handful of deadlines, so each is only parsed once
+DEADLINE_MINUTES = {}
+
+
+# given a deadline such as "10:30 AM", returns the number of minutes after midnight it falls on
+# "EOD" and other deadlines without a time return None
+# O(1)
+def deadline_to_minutes(deadline):
+    if deadline in DEADLINE_MINUTES:
+        return DEADLINE_MINUTES[deadline]
+    try:
+        deadline_time = datetime.datetime.strptime(deadline.strip(), "%I:%M %p")
+        minutes = deadline_time.hour * 60 + deadline_time.minute
+    except ValueError:
+        minutes = None
+    DEADLINE_MINUTES[deadline] = minutes
+    return minutes
+
+
+# PackageStatus codes the status of a package
+# the status text is only built by format_status, when something displays it
+class PackageStatus(IntEnum):
+    AT_HUB = 0  # "At Hub", as read from package_data.csv
+    LOADED = 1  # "At hub", once assigned to a package list
+    EN_ROUTE = 2  # "En Route"
+    ON_TRUCK = 3  # "En route on Truck N"
+    DELIVERED = 4  # "Delivered at HH:MM"
+    ON_HOLD = 5  # "on hold"
+    OTHER = 6  # any other text set through Package.status
+
+
+STATUS_TEXT = {
+    PackageStatus.AT_HUB: "At Hub",
+    PackageStatus.LOADED: "At hub",
+    PackageStatus.EN_ROUTE: "En Route",
+    PackageStatus.ON_HOLD: "on hold",
+}
+STATUS_CODES = {text: status_code for status_code, text in STATUS_TEXT.items()}
+
+
+# given a status code and its value, returns the status text
+# the value is the truck number for ON_TRUCK, the delivery time for DELIVERED and the text for OTHER
+# O(1)
+def format_status(status_code, status_value=None):
+    if status_code == PackageStatus.DELIVERED:
+        return "Delivered at " + datetime.datetime.strftime(status_value, "%H:%M")
+    if status_code == PackageStatus.ON_TRUCK:
+        return "En route on Truck " + str(status_value)
+    if status_code == PackageStatus.OTHER:
+        return status_value
+    return STATUS_TEXT[status_code]
 
 
 # Package class holds all data retrieved from package_data.csv
+# the city, state, zipcode, deadline and note strings are interned,
+# so packages with the same values share one copy of each
+# the deadline is parsed once, into deadline_minutes, when the package is made
 class Package:
+    __slots__ = ('id', 'address', 'city', 'state', 'zipcode', 'deadline', 'deadline_minutes', 'weight', 'note',
+                 'status_code', 'status_value', 'delivery_time')
+
     def __init__(
             self,
             package_id=0,
@@ -17,15 +79,32 @@ class Package:
             delivery_time= -1):
         self.id = package_id
         self.address = address
-        self.city = city
-        self.state = state
-        self.zipcode = zipcode
-        self.deadline = deadline
+        self.city = sys.intern(city)
+        self.state = sys.intern(state)
+        self.zipcode = sys.intern(zipcode)
+        self.deadline = sys.intern(deadline)
+        self.deadline_minutes = deadline_to_minutes(self.deadline)
         self.weight = weight
-        self.note = note
+        self.note = sys.intern(note)
         self.status = status
         self.delivery_time = delivery_time
 
+    # the status as text, built when it is read
+    # setting it to text that is not a known status stores the text as it is
+    @property
+    def status(self):
+        return format_status(self.status_code, self.get_status_value())
+
+    @status.setter
+    def status(self, status_text):
+        status_code = STATUS_CODES.get(status_text)
+        if status_code is None:
+            self.status_code = PackageStatus.OTHER
+            self.status_value = status_text
+        else:
+            self.status_code = status_code
+            self.status_value = None
+
     def get_address(self): return self.address
 
     def set_address(self, new_address): self.address = new_address
@@ -38,14 +117,35 @@ class Package:
 
     def get_status(self): return self.status
 
+    def get_status_code(self): return self.status_code
+
+    # returns the value format_status needs along with the status code
+    def get_status_value(self):
+        if self.status_code == PackageStatus.DELIVERED:
+            return self.delivery_time
+        return self.status_value
+
     def get_deadline(self): return self.deadline
 
-    def load_package(self): self.status = "At hub"
+    # the minutes after midnight the package is due by, or None for "EOD"
+    def get_deadline_minutes(self): return self.deadline_minutes
+
+    def load_package(self):
+        self.status_code = PackageStatus.LOADED
+        self.status_value = None
+
+    # marks the package as being on its truck's route
+    def route_package(self):
+        self.status_code = PackageStatus.EN_ROUTE
+        self.status_value = None
 
     # marks package as delivered at the time given
     def unload_package(self, delivery_time: datetime.datetime):
-        self.status = "Delivered at " + datetime.datetime.strftime(delivery_time, "%H:%M")
+        self.status_code = PackageStatus.DELIVERED
+        self.status_value = None
         self.delivery_time = delivery_time
 
     # when truck is initialized, the status is set as seen below
-    def takeoff(self, truck_num): self.status = "En route on Truck " + str(truck_num)
+    def takeoff(self, truck_num):
+        self.status_code = PackageStatus.ON_TRUCK
+        self.status_value = truck_num
@@ -0,0 +1,163 @@
+import argparse
+import datetime
+import sqlite3
+
+from Package import Package, PackageStatus, format_status
+from Data import Data
+from StatusService import simulate_day
+from Scenarios import END_OF_DAY, parse_time
+
+# run with: python PackageStore.py packages.db [--until HHMM] [--address ADDRESS]
+# an empty store is filled by simulating the day up to the given time, and a store that holds packages
+# is resumed from, and the status of its packages, or of those at the given address, printed
+#
+# a package store is an SQLite database of every package and its current state,
+# so packages can be queried through indexes rather than by scanning the hash table,
+# and a later process can carry on from the stored state rather than reading package_data.csv again
+# status_value is the truck number for ON_TRUCK and the text for OTHER, and delivery_time is ISO text
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS packages (
+    id INTEGER PRIMARY KEY,
+    address TEXT NOT NULL,
+    city TEXT NOT NULL,
+    state TEXT NOT NULL,
+    zipcode TEXT NOT NULL,
+    deadline TEXT NOT NULL,
+    deadline_minutes INTEGER,
+    weight INTEGER NOT NULL,
+    note TEXT NOT NULL,
+    status_code INTEGER NOT NULL,
+    status_value,
+    delivery_time TEXT
+);
+CREATE INDEX IF NOT EXISTS packages_address ON packages (address, status_code);
+CREATE INDEX IF NOT EXISTS packages_status ON packages (status_code, deadline_minutes);
+CREATE INDEX IF NOT EXISTS packages_deadline ON packages (deadline_minutes);
+"""
+
+COLUMNS = ("id, address, city, state, zipcode, deadline, deadline_minutes, weight, note, "
+           "status_code, status_value, delivery_time")
+
+
+# returns a package's row, in COLUMNS order
+# O(1)
+def package_row(package: Package):
+    delivery_time = package.get_delivery_time()
+    return (package.get_id(), package.get_address(), package.city, package.state, package.zipcode,
+            package.get_deadline(), package.get_deadline_minutes(), package.weight, package.get_note(),
+            int(package.get_status_code()), package.status_value,
+            delivery_time.isoformat() if isinstance(delivery_time, datetime.datetime) else None)
+
+
+# returns the package a row in COLUMNS order stores, in the state it was stored in
+# O(1)
+def row_package(row):
+    package_id, address, city, state, zipcode, deadline, deadline_minutes, weight, note, \
+        status_code, status_value, delivery_time = row
+    package = Package(package_id, address, city, state, zipcode, deadline, weight, note)
+    package.status_code = PackageStatus(status_code)
+    package.status_value = status_value
+    package.delivery_time = datetime.datetime.fromisoformat(delivery_time) if delivery_time else -1
+    return package
+
+
+# PackageStore keeps packages in an SQLite database at store_file, or in memory for ":memory:"
+# packages are added in bulk, one transaction per call,
+# and changes to their state are staged and written batch_size packages at a time, each batch one transaction
+# staged changes are written, though not committed, before each query, so queries always see them
+class PackageStore:
+    def __init__(self, store_file, batch_size=500):
+        self.store_file = store_file
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(store_file)
+        # with a write-ahead log, a commit need not wait for the disk, and readers are not blocked by the writer
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        self.staged = {}  # package ID: row
+        self.batches_written = 0
+
+    # O(1)
+    def package_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM packages").fetchone()[0]
+
+    # adds or replaces the given packages in one transaction
+    # O(N log N)
+    def insert_packages(self, packages):
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO packages (" + COLUMNS + ") VALUES "
+                                        "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                        (package_row(package) for package in packages))
+
+    # yields every stored package in package ID order
+    # O(N)
+    def load_packages(self):
+        self.write_staged()
+        for row in self.connection.execute("SELECT " + COLUMNS + " FROM packages ORDER BY id"):
+            yield row_package(row)
+
+    # stages the current state of the given packages, and commits once batch_size packages are staged
+    # O(1) per package, O(B log N) for each batch of B written
+    def stage(self, packages):
+        for package in packages:
+            self.staged[package.get_id()] = package_row(package)
+        if len(self.staged) >= self.batch_size:
+            self.commit()
+
+    # writes the staged packages in the open transaction
+    # O(B log N)
+    def write_staged(self):
+        if not self.staged:
+            return
+        self.connection.executemany("INSERT OR REPLACE INTO packages (" + COLUMNS + ") VALUES "
+                                    "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", self.staged.values())
+        self.staged.clear()
+
+    # writes the staged packages and commits the transaction
+    # O(B log N)
+    def commit(self):
+        self.write_staged()
+        self.connection.commit()
+        self.batches_written += 1
+
+    # returns the IDs of the packages matching every condition given, in package ID order,
+    # through the index on address, status or deadline
+    # O(K log N) for K packages found
+    def find_ids(self, address=None, status_code=None, deadline_minutes=None):
+        conditions = []
+        parameters = []
+        for column, value in (("address", address), ("status_code", status_code),
+                              ("deadline_minutes", deadline_minutes)):
+            if value is not None:
+                conditions.append(column + " = ?")
+                parameters.append(int(value) if column == "status_code" else value)
+        query = "SELECT id FROM packages"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        self.write_staged()
+        return [package_id for (package_id,) in self.connection.execute(query + " ORDER BY id", parameters)]
+
+    # commits anything staged and closes the database
+    # O(B log N)
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate the day into a package store, or resume from one.")
+    parser.add_argument("store_file")
+    parser.add_argument("--until", default=END_OF_DAY, help="the time to simulate to, in HHMM format")
+    parser.add_argument("--address", help="only print the packages at this address")
+    args = parser.parse_args()
+
+    package_store = PackageStore(args.store_file)
+    if package_store.package_count() == 0:
+        simulate_day(Data(snapshot_file='data_snapshot.bin', package_store=package_store), parse_time(args.until))
+        print(package_store.package_count(), "packages stored in", args.store_file, "at", args.until)
+    else:
+        data = Data(snapshot_file='data_snapshot.bin', package_store=package_store)
+        for package in data.find_packages(address=args.address):
+            print(package.get_id(), "|", package.get_address(), "|",
+                  format_status(package.get_status_code(), package.get_status_value()))
+    package_store.close()
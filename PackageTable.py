@@ -0,0 +1,146 @@
+from Package import Package
+
+# marks a slot whose package was removed, so probing continues past it
+_DELETED = object()
+
+# 2^64 divided by the golden ratio: multiplied by it, every bit of a hash reaches the top bits of the product
+_FIBONACCI = 11400714819323198485
+_MASK_64 = (1 << 64) - 1
+
+
+# PackageTable is an open-addressing hash table of packages keyed on package ID
+# it doubles in size whenever the load factor passes MAX_LOAD_FACTOR,
+# so insert, lookup and remove stay O(1) on average regardless of package count
+# a package ID's home slot is the top bits of its hash times _FIBONACCI, modulo 2^64 (Fibonacci hashing),
+# probed linearly from there, as Python hashes an int to itself, and with its low bits as the slot,
+# IDs that share them, such as IDs in steps of a power of two or under a depot or date prefix, would pile into one run
+class PackageTable:
+    MIN_CAPACITY = 16
+    MAX_LOAD_FACTOR = 0.5
+
+    def __init__(self, capacity=MIN_CAPACITY):
+        size = self.MIN_CAPACITY
+        while size < capacity:
+            size *= 2
+        self.keys = [None] * size
+        self.values = [None] * size
+        self.shift = 64 - (size.bit_length() - 1)  # 64 - log2(size)
+        self.count = 0
+        self.used = 0  # live entries plus deleted markers
+        self.ordered_ids = []
+        self.ordered = True
+
+    # O(1)
+    def __len__(self):
+        return self.count
+
+    # O(1)
+    def __contains__(self, package_id):
+        return self.lookup(package_id) is not None
+
+    # yields packages in package ID order
+    # O(N), plus O(N log N) if IDs were inserted out of order since the last pass
+    def __iter__(self):
+        if not self.ordered:
+            self.ordered_ids = sorted(key for key in self.keys if key is not None and key is not _DELETED)
+            self.ordered = True
+        for package_id in self.ordered_ids:
+            package = self.lookup(package_id)
+            if package is not None:
+                yield package
+
+    # yields packages in the order they are stored in the table
+    # O(N)
+    def iter_by_slot(self):
+        for i, key in enumerate(self.keys):
+            if key is not None and key is not _DELETED:
+                yield self.values[i]
+
+    # returns the slot holding package_id, or None if it is not present
+    # O(1) average
+    def find_slot(self, package_id):
+        mask = len(self.keys) - 1
+        slot = ((hash(package_id) * _FIBONACCI) & _MASK_64) >> self.shift
+        while True:
+            key = self.keys[slot]
+            if key is None:
+                return None
+            if key is not _DELETED and key == package_id:
+                return slot
+            slot = (slot + 1) & mask
+
+    # inserts or replaces the package stored under its ID
+    # O(1) average
+    def insert(self, package: Package):
+        package_id = int(package.get_id())
+        if (self.used + 1) > len(self.keys) * self.MAX_LOAD_FACTOR:
+            self.resize(len(self.keys) * 2 if self.count * 2 >= self.used else len(self.keys))
+
+        mask = len(self.keys) - 1
+        slot = ((hash(package_id) * _FIBONACCI) & _MASK_64) >> self.shift
+        first_deleted = None
+        while True:
+            key = self.keys[slot]
+            if key is None:
+                break
+            if key is _DELETED:
+                if first_deleted is None:
+                    first_deleted = slot
+            elif key == package_id:
+                self.values[slot] = package
+                return
+            slot = (slot + 1) & mask
+
+        if first_deleted is not None:
+            slot = first_deleted
+        else:
+            self.used += 1
+        self.keys[slot] = package_id
+        self.values[slot] = package
+        self.count += 1
+
+        if self.ordered:
+            if self.ordered_ids and package_id < self.ordered_ids[-1]:
+                self.ordered = False
+            else:
+                self.ordered_ids.append(package_id)
+
+    # given a package ID, returns that package or None
+    # O(1) average
+    def lookup(self, package_id) -> Package or None:
+        slot = self.find_slot(int(package_id))
+        if slot is None:
+            return None
+        return self.values[slot]
+
+    # removes the package stored under package_id, if present
+    # O(1) average
+    def remove(self, package_id):
+        slot = self.find_slot(int(package_id))
+        if slot is None:
+            return None
+        package = self.values[slot]
+        self.keys[slot] = _DELETED
+        self.values[slot] = None
+        self.count -= 1
+        self.ordered = False
+        return package
+
+    # rehashes every live entry into a table of the given capacity
+    # deleted markers are dropped in the process
+    # O(N)
+    def resize(self, capacity):
+        old_keys = self.keys
+        old_values = self.values
+        self.keys = [None] * capacity
+        self.values = [None] * capacity
+        self.used = self.count
+        mask = capacity - 1
+        self.shift = shift = 64 - (capacity.bit_length() - 1)
+        for i, key in enumerate(old_keys):
+            if key is not None and key is not _DELETED:
+                slot = ((hash(key) * _FIBONACCI) & _MASK_64) >> shift
+                while self.keys[slot] is not None:
+                    slot = (slot + 1) & mask
+                self.keys[slot] = key
+                self.values[slot] = old_values[i]
@@ -0,0 +1,232 @@
+import datetime
+import heapq
+import time
+
+from Package import Package
+from Data import Data
+from TruckRoute import TruckRoute, RouteNode
+
+
+# AddressCorrection is the news, at the given time, that a package's address was listed wrong
+class AddressCorrection:
+    kind = "address correction"
+
+    def __init__(self, event_time: datetime.datetime, package_id, address):
+        self.time = event_time
+        self.package_id = package_id
+        self.address = address
+
+
+# NewPickup is a package to be collected from its address by a truck already on the road
+# the truck stops for it like a delivery, and the time it gets there is recorded as the package's delivery time
+class NewPickup:
+    kind = "new pickup"
+
+    def __init__(self, event_time: datetime.datetime, package: Package):
+        self.time = event_time
+        self.package_id = package.get_id()
+        self.package = package
+
+
+# RerouteResult holds what one change event did: the routes it changed, the miles it added to them,
+# and the seconds it took to repair them
+class RerouteResult:
+    def __init__(self, event, route_numbers, added_miles, seconds):
+        self.event = event
+        self.route_numbers = route_numbers
+        self.added_miles = added_miles
+        self.seconds = seconds
+
+
+# Rerouter repairs the routes of trucks on the road as changes come in, without building them again
+# the stop a truck is driving to is fixed, and only the unvisited stops after it are changed:
+# a package is taken off its route by relinking its neighbours,
+# and put on a route at the position that adds the fewest miles
+# truck_routes is the {route number: TruckRoute} of the trucks that have left, and may grow as more leave
+# a new pickup is offered to the candidate_routes routes with stops nearest its address, not to every route
+class Rerouter:
+    def __init__(self, data: Data, truck_routes, candidate_routes=8):
+        self.data = data
+        self.truck_routes = truck_routes
+        self.candidate_routes = candidate_routes
+        self.route_numbers = {}  # package ID: the number of the route it is on
+        self.stop_routes = {}  # address index: {numbers of the routes with a stop there}
+        self.indexed_routes = set()
+        self.latencies = []  # (event kind, seconds)
+
+    # applies a change event to the routes it affects and returns what it did
+    # O(S) for an address correction, where S is the number of unvisited stops on the package's route,
+    # O(K + C * S) for a new pickup, see add_pickup
+    def apply(self, event) -> RerouteResult:
+        start = time.perf_counter()
+        if isinstance(event, AddressCorrection):
+            route_numbers, added_miles = self.correct_address(event)
+        elif isinstance(event, NewPickup):
+            route_numbers, added_miles = self.add_pickup(event)
+        else:
+            raise ValueError("unknown change event " + type(event).__name__)
+        seconds = time.perf_counter() - start
+        self.latencies.append((event.kind, seconds))
+        return RerouteResult(event, route_numbers, added_miles, seconds)
+
+    # the package's address is updated, and if it is on an unvisited stop of a route,
+    # it is moved to the cheapest position for its new address on the same route
+    # a package at the HUB is routed to its new address when its truck leaves
+    # a package on the stop its truck is driving to is left where it is, and no route is changed
+    # O(S)
+    def correct_address(self, event: AddressCorrection):
+        package = self.data.lookup_package(event.package_id)
+        if package is None:
+            raise KeyError("no package with ID " + str(event.package_id))
+        address_index = self.data.get_address_index(event.address)
+        package.set_address(event.address)
+
+        route_number, node = self.find_node(event.package_id)
+        if node is None:
+            return [], 0.0
+        truck_route = self.truck_routes[route_number]
+        target = truck_route.get_next_stop()
+        if node is target:
+            return [], 0.0
+
+        removed_miles = self.remove(truck_route, node)
+        node.address = event.address
+        node.address_index = address_index
+        after_node, added_miles = self.cheapest_insertion(truck_route, address_index)
+        truck_route.route.insert_after(after_node, node)
+        self.stop_routes.setdefault(address_index, set()).add(route_number)
+        return [route_number], added_miles - removed_miles
+
+    # the package is added to the Data if it is new,
+    # and put on whichever nearby route on the road with room for it it adds the fewest miles to
+    # a pickup no truck on the road can take is left at its address
+    # O(K + C * S) for K addresses searched to find C candidate routes
+    def add_pickup(self, event: NewPickup):
+        package = event.package
+        if self.data.lookup_package(package.get_id()) is None:
+            self.data.hash_table.insert(package)
+        address_index = self.data.get_address_index(package.get_address())
+
+        best = None
+        for route_number in self.nearby_routes(address_index):
+            truck_route = self.truck_routes[route_number]
+            after_node, added_miles = self.cheapest_insertion(truck_route, address_index)
+            if best is None or added_miles < best[2]:
+                best = (route_number, after_node, added_miles)
+        if best is None:
+            return [], 0.0
+
+        route_number, after_node, added_miles = best
+        node = RouteNode(package)
+        node.address_index = address_index
+        self.truck_routes[route_number].route.insert_after(after_node, node)
+        self.route_numbers[package.get_id()] = route_number
+        self.stop_routes.setdefault(address_index, set()).add(route_number)
+        return [route_number], added_miles
+
+    # returns up to candidate_routes numbers of routes on the road with room for another package,
+    # nearest first by their stops, the addresses of the stops taken nearest first through a heap,
+    # and addresses at the same distance in address index order
+    # a route whose stops there have all been visited may still be returned, and is only a worse candidate
+    # O(S + K log S) for S addresses with stops, K of them taken
+    def nearby_routes(self, address_index):
+        self.index_routes()
+        route_numbers = []
+        distance_matrix = self.data.distance_matrix
+        distance_row = address_index * self.data.address_count
+        queue = [(distance_matrix[distance_row + stop_index], stop_index) for stop_index in self.stop_routes]
+        heapq.heapify(queue)
+        while queue:
+            neighbour_index = heapq.heappop(queue)[1]
+            for route_number in self.stop_routes[neighbour_index]:
+                if route_number in route_numbers:
+                    continue
+                truck_route = self.truck_routes[route_number]
+                if truck_route.get_next_stop() is None or self.unvisited_count(truck_route) >= truck_route.MAX_PACKAGES:
+                    continue
+                route_numbers.append(route_number)
+            if len(route_numbers) >= self.candidate_routes:
+                break
+        return route_numbers
+
+    # indexes the packages and stops of the routes that have left since the last call
+    # O(1) amortized
+    def index_routes(self):
+        if len(self.indexed_routes) == len(self.truck_routes):
+            return
+        for route_number, truck_route in self.truck_routes.items():
+            if route_number not in self.indexed_routes:
+                self.indexed_routes.add(route_number)
+                for node in truck_route.route.get_nodes():
+                    self.route_numbers[node.package_id] = route_number
+                    self.stop_routes.setdefault(node.address_index, set()).add(route_number)
+
+    # returns the route number and node of the given package, or (None, None) if it is on no route
+    # or has been delivered, as visited nodes cannot change
+    # O(1)
+    def find_node(self, package_id):
+        self.index_routes()
+        route_number = self.route_numbers.get(package_id)
+        if route_number is None:
+            return None, None
+        truck_route = self.truck_routes[route_number]
+        node = truck_route.route.find(package_id)
+        if node is None or node.visited or truck_route.get_next_stop() is None:
+            return None, None
+        return route_number, node
+
+    # O(S)
+    def unvisited_count(self, truck_route: TruckRoute):
+        count = 0
+        node = truck_route.get_next_stop()
+        while node:
+            count += 1
+            node = node.next
+        return count
+
+    # returns the node after which a stop at address_index adds the fewest miles to the route,
+    # and the miles it adds
+    # only positions after the stop the truck is driving to are considered
+    # O(S)
+    def cheapest_insertion(self, truck_route: TruckRoute, address_index):
+        route = truck_route.route
+        data = self.data
+        best_node = None
+        best_miles = None
+        node = truck_route.get_next_stop()
+        while node:
+            next_index = node.next.address_index if node.next else route.depot_index
+            added_miles = (data.get_distance_by_index(node.address_index, address_index)
+                           + data.get_distance_by_index(address_index, next_index)
+                           - data.get_distance_by_index(node.address_index, next_index))
+            if best_miles is None or added_miles < best_miles:
+                best_node = node
+                best_miles = added_miles
+            node = node.next
+        return best_node, best_miles
+
+    # unlinks a node that is not the first on its route, and returns the miles this saves
+    # O(S) in the nodes after it
+    def remove(self, truck_route: TruckRoute, node: RouteNode):
+        route = truck_route.route
+        prev_node = node.prev
+        next_index = node.next.address_index if node.next else route.depot_index
+        saved_miles = (self.data.get_distance_by_index(prev_node.address_index, node.address_index)
+                       + self.data.get_distance_by_index(node.address_index, next_index)
+                       - self.data.get_distance_by_index(prev_node.address_index, next_index))
+        route.remove(node)
+        return saved_miles
+
+    # returns the count, mean, median, 95th percentile and maximum of the seconds taken per event
+    # O(E log E) for E events
+    def latency_summary(self):
+        seconds = sorted(event_seconds for kind, event_seconds in self.latencies)
+        if not seconds:
+            return {"events": 0}
+        return {
+            "events": len(seconds),
+            "mean": sum(seconds) / len(seconds),
+            "p50": seconds[len(seconds) // 2],
+            "p95": seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))],
+            "max": seconds[-1],
+        }
@@ -0,0 +1,232 @@
+# builds the distances between addresses from a road graph instead of distance_data.csv
+# run with: python RoadGraph.py roads.csv output_directory [--addresses address_list.csv] [--packages package_data.csv]
+# to write address_list.csv and distance_data.csv files built from the road graph
+#
+# each row of the road graph is one road, which can be driven both ways
+# from,to,miles
+# where from and to are addresses from address_list.csv or the names of intersections,
+# so only the roads need entering, and a new address needs only the roads to it
+# a header row, with text in the miles column, is skipped
+#
+# the distance between two addresses is the length of the shortest path between them, found with Dijkstra's algorithm
+
+import argparse
+import csv
+import heapq
+import os
+from array import array
+from collections import OrderedDict
+
+INFINITY = float('inf')
+
+# path lengths are rounded to a millionth of a mile,
+# so a path of roads given in tenths is a tenth of a mile as distance_data.csv would give it
+PLACES = 6
+
+
+# RoadGraph holds the roads of a road graph in adjacency arrays:
+# the roads from node i are at positions offsets[i] to offsets[i + 1] of road_ends and road_miles
+class RoadGraph:
+    def __init__(self, node_names, roads):
+        self.node_names = node_names
+        self.node_index = {name: i for i, name in enumerate(node_names)}
+
+        # O(V + E)
+        degrees = [0] * (len(node_names) + 1)
+        for from_index, to_index, miles in roads:
+            degrees[from_index + 1] += 1
+            degrees[to_index + 1] += 1
+        self.offsets = array('i', degrees)
+        for i in range(1, len(self.offsets)):
+            self.offsets[i] += self.offsets[i - 1]
+        self.road_ends = array('i', bytes(4 * self.offsets[-1]))
+        self.road_miles = array('d', bytes(8 * self.offsets[-1]))
+        positions = array('i', self.offsets[:-1])
+        for from_index, to_index, miles in roads:
+            for start, end in ((from_index, to_index), (to_index, from_index)):
+                self.road_ends[positions[start]] = end
+                self.road_miles[positions[start]] = miles
+                positions[start] += 1
+
+    # O(1)
+    def __contains__(self, name):
+        return name in self.node_index
+
+    # O(1)
+    def node_count(self):
+        return len(self.node_names)
+
+    # returns the length of the shortest path from the source node to every node, INFINITY where there is none
+    # given target indexes, the search stops once all of them are reached,
+    # and only the distances to the targets and the nodes nearer than them are final
+    # O(E log V)
+    def shortest_distances(self, source_index, target_indexes=None) -> array:
+        distances = array('d', [INFINITY]) * len(self.node_names)
+        distances[source_index] = 0.0
+        remaining = None if target_indexes is None else set(target_indexes)
+        offsets = self.offsets
+        road_ends = self.road_ends
+        road_miles = self.road_miles
+        settled = bytearray(len(self.node_names))
+        queue = [(0.0, source_index)]
+        while queue:
+            distance, node = heapq.heappop(queue)
+            if settled[node]:
+                continue
+            settled[node] = 1
+            if remaining is not None:
+                remaining.discard(node)
+                if not remaining:
+                    break
+            for position in range(offsets[node], offsets[node + 1]):
+                end = road_ends[position]
+                end_distance = distance + road_miles[position]
+                if end_distance < distances[end]:
+                    distances[end] = end_distance
+                    heapq.heappush(queue, (end_distance, end))
+        return distances
+
+
+# reads a road graph from a CSV file laid out as described at the top of this file
+# raises ValueError for a road with a negative length
+# O(E)
+def read_road_graph(file_path) -> RoadGraph:
+    node_index = {}
+    node_names = []
+    roads = []
+    with open(file_path, mode='r', encoding='utf-8-sig', newline='') as road_file:
+        for line_number, row in enumerate(csv.reader(road_file, delimiter=','), start=1):
+            if not row:
+                continue
+            try:
+                miles = float(row[2])
+            except (IndexError, ValueError):
+                if line_number == 1:
+                    continue
+                raise ValueError("line " + str(line_number) + ": expected from,to,miles")
+            if miles < 0:
+                raise ValueError("line " + str(line_number) + ": a road cannot be " + row[2] + " miles long")
+            ends = []
+            for name in (row[0].strip(), row[1].strip()):
+                if name not in node_index:
+                    node_index[name] = len(node_names)
+                    node_names.append(name)
+                ends.append(node_index[name])
+            roads.append((ends[0], ends[1], miles))
+    return RoadGraph(node_names, roads)
+
+
+# RowCache answers distance queries between the given addresses of a road graph on demand,
+# laid out as Data.distance_matrix, so the distance between addresses i and j is at position i * A + j,
+# keeping the shortest path distances from the max_rows source addresses used most recently
+# raises ValueError for an address that is not on the graph, and, when it is looked up, for a pair no road joins
+class RowCache:
+    def __init__(self, graph: RoadGraph, addresses, max_rows=256):
+        for address in addresses:
+            if address not in graph:
+                raise ValueError("address " + address + " is not on the road graph")
+        self.graph = graph
+        self.addresses = addresses
+        self.node_indexes = [graph.node_index[address] for address in addresses]
+        self.address_count = len(addresses)
+        self.max_rows = max_rows
+        self.rows = OrderedDict()  # source address index: distances from it, least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    # O(1)
+    def __len__(self):
+        return self.address_count * self.address_count
+
+    # returns the distance between addresses i and j at position i * A + j
+    # O(1) if the row of either is cached, O(E log V) otherwise
+    def __getitem__(self, position):
+        i, j = divmod(position, self.address_count)
+        if j in self.rows and i not in self.rows:
+            i, j = j, i
+        distance = self.row(i)[self.node_indexes[j]]
+        if distance == INFINITY:
+            raise ValueError("no road joins " + self.addresses[i] + " and " + self.addresses[j])
+        return round(distance, PLACES)
+
+    # returns the distances from the given address to every node of the graph
+    # O(1) if the row is cached, O(E log V) otherwise
+    def row(self, address_index):
+        row = self.rows.get(address_index)
+        if row is not None:
+            self.hits += 1
+            self.rows.move_to_end(address_index)
+            return row
+        self.misses += 1
+        row = self.graph.shortest_distances(self.node_indexes[address_index])
+        self.rows[address_index] = row
+        if len(self.rows) > self.max_rows:
+            self.rows.popitem(last=False)
+        return row
+
+
+# returns the first address, the HUB, followed by every other address of address_list a package goes to,
+# in address_list order, so only the distances the day needs are built
+# O(A + P)
+def manifest_addresses(address_list, packages):
+    package_addresses = {package.get_address() for package in packages}
+    return address_list[:1] + [address for address in address_list[1:] if address in package_addresses]
+
+
+# builds a flat, symmetric distance matrix between the given addresses, laid out as Data.distance_matrix,
+# from the shortest paths of the road graph
+# each search stops once it has reached the addresses before its own, so each pair is searched once
+# raises ValueError for an address that is not on the graph, or that no road reaches
+# O(A * E log V) for A addresses
+def build_road_distance_matrix(graph: RoadGraph, addresses):
+    for address in addresses:
+        if address not in graph:
+            raise ValueError("address " + address + " is not on the road graph")
+    node_indexes = [graph.node_index[address] for address in addresses]
+    size = len(addresses)
+    distance_matrix = array('d', bytes(8 * size * size))
+    for i in range(1, size):
+        distances = graph.shortest_distances(node_indexes[i], node_indexes[:i])
+        for j in range(i):
+            distance = distances[node_indexes[j]]
+            if distance == INFINITY:
+                raise ValueError("no road joins " + addresses[i] + " and " + addresses[j])
+            distance = round(distance, PLACES)
+            distance_matrix[i * size + j] = distance
+            distance_matrix[j * size + i] = distance
+    return distance_matrix
+
+
+# writes the address list and distance matrix in the layouts of address_list.csv and distance_data.csv,
+# with any quotes in an address doubled as CSV escapes them
+# O(A^2)
+def write_distance_files(address_file, distance_file, address_list, distance_matrix):
+    size = len(address_list)
+    with open(address_file, 'w', encoding='utf-8', newline='') as address_csv:
+        writer = csv.writer(address_csv, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        for address in address_list:
+            writer.writerow([address])
+    with open(distance_file, 'w', encoding='utf-8', newline='') as distance_csv:
+        writer = csv.writer(distance_csv, lineterminator='\n')
+        padding = [''] * size
+        for i in range(size):
+            row = [str(distance_matrix[i * size + j]) for j in range(i + 1)]
+            writer.writerow(row + padding[i + 1:])
+
+
+if __name__ == '__main__':
+    # imported here, as Data imports this module
+    from Data import Data
+
+    parser = argparse.ArgumentParser(description="Build address and distance files from a road graph.")
+    parser.add_argument("road_graph")
+    parser.add_argument("directory")
+    parser.add_argument("--addresses", default='address_list.csv')
+    parser.add_argument("--packages", default=None, help="only keep the addresses these packages go to")
+    args = parser.parse_args()
+
+    data = Data(args.addresses, None, args.packages, road_graph_file=args.road_graph)
+    os.makedirs(args.directory, exist_ok=True)
+    write_distance_files(os.path.join(args.directory, 'address_list.csv'),
+                         os.path.join(args.directory, 'distance_data.csv'), data.address_list, data.distance_matrix)
+    print(data.address_count, "addresses written to", args.directory)
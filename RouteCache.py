@@ -0,0 +1,101 @@
+import collections
+import json
+import os
+
+from Snapshot import source_stamps
+
+# a route cache file holds the visit orders planned for truck loads, so later runs can reuse them
+# it is a JSON object with the modification time and size of each file the distances came from,
+# and the plans from least to most recently used:
+# {"sources": [[mtime_ns, size], ...], "plans": [[key, [address, ...], miles, seconds], ...]}
+# a key is the planner, the depot address, the departure time and the stops with their deadlines, as JSON
+# when a source file has changed, every plan is dropped, as its distances may no longer hold
+VERSION = 1
+
+
+# RoutePlanCache keeps up to max_plans planned visit orders, keyed on the stops they visit,
+# evicting the least recently used, and is read from and saved to cache_file
+# hits and misses are counted, with the seconds the plans found would have taken to make again
+class RoutePlanCache:
+    def __init__(self, cache_file, source_files, max_plans=1000):
+        self.cache_file = cache_file
+        self.source_files = source_files
+        self.max_plans = max_plans
+        self.plans = collections.OrderedDict()  # key: (addresses in visiting order, miles, seconds to plan)
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self.invalidated = False
+        self.load()
+
+    # reads the plans in cache_file, if it exists and its sources have not changed since it was saved
+    # a file that cannot be read is treated as empty, and replaced when the cache is saved
+    # O(P) for P plans
+    def load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, mode='r', encoding='utf-8') as cache_json:
+                contents = json.load(cache_json)
+            if contents.get("version") != VERSION:
+                return
+            if [tuple(stamp) for stamp in contents["sources"]] != source_stamps(self.source_files):
+                self.invalidated = True
+                return
+            for key, addresses, miles, seconds in contents["plans"][-self.max_plans:]:
+                self.plans[key] = (addresses, miles, seconds)
+        except (OSError, ValueError, KeyError, TypeError):
+            self.plans.clear()
+
+    # writes the plans to cache_file beside the old one and renames it over it,
+    # so a run reading the old file is never left with a partial one
+    # O(P)
+    def save(self):
+        contents = {"version": VERSION, "sources": source_stamps(self.source_files),
+                    "plans": [[key, addresses, miles, seconds] for key, (addresses, miles, seconds) in self.plans.items()]}
+        temporary_file = self.cache_file + '.' + str(os.getpid()) + '.tmp'
+        with open(temporary_file, mode='w', encoding='utf-8') as cache_json:
+            json.dump(contents, cache_json)
+        os.replace(temporary_file, self.cache_file)
+
+    # returns the key of a truck load: the planner that orders it, the depot's address, the departure time,
+    # and its stops' addresses, each with the earliest deadline there in minutes, sorted
+    # loads with the same stops have the same key whatever order their packages are in
+    # O(S log S) for S stops
+    @staticmethod
+    def make_key(planner, depot_address, departure_time, stop_deadlines):
+        departure = departure_time.strftime("%H:%M") if departure_time else None
+        return json.dumps([planner, depot_address, departure, sorted(stop_deadlines.items())])
+
+    # returns the addresses of the plan for key in visiting order, or None, and marks the plan as just used
+    # O(1)
+    def get(self, key):
+        plan = self.plans.get(key)
+        if plan is None:
+            self.misses += 1
+            return None
+        self.plans.move_to_end(key)
+        self.hits += 1
+        self.seconds_saved += plan[2]
+        return plan[0]
+
+    # stores a plan, evicting the least recently used plan if the cache is full
+    # O(1)
+    def put(self, key, addresses, miles, seconds):
+        self.plans[key] = (list(addresses), miles, seconds)
+        self.plans.move_to_end(key)
+        while len(self.plans) > self.max_plans:
+            self.plans.popitem(last=False)
+
+    # returns the share of lookups that found a plan
+    # O(1)
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    # returns a line reporting the hits, misses and seconds saved
+    # O(1)
+    def summary(self):
+        return ("Route cache: " + str(self.hits) + " hits, " + str(self.misses) + " misses ("
+                + format(self.hit_rate(), ".0%") + "), " + format(self.seconds_saved * 1000, ".1f") + " ms saved"
+                + (", cleared as the distances changed" if self.invalidated else ""))
@@ -0,0 +1,239 @@
+import heapq
+import time
+from collections import deque
+
+from Data import Data
+from TruckRoute import Route
+
+# improvements smaller than this are rounding error, not real savings
+EPSILON = 1e-9
+
+
+# RouteOptimizer shortens a Route before the truck leaves with 2-opt and Or-opt moves
+# packages at the same address stay together as one stop and keep their order
+# candidate moves only join a stop to one of its nearest stops on the route,
+# and stops that gave no improvement are skipped until a neighbouring edge changes (don't-look bits)
+# a move is only kept if it does not add to the minutes packages are late by,
+# and packages never change trucks, so the truck notes in package_data.csv still hold
+class RouteOptimizer:
+    def __init__(self, data: Data, time_budget=0.5, neighbour_count=8, max_segment_length=3):
+        self.data = data
+        self.time_budget = time_budget
+        self.neighbour_count = neighbour_count
+        self.max_segment_length = max_segment_length
+
+        # (truck_id, pass name, miles before, miles after) for every pass run
+        self.reports = []
+
+    # improves the given route, which must not have been started yet
+    # departure_time is when the truck leaves the HUB and mph is its speed
+    # returns (pass name, miles before, miles after) for each pass
+    # O(N * K) per pass, where K is neighbour_count, plus O(N) for each improving move
+    def improve(self, route: Route, departure_time, mph, truck_id=None):
+        nodes = route.get_nodes()
+        if not nodes:
+            return []
+        self.deadline = time.perf_counter() + self.time_budget
+
+        # group nodes into stops, one per run of nodes at the same address
+        self.stop_nodes = []
+        self.stop_addresses = []
+        for node in nodes:
+            if self.stop_addresses and self.stop_addresses[-1] == node.address_index:
+                self.stop_nodes[-1].append(node)
+            else:
+                self.stop_nodes.append([node])
+                self.stop_addresses.append(node.address_index)
+
+        # the tour is stop numbers with the route's depot, as -1, at both ends
+        stop_count = len(self.stop_nodes)
+        self.hub_index = route.depot_index
+        self.tour = [-1] + list(range(stop_count)) + [-1]
+        self.positions = list(range(1, stop_count + 1))
+        self.departure_minutes = departure_time.hour * 60 + departure_time.minute if departure_time else 0
+        self.minutes_per_mile = 60 / mph
+        self.stop_deadlines = []
+        for stop_nodes in self.stop_nodes:
+            deadlines = []
+            for node in stop_nodes:
+                deadline = self.data.lookup_package(node.package_id).get_deadline_minutes()
+                if deadline is not None:
+                    deadlines.append(deadline)
+            self.stop_deadlines.append(deadlines)
+        self.has_deadlines = any(self.stop_deadlines)
+        self.neighbours = [self.find_neighbours(stop) for stop in range(stop_count)]
+
+        passes = []
+        improved = True
+        while improved and not self.out_of_time():
+            improved = False
+            for pass_name, run_pass in (("2-opt", self.two_opt_pass), ("or-opt", self.or_opt_pass)):
+                before = self.tour_length(self.tour)
+                run_pass()
+                after = self.tour_length(self.tour)
+                passes.append((pass_name, before, after))
+                self.reports.append((truck_id, pass_name, before, after))
+                if after < before - EPSILON:
+                    improved = True
+
+        ordered_nodes = []
+        for stop in self.tour[1:-1]:
+            ordered_nodes.extend(self.stop_nodes[stop])
+        route.reorder(ordered_nodes)
+        return passes
+
+    # O(1)
+    def out_of_time(self):
+        return time.perf_counter() > self.deadline
+
+    # returns the address index of a stop, or of the depot for -1
+    # O(1)
+    def address_of(self, stop):
+        return self.hub_index if stop < 0 else self.stop_addresses[stop]
+
+    # returns the distance between two stops
+    # O(1)
+    def distance(self, stop1, stop2):
+        return self.data.get_distance_by_index(self.address_of(stop1), self.address_of(stop2))
+
+    # returns the nearest neighbour_count stops on this route to the given stop, nearest first,
+    # and stops at the same distance in address index order
+    # O(S log K) for S stops on the route, where K is neighbour_count
+    def find_neighbours(self, stop):
+        stops_at = {}
+        for other_stop, address_index in enumerate(self.stop_addresses):
+            if other_stop != stop:
+                stops_at[address_index] = other_stop
+        stop_address = self.stop_addresses[stop]
+        nearest = heapq.nsmallest(self.neighbour_count, (
+            (self.data.get_distance_by_index(stop_address, address_index), address_index)
+            for address_index in stops_at))
+        return [stops_at[address_index] for distance, address_index in nearest]
+
+    # O(N)
+    def tour_length(self, tour):
+        length = 0.0
+        for i in range(len(tour) - 1):
+            length += self.distance(tour[i], tour[i + 1])
+        return length
+
+    # returns the total minutes packages on the tour would be late by
+    # O(N)
+    def lateness(self, tour):
+        if not self.has_deadlines:
+            return 0.0
+        minutes_late = 0.0
+        route_distance = 0.0
+        for i in range(1, len(tour) - 1):
+            route_distance += self.distance(tour[i - 1], tour[i])
+            arrival = self.departure_minutes + route_distance * self.minutes_per_mile
+            for deadline in self.stop_deadlines[tour[i]]:
+                if arrival > deadline:
+                    minutes_late += arrival - deadline
+        return minutes_late
+
+    # keeps new_tour if it is no later than the current tour
+    # O(N)
+    def try_tour(self, new_tour):
+        if self.has_deadlines and self.lateness(new_tour) > self.lateness(self.tour) + EPSILON:
+            return False
+        self.tour = new_tour
+        for position in range(1, len(new_tour) - 1):
+            self.positions[new_tour[position]] = position
+        return True
+
+    # repeats 2-opt moves until none of them shorten the tour, or time runs out
+    # a 2-opt move reverses the stops between two edges, joining a stop to one of its neighbours
+    # O(N * K) plus O(N) per improving move
+    def two_opt_pass(self):
+        active = deque(range(len(self.stop_nodes)))
+        is_active = [True] * len(self.stop_nodes)
+        while active and not self.out_of_time():
+            stop = active.popleft()
+            is_active[stop] = False
+            for i, j in self.two_opt_moves(stop):
+                tour = self.tour
+                new_tour = tour[:i + 1] + tour[j:i:-1] + tour[j + 1:]
+                changed = (tour[i], tour[i + 1], tour[j], tour[j + 1])
+                if self.try_tour(new_tour):
+                    for changed_stop in changed:
+                        if changed_stop >= 0 and not is_active[changed_stop]:
+                            is_active[changed_stop] = True
+                            active.append(changed_stop)
+                    break
+
+    # yields (i, j) for each 2-opt move around the given stop that shortens the tour,
+    # where the move reverses tour[i + 1:j + 1]
+    # O(K)
+    def two_opt_moves(self, stop):
+        tour = self.tour
+        p = self.positions[stop]
+        for neighbour in self.neighbours[stop]:
+            q = self.positions[neighbour]
+            # join stop to neighbour after reversing, on the side of each one's successor or predecessor
+            for i, j in ((min(p, q), max(p, q)), (min(p, q) - 1, max(p, q) - 1)):
+                if i < 0 or j >= len(tour) - 1 or j <= i + 1:
+                    continue
+                gain = (self.distance(tour[i], tour[i + 1]) + self.distance(tour[j], tour[j + 1])
+                        - self.distance(tour[i], tour[j]) - self.distance(tour[i + 1], tour[j + 1]))
+                if gain > EPSILON:
+                    yield i, j
+
+    # repeats Or-opt moves until none of them shorten the tour, or time runs out
+    # an Or-opt move takes up to max_segment_length stops and puts them, either way round,
+    # next to a neighbour of the first stop
+    # O(N * K * L) plus O(N) per improving move
+    def or_opt_pass(self):
+        active = deque(range(len(self.stop_nodes)))
+        is_active = [True] * len(self.stop_nodes)
+        while active and not self.out_of_time():
+            stop = active.popleft()
+            is_active[stop] = False
+            for new_tour, changed in self.or_opt_moves(stop):
+                if self.try_tour(new_tour):
+                    for changed_stop in changed:
+                        if changed_stop >= 0 and not is_active[changed_stop]:
+                            is_active[changed_stop] = True
+                            active.append(changed_stop)
+                    break
+
+    # yields (new tour, stops whose edges changed) for each Or-opt move of a segment
+    # starting at the given stop that shortens the tour
+    # O(K * L) plus O(N) per move yielded
+    def or_opt_moves(self, stop):
+        tour = self.tour
+        p = self.positions[stop]
+        for segment_length in range(1, self.max_segment_length + 1):
+            end = p + segment_length - 1
+            if end >= len(tour) - 1:
+                break
+            first = tour[p]
+            last = tour[end]
+            before = tour[p - 1]
+            after = tour[end + 1]
+            removal_gain = self.distance(before, first) + self.distance(last, after) - self.distance(before, after)
+            if removal_gain <= EPSILON:
+                continue
+
+            for neighbour in self.neighbours[stop]:
+                q = self.positions[neighbour]
+                if p <= q <= end:
+                    continue
+                # insert between the neighbour and the stop after it, or the stop before it
+                for u_position in (q, q - 1):
+                    if p - 1 <= u_position <= end:
+                        continue
+                    u = tour[u_position]
+                    v = tour[u_position + 1]
+                    for reverse in (False, True):
+                        head, tail = (last, first) if reverse else (first, last)
+                        added = self.distance(u, head) + self.distance(tail, v) - self.distance(u, v)
+                        if removal_gain - added <= EPSILON:
+                            continue
+                        segment = tour[p:end + 1]
+                        if reverse:
+                            segment.reverse()
+                        rest = tour[:p] + tour[end + 1:]
+                        insert_at = u_position + 1 if u_position < p else u_position + 1 - segment_length
+                        new_tour = rest[:insert_at] + segment + rest[insert_at:]
+                        yield new_tour, (before, after, first, last, u, v)
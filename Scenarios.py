@@ -0,0 +1,199 @@
+# runs a batch of what-if plans for the day side by side
+# run with: python Scenarios.py [scenarios.csv] [--workers N]
+# each row of scenarios.csv is
+# name,first_departure,delayed_departure,correction_time,corrected_address,truck_count,optimize,assignment,
+# exact_stop_limit
+# with times in 24-hour HHMM format; every column after name may be left empty to use the default
+# assignment is "notes" for the package lists of Data.determine_package_lists,
+# or "engine" for those of Assignment.assign_package_lists,
+# and exact_stop_limit is the most stops a route can have to be ordered exactly, 0 for nearest neighbour only
+
+import argparse
+import csv
+import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+from Package import Package, deadline_to_minutes
+from Data import Data
+from Scheduler import DeliveryDay
+from RouteOptimizer import RouteOptimizer
+from Assignment import TruckPlan, assign_package_lists
+from HeldKarp import STOP_LIMIT
+
+DAY = datetime.date(2022, 1, 1)
+END_OF_DAY = "1800"
+
+
+# given a time in 24-hour HHMM format, returns that time on the simulated day
+# O(1)
+def parse_time(hhmm):
+    return datetime.datetime.combine(DAY, datetime.datetime.strptime(hhmm, "%H%M").time())
+
+
+# given a time in 24-hour HHMM format, returns the number of minutes after midnight it falls on
+# O(1)
+def minutes_of(hhmm):
+    return int(hhmm[:2]) * 60 + int(hhmm[2:])
+
+
+# Scenario holds one what-if plan for the day
+class Scenario:
+    def __init__(
+            self,
+            name,
+            first_departure="0800",
+            delayed_departure="0905",
+            correction_time="1020",
+            corrected_address="410 S State St",
+            truck_count=3,
+            optimize=False,
+            assignment="notes",
+            second_departure="1000",
+            exact_stop_limit=STOP_LIMIT):
+        self.name = name
+        self.first_departure = first_departure
+        self.delayed_departure = delayed_departure
+        self.correction_time = correction_time
+        self.corrected_address = corrected_address
+        self.truck_count = int(truck_count)
+        self.optimize = optimize
+        self.assignment = assignment
+        # when the engine expects route 2 to leave; it leaves once truck 1 is back, which is only known later
+        self.second_departure = second_departure
+        self.exact_stop_limit = int(exact_stop_limit)
+
+
+# ScenarioResult holds the outcome of one scenario
+class ScenarioResult:
+    def __init__(self, name, total_distance, latest_delivery, deadline_misses):
+        self.name = name
+        self.total_distance = total_distance
+        self.latest_delivery = latest_delivery
+        self.deadline_misses = deadline_misses
+
+    # O(1)
+    def format_row(self):
+        latest = datetime.datetime.strftime(self.latest_delivery, "%H:%M") if self.latest_delivery else "--:--"
+        return (self.name.ljust(24) + format(self.total_distance, ".1f").rjust(10)
+                + latest.rjust(10) + str(self.deadline_misses).rjust(8))
+
+
+# runs a scenario on its own copy of the given base Data
+# O(N^2)
+def run_scenario(base_data: Data, scenario: Scenario) -> ScenarioResult:
+    data = base_data.copy()
+    data.lookup_package(9).status = "on hold"
+    if scenario.assignment == "engine":
+        assign_package_lists(data, [
+            TruckPlan(1, departure_minutes=minutes_of(scenario.first_departure)),
+            TruckPlan(2, departure_minutes=minutes_of(scenario.second_departure)),
+            TruckPlan(3, departure_minutes=minutes_of(scenario.delayed_departure))])
+    else:
+        data.determine_package_lists()
+
+    optimizer = RouteOptimizer(data) if scenario.optimize else None
+    day = DeliveryDay(
+        data,
+        parse_time(scenario.first_departure),
+        parse_time(scenario.delayed_departure),
+        parse_time(scenario.correction_time),
+        parse_time(END_OF_DAY),
+        corrected_address=scenario.corrected_address,
+        optimizer=optimizer,
+        truck_count=scenario.truck_count,
+        exact_stop_limit=scenario.exact_stop_limit)
+    day.run()
+
+    total_distance = 0.0
+    for truck_route in day.truck_routes.values():
+        total_distance += truck_route.route.sum_length()
+
+    # a package is missed if it is delivered after its deadline, or not delivered at all
+    latest_delivery = None
+    deadline_misses = 0
+    for package in data.hash_table:
+        delivery_time = package.get_delivery_time()
+        if delivery_time == -1:
+            deadline_misses += 1
+            continue
+        if latest_delivery is None or delivery_time > latest_delivery:
+            latest_delivery = delivery_time
+        deadline = deadline_to_minutes(package.get_deadline())
+        if deadline is not None and delivery_time.hour * 60 + delivery_time.minute > deadline:
+            deadline_misses += 1
+
+    return ScenarioResult(scenario.name, total_distance, latest_delivery, deadline_misses)
+
+
+# the base Data of each worker process, set once by init_worker
+worker_data = None
+
+
+# O(1)
+def init_worker(base_data: Data):
+    global worker_data
+    worker_data = base_data
+
+
+# O(N^2)
+def run_scenario_in_worker(scenario: Scenario) -> ScenarioResult:
+    return run_scenario(worker_data, scenario)
+
+
+# runs every scenario in a pool of worker processes and returns their results in the order given
+# the CSV files are parsed once, here, and the parsed Data is handed to each worker when it starts
+# O(S * N^2 / W) for S scenarios and W workers
+def run_scenarios(scenarios: [Scenario], max_workers=None, base_data: Data = None) -> [ScenarioResult]:
+    if base_data is None:
+        base_data = Data(snapshot_file='data_snapshot.bin')
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker, initargs=(base_data,)) as executor:
+        return list(executor.map(run_scenario_in_worker, scenarios))
+
+
+# reads scenarios from a CSV file laid out as described at the top of this file
+# O(S)
+def read_scenarios(file_path) -> [Scenario]:
+    scenarios = []
+    with open(file_path, mode='r', encoding='utf-8-sig') as scenario_file:
+        for row in csv.reader(scenario_file, delimiter=','):
+            if not row or not row[0].strip() or row[0].strip() == "name":
+                continue
+            values = [value.strip() for value in row]
+            options = {}
+            for i, option in enumerate(("first_departure", "delayed_departure", "correction_time",
+                                        "corrected_address", "truck_count", "optimize", "assignment",
+                                        "exact_stop_limit"),
+                                       start=1):
+                if i < len(values) and values[i]:
+                    options[option] = values[i]
+            if "optimize" in options:
+                options["optimize"] = options["optimize"].lower() in ("1", "true", "yes")
+            scenarios.append(Scenario(values[0], **options))
+    return scenarios
+
+
+# the plans compared when no scenario file is given
+DEFAULT_SCENARIOS = [
+    Scenario("baseline"),
+    Scenario("nearest neighbour only", exact_stop_limit=0),
+    Scenario("optimized routes", optimize=True),
+    Scenario("assignment engine", assignment="engine"),
+    Scenario("engine, optimized routes", optimize=True, assignment="engine"),
+    Scenario("truck 1 at 08:30", first_departure="0830"),
+    Scenario("truck 3 at 09:30", delayed_departure="0930"),
+    Scenario("correction at 09:30", correction_time="0930"),
+    Scenario("correction at 11:00", correction_time="1100"),
+    Scenario("two trucks", truck_count=2),
+    Scenario("one truck", truck_count=1),
+]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare what-if plans for the day in parallel.")
+    parser.add_argument("scenario_file", nargs="?", help="CSV file of scenarios")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    batch = read_scenarios(args.scenario_file) if args.scenario_file else DEFAULT_SCENARIOS
+    print("scenario".ljust(24) + "miles".rjust(10) + "latest".rjust(10) + "missed".rjust(8))
+    for result in run_scenarios(batch, args.workers):
+        print(result.format_row())
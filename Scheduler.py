@@ -0,0 +1,273 @@
+import datetime
+import heapq
+from bisect import bisect_right
+
+from Package import Package, PackageStatus, format_status
+from Data import Data
+from TruckRoute import TruckRoute
+from Rerouting import Rerouter
+from HeldKarp import HeldKarpSolver, STOP_LIMIT
+
+# event kinds
+# events at the same minute are handled in this order,
+# matching the order of the checks in the minute-by-minute loop
+ADDRESS_CORRECTION = 0
+DEPARTURE = 1
+ARRIVAL = 2
+HUB_RETURN = 3
+
+ONE_MINUTE = datetime.timedelta(0, 60)
+
+
+# Scheduler is a discrete-event queue
+# events are (time, kind, order, handler, args) tuples kept in a heap,
+# so the cost of a simulation depends on the number of events, not the number of minutes
+class Scheduler:
+    def __init__(self, start_time: datetime.datetime):
+        self.time = start_time
+        self.events = []
+        self.event_count = 0
+
+    # schedules handler(time, *args) to run at the given time
+    # O(log N)
+    def schedule(self, time, kind, handler, *args):
+        heapq.heappush(self.events, (time, kind, self.event_count, handler, args))
+        self.event_count += 1
+
+    # returns the time of the next event, or None if there are no events left
+    # O(1)
+    def next_time(self):
+        if self.events:
+            return self.events[0][0]
+        return None
+
+    # handles every event up to and including end_time, in time order
+    # O(N log N)
+    def run_until(self, end_time):
+        while self.events and self.events[0][0] <= end_time:
+            time, kind, order, handler, args = heapq.heappop(self.events)
+            self.time = time
+            handler(time, *args)
+        if end_time > self.time:
+            self.time = end_time
+
+
+# DeliveryDay schedules the day's deliveries as events
+# truck 1 leaves at first_departure, truck 3 leaves with the delayed packages at delayed_departure,
+# truck 2 leaves once truck 1 has returned,
+# and truck 3 leaves again with the corrected package once it has returned and the correction is in
+# routes are numbered 1 to 4 in that order, as truck_route1 to truck_route4 were in main.py
+# with fewer than 3 trucks, truck N drives the routes meant for trucks N, N + truck_count, ...
+# and a route waits at the HUB until its truck is back
+# routes with few enough stops are ordered exactly by exact_solver,
+# or if none is given, by a HeldKarpSolver for routes of at most exact_stop_limit stops;
+# an exact_stop_limit of 0 or None orders every route by nearest neighbour
+# and with a plan_cache, a RoutePlanCache, loads ordered on an earlier run are given the same order
+class DeliveryDay:
+    def __init__(
+            self,
+            data: Data,
+            first_departure: datetime.datetime,
+            delayed_departure: datetime.datetime,
+            correction_time: datetime.datetime,
+            end_of_day: datetime.datetime,
+            corrected_package_id=9,
+            corrected_address="410 S State St",
+            instruments=None,
+            optimizer=None,
+            route_builder=None,
+            truck_count=3,
+            exact_solver=None,
+            plan_cache=None,
+            exact_stop_limit=STOP_LIMIT):
+        self.data = data
+        self.first_departure = first_departure
+        self.delayed_departure = delayed_departure
+        self.correction_time = correction_time
+        self.end_of_day = end_of_day
+        self.corrected_package_id = corrected_package_id
+        self.corrected_address = corrected_address
+        self.instruments = instruments
+        self.optimizer = optimizer
+        self.route_builder = route_builder
+        self.truck_count = truck_count
+        self.exact_solver = exact_solver
+        if exact_solver is None and exact_stop_limit:
+            self.exact_solver = HeldKarpSolver(data, exact_stop_limit)
+        self.plan_cache = plan_cache
+        self.scheduler = Scheduler(first_departure)
+
+        self.truck_routes = {}
+        self.departure_times = {}
+        self.package_lists = {}
+        self.hub_return_times = {}
+        self.trucks_out = {}
+        self.waiting_routes = {}
+        self.corrected = False
+        self.finish_time = None
+        self.rerouter = Rerouter(self.data, self.truck_routes)
+        self.change_results = []
+
+        # status and address history of every package, used to answer queries about earlier times
+        self.history_times = {}
+        self.history_states = {}
+        for package in self.data.hash_table:
+            self.history_times[package.get_id()] = [datetime.datetime.min]
+            self.history_states[package.get_id()] = [
+                (package.get_status_code(), package.get_status_value(), package.get_address())]
+
+        self.scheduler.schedule(first_departure, DEPARTURE, self.depart, 1, 1, self.data.package_list1)
+        self.scheduler.schedule(delayed_departure, DEPARTURE, self.depart, 3, 3, self.data.package_list3)
+        self.scheduler.schedule(correction_time, ADDRESS_CORRECTION, self.correct_address)
+
+    # schedules a change event from Rerouting, such as an AddressCorrection or a NewPickup, for its time
+    # the routes of trucks on the road are repaired when it comes in
+    # O(log N)
+    def schedule_change(self, event):
+        self.scheduler.schedule(event.time, ADDRESS_CORRECTION, self.apply_change, event)
+
+    # O(S) for an address correction, O(K + C * S) for a new pickup, see Rerouter.apply
+    def apply_change(self, time, event):
+        result = self.rerouter.apply(event)
+        self.change_results.append(result)
+        package = self.data.lookup_package(event.package_id)
+        # a new pickup has no status before it was asked for
+        if package.get_id() not in self.history_times:
+            self.history_times[package.get_id()] = [datetime.datetime.min]
+            self.history_states[package.get_id()] = [
+                (PackageStatus.OTHER, "Not yet requested", package.get_address())]
+        self.record(time, [package])
+        self.annotate_route(time, "Package " + str(event.package_id) + " " + event.kind
+                            + (", route " + ", ".join(str(n) for n in result.route_numbers) + " repaired"
+                               if result.route_numbers else ""))
+
+    # returns the route for the given route number, or None if it has not left yet
+    # or, when a time is given, had not left by that time
+    # O(1)
+    def get_truck_route(self, route_number, time=None) -> TruckRoute or None:
+        if time is not None and self.departure_times.get(route_number, time) > time:
+            return None
+        return self.truck_routes.get(route_number)
+
+    # simulates the day up to and including the given time
+    # nothing after end_of_day is simulated
+    # package states staged in the Data's package store along the way are committed at the end
+    # O(N log N)
+    def run_until(self, time):
+        self.scheduler.run_until(min(time, self.end_of_day))
+        if self.data.package_store is not None:
+            self.data.package_store.commit()
+
+    # simulates the whole day
+    # O(N log N)
+    def run(self):
+        self.run_until(self.end_of_day)
+
+    # returns the (status, address) of a package at the given time
+    # only events that have already been simulated are known
+    # O(log N)
+    def package_state_at(self, package_id, time):
+        times = self.history_times[package_id]
+        status_code, status_value, address = self.history_states[package_id][bisect_right(times, time) - 1]
+        return format_status(status_code, status_value), address
+
+    # returns True if every truck had returned to the HUB at the given time
+    # O(1)
+    def is_finished_at(self, time):
+        return self.finish_time is not None and self.finish_time <= time
+
+    # records what happened at the given time in the Instrumentation, if there is one
+    # O(1)
+    def annotate_route(self, time, message):
+        if self.instruments is not None:
+            self.instruments.event(time, message)
+
+    # records the current status and address of each given package,
+    # and stages them in the Data's package store, if it has one
+    # O(N)
+    def record(self, time, packages: [Package]):
+        for package in packages:
+            self.history_times[package.get_id()].append(time)
+            self.history_states[package.get_id()].append(
+                (package.get_status_code(), package.get_status_value(), package.get_address()))
+        self.data.stage_packages(packages)
+
+    # sends a truck out with the given package list
+    # O(N^2), for determining the route
+    def depart(self, time, route_number, truck_id, package_list):
+        truck_id = (truck_id - 1) % self.truck_count + 1
+        if truck_id in self.trucks_out:
+            self.waiting_routes.setdefault(truck_id, []).append((route_number, truck_id, package_list))
+            return
+
+        self.annotate_route(time, "Send truck " + str(truck_id) + (" again" if route_number == 4 else ""))
+        self.package_lists[route_number] = package_list.copy()
+        truck_route = TruckRoute(truck_id, self.data, package_list, self.optimizer, time,
+                                 route_builder=self.route_builder, exact_solver=self.exact_solver,
+                                 plan_cache=self.plan_cache)
+        self.truck_routes[route_number] = truck_route
+        self.departure_times[route_number] = time
+        self.trucks_out[truck_id] = route_number
+        self.record(time, self.package_lists[route_number])
+
+        self.scheduler.schedule(truck_route.drive_from(time, departing=True), ARRIVAL, self.arrive, route_number)
+
+    # the truck reaches its next address, or the HUB
+    # O(1)
+    def arrive(self, time, route_number):
+        truck_route = self.truck_routes[route_number]
+        package_id = truck_route.arrive(time)
+        if truck_route.at_hub:
+            self.return_to_hub(time, route_number)
+            return
+
+        self.record(time, [self.data.lookup_package(package_id)])
+        arrival_time = truck_route.drive_from(time)
+        kind = HUB_RETURN if truck_route.route.tail.visited else ARRIVAL
+        self.scheduler.schedule(arrival_time, kind, self.arrive, route_number)
+
+    # the truck is back at the HUB
+    # other trucks see this from the next minute on
+    # O(1)
+    def return_to_hub(self, time, route_number):
+        self.hub_return_times[route_number] = time
+
+        # a route waiting for this truck leaves on the next minute
+        truck_id = self.truck_routes[route_number].truck_id
+        del self.trucks_out[truck_id]
+        if self.waiting_routes.get(truck_id):
+            self.scheduler.schedule(time + ONE_MINUTE, DEPARTURE, self.depart, *self.waiting_routes[truck_id].pop(0))
+
+        if route_number == 1:
+            self.scheduler.schedule(time + ONE_MINUTE, DEPARTURE, self.depart, 2, 2, self.data.package_list2)
+        elif route_number == 3 and 4 not in self.truck_routes:
+            self.send_truck_3_again()
+
+        if len(self.hub_return_times) == 4:
+            self.finish_time = max(self.hub_return_times.values()) + ONE_MINUTE
+
+    # the address of the corrected package is updated and it is loaded for truck 3
+    # O(N)
+    def correct_address(self, time):
+        package: Package = self.data.lookup_package(self.corrected_package_id)
+        self.annotate_route(time, "Package " + str(self.corrected_package_id) + " address updated")
+        package.set_address(self.corrected_address)
+        self.data.load_package(package, self.data.package_list3)
+        self.package_lists[4] = self.data.package_list3.copy()
+        self.corrected = True
+        self.record(time, self.package_lists[4])
+        self.send_truck_3_again()
+
+    # truck 3 delivers the corrected package once it is back and the correction is in
+    # O(1)
+    def send_truck_3_again(self):
+        if not self.corrected or 3 not in self.hub_return_times:
+            return
+        departure = max(self.correction_time, self.hub_return_times[3] + ONE_MINUTE)
+        self.scheduler.schedule(departure, DEPARTURE, self.depart_again)
+
+    # O(N^2), for determining the route
+    def depart_again(self, time):
+        package: Package = self.data.lookup_package(self.corrected_package_id)
+        if package.get_status_code() == PackageStatus.LOADED:
+            self.depart(time, 4, 3, self.data.package_list3)
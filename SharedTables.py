@@ -0,0 +1,441 @@
+# publishes the tables of a Data in one block of shared memory, so other processes can attach to it without copying
+# a router, a status service and a what-if evaluator can then share one copy of the distances and packages,
+# and each reads the package records where they are rather than building its own
+#
+# the block is laid out as, in order:
+# header       magic, address count, package count, string pool size
+# distances    address count * address count doubles, as Data.distance_matrix
+# addresses    (offset, length) in the string pool of each address, in address index order
+# address order  the address indexes sorted by address, to find an address by binary search
+# packages     in package ID order: the IDs, then the weights, then six (offset, length) string references each,
+#              for the address, city, state, zipcode, deadline and note
+# statuses     the status code, status value, delivery time and corrected address index of each package,
+#              only changed while holding the lock
+# strings      the UTF-8 bytes of every distinct string
+#
+# statuses are limited to the PackageStatus codes, with the truck number as the only status value,
+# and a corrected address must be one of the addresses
+
+import datetime
+import multiprocessing
+import struct
+from bisect import bisect_left
+from multiprocessing import shared_memory
+
+from Package import Package, PackageStatus, format_status, deadline_to_minutes
+from Data import Data
+from DistanceKernels import make_kernels
+from RoadGraph import RowCache
+
+MAGIC = b'C950SHM1'
+HEADER = struct.Struct('<8sIIQ')
+
+# the fields of a package kept as strings, in the order of their references
+STRING_FIELDS = ('address', 'city', 'state', 'zipcode', 'deadline', 'note')
+
+# delivery times are stored as seconds after EPOCH, with NO_TIME for a package not yet delivered
+EPOCH = datetime.datetime(1970, 1, 1)
+NO_TIME = -2 ** 63
+
+
+# returns offset rounded up to a multiple of 8, so every array in the block is aligned
+# O(1)
+def align(offset):
+    return offset + -offset % 8
+
+
+# SharedTables is one process's view of the shared block
+# publish creates the block from a Data; any process given the SharedTables, or its name and lock, can attach
+# a SharedTables sent to another process, as a pool initializer argument for one, attaches there by name
+class SharedTables:
+    def __init__(self, name, lock=None, memory=None):
+        self.name = name
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        self.memory = memory if memory is not None else shared_memory.SharedMemory(name=name)
+        self.owner = memory is not None
+        self.map_arrays()
+
+    # copies the address list, distance matrix and packages of data into a new block of shared memory
+    # and returns the SharedTables of this process, which owns the block and must unlink it when done
+    # raises ValueError for a package whose status is free text rather than a PackageStatus code,
+    # or for a Data whose distances come from coordinates or on demand from a road graph, which has no matrix to share
+    # O(A^2 + N) for A addresses and N packages
+    @classmethod
+    def publish(cls, data: Data, name=None, lock=None):
+        if data.spatial_index is not None or isinstance(data.distance_matrix, RowCache):
+            raise ValueError("a Data whose distances are found as they are needed has no distance matrix to share")
+        packages = sorted(data.hash_table, key=lambda p: p.get_id())
+        strings = {}
+        pool = bytearray()
+
+        def reference(text):
+            if text not in strings:
+                encoded = text.encode('utf-8')
+                strings[text] = (len(pool), len(encoded))
+                pool.extend(encoded)
+            return strings[text]
+
+        address_references = [reference(address) for address in data.address_list]
+        package_references = [reference(getattr(package, field)) for package in packages for field in STRING_FIELDS]
+
+        address_count = len(data.address_list)
+        package_count = len(packages)
+        size = cls.block_size(address_count, package_count, len(pool))
+        memory = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        HEADER.pack_into(memory.buf, 0, MAGIC, address_count, package_count, len(pool))
+        tables = cls(memory.name, lock, memory)
+
+        tables.distance_matrix[:] = memoryview(data.distance_matrix).cast('B').cast('d')
+        for i, (offset, length) in enumerate(address_references):
+            tables.address_strings[2 * i] = offset
+            tables.address_strings[2 * i + 1] = length
+        for position, address_index in enumerate(sorted(range(address_count), key=lambda i: data.address_list[i])):
+            tables.address_order[position] = address_index
+        for i, (offset, length) in enumerate(package_references):
+            tables.package_strings[2 * i] = offset
+            tables.package_strings[2 * i + 1] = length
+        tables.strings[:] = bytes(pool)
+
+        for position, package in enumerate(packages):
+            tables.ids[position] = package.get_id()
+            tables.weights[position] = int(package.weight)
+            if package.get_status_code() == PackageStatus.OTHER:
+                raise ValueError("package " + str(package.get_id()) + " has a status shared tables cannot hold")
+            tables.status_codes[position] = package.get_status_code()
+            tables.status_values[position] = package.status_value or 0
+            delivery_time = package.get_delivery_time()
+            tables.delivery_seconds[position] = NO_TIME if delivery_time == -1 else \
+                int((delivery_time - EPOCH).total_seconds())
+            tables.corrected_addresses[position] = -1
+        return tables
+
+    # returns the bytes needed for the block
+    # O(1)
+    @staticmethod
+    def block_size(address_count, package_count, pool_size):
+        return align(HEADER.size) + 8 * address_count * address_count + align(8 * address_count) \
+            + align(4 * address_count) + align(4 * package_count) * 2 + align(8 * 6 * package_count) \
+            + align(package_count) + align(4 * package_count) + 8 * package_count + align(4 * package_count) \
+            + pool_size
+
+    # views every array of the block, in the order of block_size
+    # O(1)
+    def map_arrays(self):
+        buffer = self.memory.buf
+        magic, address_count, package_count, pool_size = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(self.name + " is not a block of shared tables")
+        self.address_count = address_count
+        self.package_count = package_count
+        offset = align(HEADER.size)
+
+        def view(item_size, count, code):
+            nonlocal offset
+            array_view = buffer[offset:offset + item_size * count].cast(code)
+            offset = align(offset + item_size * count)
+            return array_view
+
+        self.distance_matrix = view(8, address_count * address_count, 'd')
+        self.address_strings = view(4, 2 * address_count, 'I')
+        self.address_order = view(4, address_count, 'I')
+        self.ids = view(4, package_count, 'i')
+        self.weights = view(4, package_count, 'i')
+        self.package_strings = view(4, 2 * 6 * package_count, 'I')
+        self.status_codes = view(1, package_count, 'b')
+        self.status_values = view(4, package_count, 'i')
+        self.delivery_seconds = view(8, package_count, 'q')
+        self.corrected_addresses = view(4, package_count, 'i')
+        self.strings = buffer[offset:offset + pool_size]
+
+    # only the name and the lock are sent to another process, which attaches to the block there
+    # the lock can only be sent to a process as it is started, such as through a pool's initargs
+    def __getstate__(self):
+        return {"name": self.name, "lock": self.lock}
+
+    # O(1)
+    def __setstate__(self, state):
+        self.__init__(state["name"], state["lock"])
+
+    # returns the string at the given reference of the string pool
+    # O(L) in its length
+    def string_at(self, offset, length):
+        return bytes(self.strings[offset:offset + length]).decode('utf-8')
+
+    # O(1)
+    def address_at(self, address_index):
+        return self.string_at(self.address_strings[2 * address_index], self.address_strings[2 * address_index + 1])
+
+    # returns the index of an address, or None if it is not one of the addresses
+    # O(log A)
+    def find_address(self, address):
+        low = 0
+        high = self.address_count
+        while low < high:
+            middle = (low + high) // 2
+            if self.address_at(self.address_order[middle]) < address:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.address_count and self.address_at(self.address_order[low]) == address:
+            return self.address_order[low]
+        return None
+
+    # returns the position of a package in the package arrays, or None if there is no such package
+    # O(log N)
+    def find_package(self, package_id):
+        position = bisect_left(self.ids, package_id)
+        if position < self.package_count and self.ids[position] == package_id:
+            return position
+        return None
+
+    # returns a Data whose packages and distances are these shared tables, for this process
+    # only the address list is copied, so the Data costs little more than the block however many packages it holds
+    # packages cannot be added to it, and its copy() has private packages, as Data.copy always does
+    # O(A)
+    def attach_data(self, kernel_backend='python') -> Data:
+        data = Data.__new__(Data)
+        data.address_list = [self.address_at(i) for i in range(self.address_count)]
+        data.distance_table = []
+        data.address_index = SharedAddressIndex(self)
+        data.distance_matrix = self.distance_matrix
+        data.address_count = self.address_count
+        data.kernel_backend = kernel_backend
+        data.kernels = make_kernels(self.distance_matrix, self.address_count, kernel_backend)
+        data.neighbour_lists = {}
+        data.spatial_index = None
+        data.package_store = None
+        data.snapshot = None
+        data.shared_tables = self
+        data.rejected_rows = []
+        data.hash_table = SharedPackageTable(self)
+        data.package_list1 = []
+        data.package_list2 = []
+        data.package_list3 = []
+        return data
+
+    # closes this process's view of the block
+    # views into it, such as the distance matrix of an attached Data, must not be used afterwards
+    # O(1)
+    def close(self):
+        for name in ("distance_matrix", "address_strings", "address_order", "ids", "weights", "package_strings",
+                     "status_codes", "status_values", "delivery_seconds", "corrected_addresses", "strings"):
+            getattr(self, name).release()
+        self.memory.close()
+
+    # frees the block once every process has closed it; only the process that published it should call this
+    # O(1)
+    def unlink(self):
+        self.memory.unlink()
+
+
+# SharedAddressIndex finds address indexes in the shared tables, standing in for Data.address_index
+class SharedAddressIndex:
+    def __init__(self, tables: SharedTables):
+        self.tables = tables
+
+    # O(log A)
+    def __getitem__(self, address):
+        address_index = self.tables.find_address(address)
+        if address_index is None:
+            raise KeyError(address)
+        return address_index
+
+    # O(log A)
+    def __contains__(self, address):
+        return self.tables.find_address(address) is not None
+
+    # O(1)
+    def __len__(self):
+        return self.tables.address_count
+
+
+# SharedPackageTable stands in for the PackageTable of an attached Data
+# it keeps nothing of its own: each lookup returns a SharedPackage reading the shared tables
+class SharedPackageTable:
+    def __init__(self, tables: SharedTables):
+        self.tables = tables
+
+    # O(1)
+    def __len__(self):
+        return self.tables.package_count
+
+    # O(log N)
+    def __contains__(self, package_id):
+        return self.tables.find_package(package_id) is not None
+
+    # yields packages in package ID order
+    # O(N)
+    def __iter__(self):
+        for position in range(self.tables.package_count):
+            yield SharedPackage(self.tables, position)
+
+    # the packages are stored in ID order
+    # O(N)
+    def iter_by_slot(self):
+        return iter(self)
+
+    # O(log N)
+    def lookup(self, package_id):
+        position = self.tables.find_package(package_id)
+        return None if position is None else SharedPackage(self.tables, position)
+
+    # O(1)
+    def insert(self, package: Package):
+        raise ValueError("packages cannot be added to shared tables")
+
+    # O(1)
+    def remove(self, package_id):
+        raise ValueError("packages cannot be removed from shared tables")
+
+
+# SharedPackage reads and writes one package of the shared tables, with the methods of Package
+# status changes, and reads of a status with its value, hold the lock, so no process sees half of a change
+# two SharedPackages of the same package are equal
+class SharedPackage:
+    __slots__ = ('tables', 'position')
+
+    def __init__(self, tables: SharedTables, position):
+        self.tables = tables
+        self.position = position
+
+    # O(1)
+    def __eq__(self, other):
+        return isinstance(other, SharedPackage) and other.tables is self.tables and other.position == self.position
+
+    # O(1)
+    def __hash__(self):
+        return hash(self.tables.ids[self.position])
+
+    # a copy is a private Package, with the status this package has now
+    # O(1)
+    def __copy__(self):
+        package = Package(self.id, self.address, self.city, self.state, self.zipcode, self.deadline, self.weight,
+                          self.note)
+        with self.tables.lock:
+            package.status_code = PackageStatus(self.tables.status_codes[self.position])
+            package.status_value = self.status_value
+            package.delivery_time = self.delivery_time
+        return package
+
+    # O(1)
+    def string_field(self, field_number):
+        reference = 2 * (6 * self.position + field_number)
+        return self.tables.string_at(self.tables.package_strings[reference],
+                                     self.tables.package_strings[reference + 1])
+
+    @property
+    def id(self):
+        return self.tables.ids[self.position]
+
+    @property
+    def weight(self):
+        return self.tables.weights[self.position]
+
+    @property
+    def address(self):
+        corrected_address = self.tables.corrected_addresses[self.position]
+        if corrected_address >= 0:
+            return self.tables.address_at(corrected_address)
+        return self.string_field(0)
+
+    @property
+    def city(self):
+        return self.string_field(1)
+
+    @property
+    def state(self):
+        return self.string_field(2)
+
+    @property
+    def zipcode(self):
+        return self.string_field(3)
+
+    @property
+    def deadline(self):
+        return self.string_field(4)
+
+    @property
+    def note(self):
+        return self.string_field(5)
+
+    @property
+    def status_code(self):
+        return PackageStatus(self.tables.status_codes[self.position])
+
+    # the truck number for ON_TRUCK, and None otherwise
+    @property
+    def status_value(self):
+        if self.tables.status_codes[self.position] == PackageStatus.ON_TRUCK:
+            return self.tables.status_values[self.position]
+        return None
+
+    @property
+    def delivery_time(self):
+        seconds = self.tables.delivery_seconds[self.position]
+        return -1 if seconds == NO_TIME else EPOCH + datetime.timedelta(seconds=seconds)
+
+    @property
+    def status(self):
+        with self.tables.lock:
+            return format_status(self.status_code, self.get_status_value())
+
+    # only the texts of PackageStatus codes can be set
+    @status.setter
+    def status(self, status_text):
+        for status_code in (PackageStatus.AT_HUB, PackageStatus.LOADED, PackageStatus.EN_ROUTE,
+                            PackageStatus.ON_HOLD):
+            if format_status(status_code) == status_text:
+                self.set_status(status_code)
+                return
+        raise ValueError("shared tables cannot hold the status " + status_text)
+
+    # sets the status code, status value and delivery time of the package together, holding the lock
+    # O(1)
+    def set_status(self, status_code, status_value=0, delivery_seconds=None):
+        with self.tables.lock:
+            self.tables.status_codes[self.position] = status_code
+            self.tables.status_values[self.position] = status_value
+            if delivery_seconds is not None:
+                self.tables.delivery_seconds[self.position] = delivery_seconds
+
+    def get_address(self): return self.address
+
+    # the new address must be one of the addresses
+    def set_address(self, new_address):
+        address_index = self.tables.find_address(new_address)
+        if address_index is None:
+            raise ValueError("shared tables cannot hold the address " + new_address)
+        with self.tables.lock:
+            self.tables.corrected_addresses[self.position] = address_index
+
+    def get_id(self): return self.id
+
+    def get_note(self): return self.note
+
+    def get_delivery_time(self): return self.delivery_time
+
+    def get_status(self): return self.status
+
+    def get_status_code(self): return self.status_code
+
+    # returns the value format_status needs along with the status code
+    def get_status_value(self):
+        if self.tables.status_codes[self.position] == PackageStatus.DELIVERED:
+            return self.delivery_time
+        return self.status_value
+
+    def get_deadline(self): return self.deadline
+
+    def get_deadline_minutes(self): return deadline_to_minutes(self.deadline)
+
+    def load_package(self):
+        self.set_status(PackageStatus.LOADED)
+
+    def route_package(self):
+        self.set_status(PackageStatus.EN_ROUTE)
+
+    def unload_package(self, delivery_time: datetime.datetime):
+        self.set_status(PackageStatus.DELIVERED, 0, int((delivery_time - EPOCH).total_seconds()))
+
+    def takeoff(self, truck_num):
+        self.set_status(PackageStatus.ON_TRUCK, truck_num)
@@ -0,0 +1,126 @@
+import mmap
+import os
+import struct
+
+from Package import Package
+
+# a snapshot file holds the parsed address list, distance matrix and packages of a Data,
+# along with the modification time and size of each CSV file they were parsed from
+#
+# header     magic, address count, package count, source count
+# sources    mtime_ns and size of each source file
+# addresses  u32 length then UTF-8 bytes, for each address, padded to 8 bytes
+# distances  address count * address count little-endian doubles, row by row
+# packages   id, weight and six u16 string lengths, then the address, city, state,
+#            zipcode, deadline and note bytes, for each package
+MAGIC = b'C950SNP1'
+HEADER = struct.Struct('<8sIII')
+SOURCE = struct.Struct('<qq')
+LENGTH = struct.Struct('<I')
+PACKAGE = struct.Struct('<ii6H')
+
+
+# returns (mtime_ns, size) for each source file, or (0, 0) for a file that is not given
+# O(N) in the number of files
+def source_stamps(source_files):
+    stamps = []
+    for source_file in source_files:
+        if source_file is None:
+            stamps.append((0, 0))
+        else:
+            stat = os.stat(source_file)
+            stamps.append((stat.st_mtime_ns, stat.st_size))
+    return stamps
+
+
+# returns True if the snapshot exists and was written from the source files as they are now
+# O(1)
+def is_snapshot_fresh(snapshot_file, source_files):
+    if not os.path.exists(snapshot_file):
+        return False
+    try:
+        stamps = source_stamps(source_files)
+        with open(snapshot_file, 'rb') as snapshot:
+            header = snapshot.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return False
+            magic, address_count, package_count, source_count = HEADER.unpack(header)
+            if magic != MAGIC or source_count != len(stamps):
+                return False
+            for stamp in stamps:
+                if SOURCE.unpack(snapshot.read(SOURCE.size)) != stamp:
+                    return False
+    except (OSError, struct.error):
+        return False
+    return True
+
+
+# writes the address list, distance matrix and packages to snapshot_file
+# the file is written beside the old one and renamed over it,
+# so a process reading the old snapshot is never left with a partial file
+# O(N^2) in the number of addresses, O(N) in the number of packages
+def write_snapshot(snapshot_file, source_files, address_list, distance_matrix, packages: [Package]):
+    if struct.pack('=d', 1.0) != struct.pack('<d', 1.0):
+        raise OSError("snapshots can only be written on little-endian machines")
+    stamps = source_stamps(source_files)
+    temporary_file = snapshot_file + '.' + str(os.getpid()) + '.tmp'
+    with open(temporary_file, 'wb') as snapshot:
+        snapshot.write(HEADER.pack(MAGIC, len(address_list), len(packages), len(stamps)))
+        for stamp in stamps:
+            snapshot.write(SOURCE.pack(*stamp))
+
+        for address in address_list:
+            encoded = address.encode('utf-8')
+            snapshot.write(LENGTH.pack(len(encoded)))
+            snapshot.write(encoded)
+        snapshot.write(b'\0' * (-snapshot.tell() % 8))
+
+        snapshot.write(memoryview(distance_matrix).cast('B'))
+
+        for package in packages:
+            fields = [package.get_address(), package.city, package.state, package.zipcode,
+                      package.get_deadline(), package.get_note()]
+            encoded = [field.encode('utf-8') for field in fields]
+            snapshot.write(PACKAGE.pack(package.get_id(), package.weight, *[len(field) for field in encoded]))
+            for field in encoded:
+                snapshot.write(field)
+    os.replace(temporary_file, snapshot_file)
+
+
+# maps snapshot_file into memory and returns (mapping, address list, distance matrix, packages)
+# the distance matrix is a view of the mapped file, so it is never copied or parsed
+# the mapping must be kept open for as long as the distance matrix is used
+# O(N) in the number of addresses and packages
+def load_snapshot(snapshot_file):
+    with open(snapshot_file, 'rb') as snapshot:
+        mapping = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, address_count, package_count, source_count = HEADER.unpack_from(mapping, 0)
+    if magic != MAGIC:
+        raise ValueError(snapshot_file + " is not a snapshot")
+    offset = HEADER.size + source_count * SOURCE.size
+
+    address_list = []
+    for i in range(address_count):
+        (length,) = LENGTH.unpack_from(mapping, offset)
+        offset += LENGTH.size
+        address_list.append(mapping[offset:offset + length].decode('utf-8'))
+        offset += length
+    offset += -offset % 8
+
+    matrix_size = address_count * address_count * 8
+    distance_matrix = memoryview(mapping)[offset:offset + matrix_size].cast('d')
+    offset += matrix_size
+
+    packages = []
+    for i in range(package_count):
+        package_id, weight, *lengths = PACKAGE.unpack_from(mapping, offset)
+        offset += PACKAGE.size
+        fields = []
+        for length in lengths:
+            fields.append(mapping[offset:offset + length].decode('utf-8'))
+            offset += length
+        address, city, state, zipcode, deadline, note = fields
+        packages.append(Package(package_id, address, city, state, zipcode, deadline, weight, note))
+
+    return mapping, address_list, distance_matrix, packages
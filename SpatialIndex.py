@@ -0,0 +1,172 @@
+# distances between addresses computed from their coordinates, in place of the distance matrix of distance_data.csv
+# each row of address_list.csv then carries the address's coordinates after it:
+# "address",x,y    x and y in miles, for the "xy" and "grid" metrics
+# "address",lat,lon    in degrees, for the "latlon" metric
+#
+# "xy" is the straight-line distance, "grid" the city-block distance |dx| + |dy|,
+# and "latlon" the straight-line distance after projecting the points onto a plane through their mean latitude,
+# which is within a fraction of a percent over a city
+#
+# a UniformGrid index finds the addresses nearest a point by searching the cells around it,
+# so neither the distances nor the neighbour lists need a row for every pair of addresses:
+# distances are computed as they are asked for and kept, and neighbour lists grow as far as they are walked
+
+import csv
+import heapq
+import math
+
+METRICS = ("xy", "grid", "latlon")
+
+# miles in a degree of latitude, and in a degree of longitude at the equator
+MILES_PER_DEGREE = 69.0
+MILES_PER_DEGREE_OF_LONGITUDE = 69.17
+
+# distances are rounded to a millionth of a mile, so coordinates given in tenths give distances in tenths
+PLACES = 6
+
+
+# returns the (x, y) of each address in address_file, in miles on a plane, read from the columns after the address
+# raises ValueError for a row without two coordinates
+# O(A)
+def read_coordinates(address_file, metric="xy"):
+    if metric not in METRICS:
+        raise ValueError("unknown metric " + str(metric) + ", expected one of " + ", ".join(METRICS))
+    points = []
+    with open(address_file, mode='r', encoding='utf-8-sig', newline='') as address_csv:
+        for line_number, row in enumerate(csv.reader(address_csv, delimiter=','), start=1):
+            if not row:
+                continue
+            try:
+                points.append((float(row[1]), float(row[2])))
+            except (IndexError, ValueError):
+                raise ValueError("line " + str(line_number) + " of " + str(address_file) + ": expected address,x,y")
+    if metric == "latlon":
+        points = project_lat_lon(points)
+    return points
+
+
+# returns (latitude, longitude) points projected onto a plane through their mean latitude, in miles
+# O(A)
+def project_lat_lon(points):
+    if not points:
+        return []
+    mean_latitude = sum(latitude for latitude, longitude in points) / len(points)
+    longitude_miles = MILES_PER_DEGREE_OF_LONGITUDE * math.cos(math.radians(mean_latitude))
+    return [(longitude * longitude_miles, latitude * MILES_PER_DEGREE) for latitude, longitude in points]
+
+
+# LazyDistanceMatrix stands in for Data.distance_matrix: the distance at i * N + j is that between addresses i and j
+# each distance is computed the first time it is asked for and kept, so memory grows with the pairs asked for
+class LazyDistanceMatrix:
+    def __init__(self, points, metric="xy"):
+        self.points = points
+        self.address_count = len(points)
+        self.grid_metric = metric == "grid"
+        self.distances = {}  # i * N + j for i <= j: distance
+
+    # O(1)
+    def __len__(self):
+        return self.address_count * self.address_count
+
+    # O(1)
+    def __getitem__(self, position):
+        i, j = divmod(position, self.address_count)
+        if i > j:
+            i, j = j, i
+        key = i * self.address_count + j
+        distance = self.distances.get(key)
+        if distance is None:
+            distance = self.distance(i, j)
+            self.distances[key] = distance
+        return distance
+
+    # returns the distance between two addresses without keeping it
+    # O(1)
+    def distance(self, i, j):
+        (x1, y1), (x2, y2) = self.points[i], self.points[j]
+        if self.grid_metric:
+            return round(abs(x1 - x2) + abs(y1 - y2), PLACES)
+        return round(math.hypot(x1 - x2, y1 - y2), PLACES)
+
+
+# UniformGrid buckets the addresses into square cells,
+# sized so that a cell holds about points_per_cell addresses on average
+class UniformGrid:
+    def __init__(self, points, points_per_cell=2):
+        self.points = points
+        xs = [x for x, y in points] or [0.0]
+        ys = [y for x, y in points] or [0.0]
+        self.min_x = min(xs)
+        self.min_y = min(ys)
+        area = max(max(xs) - self.min_x, 1e-9) * max(max(ys) - self.min_y, 1e-9)
+        self.cell_size = max(math.sqrt(area * points_per_cell / max(len(points), 1)), 1e-9)
+        self.cells = {}  # (column, row): [address index]
+        for address_index, point in enumerate(points):
+            self.cells.setdefault(self.cell_of(point), []).append(address_index)
+        self.max_ring = max(max(abs(column) for column, row in self.cells), max(abs(row) for column, row in self.cells))
+
+    # O(1)
+    def cell_of(self, point):
+        return int((point[0] - self.min_x) // self.cell_size), int((point[1] - self.min_y) // self.cell_size)
+
+    # returns the addresses in the cells exactly ring cells away from the given cell, in either direction
+    # O(ring) cells
+    def ring(self, cell, ring):
+        column, row = cell
+        if ring == 0:
+            return self.cells.get(cell, [])
+        address_indexes = []
+        for offset in range(-ring, ring + 1):
+            for ring_cell in ((column + offset, row - ring), (column + offset, row + ring)):
+                address_indexes.extend(self.cells.get(ring_cell, ()))
+        for offset in range(-ring + 1, ring):
+            for ring_cell in ((column - ring, row + offset), (column + ring, row + offset)):
+                address_indexes.extend(self.cells.get(ring_cell, ()))
+        return address_indexes
+
+    # yields every address index in order of distance from address_index, itself first,
+    # and addresses at the same distance in index order, as a sorted neighbour list has them
+    # an address in a cell k rings away is at least (k - 1) cell sizes away in either metric,
+    # so an address is yielded once no unsearched ring can hold a nearer one
+    # O(K log K) for the first K addresses yielded, in the cells searched to find them
+    def nearest_first(self, address_index, distance_matrix: LazyDistanceMatrix):
+        cell = self.cell_of(self.points[address_index])
+        queue = []
+        ring = 0
+        furthest_ring = self.max_ring + abs(cell[0]) + abs(cell[1]) + 1
+        while ring <= furthest_ring or queue:
+            if ring <= furthest_ring:
+                for other_index in self.ring(cell, ring):
+                    heapq.heappush(queue, (distance_matrix.distance(address_index, other_index), other_index))
+                bound = ring * self.cell_size
+                ring += 1
+            else:
+                bound = math.inf
+            while queue and queue[0][0] < bound:
+                yield heapq.heappop(queue)[1]
+
+
+# NeighbourList is the neighbour list of one address, as Data.get_neighbour_list gives it,
+# taken from a UniformGrid only as far as it is read
+class NeighbourList:
+    def __init__(self, grid: UniformGrid, address_index, distance_matrix: LazyDistanceMatrix):
+        self.found = []
+        self.remaining = grid.nearest_first(address_index, distance_matrix)
+        self.address_count = len(grid.points)
+
+    # O(1)
+    def __len__(self):
+        return self.address_count
+
+    # O(1) for an entry already found, O(K log K) to find K more
+    def __getitem__(self, i):
+        while len(self.found) <= i:
+            self.found.append(next(self.remaining))
+        return self.found[i]
+
+    # O(K log K) for the first K entries
+    def __iter__(self):
+        i = 0
+        while i < self.address_count:
+            yield self[i]
+            i += 1
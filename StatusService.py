@@ -0,0 +1,176 @@
+# answers "what was package X's status at time T?" from a day simulated once
+# run with: python StatusService.py [--port 8950]
+# then ask with: GET /status?time=1030&id=9&id=14
+# leave out id to get every package; time is in 24-hour HHMM format and defaults to the end of the day
+
+import argparse
+import datetime
+import json
+from array import array
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from Package import format_status
+from Data import Data
+from Scheduler import DeliveryDay
+from Scenarios import END_OF_DAY, parse_time
+from HeldKarp import STOP_LIMIT
+
+# the minute of the first entry of every timeline, before the day starts
+BEFORE_DAY = -1
+
+
+# given a datetime, returns the number of minutes after midnight it falls on
+# O(1)
+def minute_of(time: datetime.datetime):
+    return time.hour * 60 + time.minute
+
+
+# StatusTimeline holds the status history of every package for a simulated day
+# the entries of all packages are kept in flat arrays, each package's entries side by side in time order,
+# so a status at a given time is found by binary search over that package's entries
+class StatusTimeline:
+    def __init__(self, day: DeliveryDay):
+        self.spans = {}  # package ID: (first entry, one past the last entry)
+        self.minutes = array('i')  # minute of each entry
+        self.codes = array('b')  # PackageStatus code of each entry
+        self.values = []  # status value of each entry, as format_status takes it
+        self.addresses = []  # package address at each entry
+
+        # O(E) in the number of recorded events
+        for package_id, times in day.history_times.items():
+            start = len(self.minutes)
+            for time, (status_code, status_value, address) in zip(times, day.history_states[package_id]):
+                self.minutes.append(BEFORE_DAY if time == datetime.datetime.min else minute_of(time))
+                self.codes.append(status_code)
+                self.values.append(status_value)
+                self.addresses.append(address)
+            self.spans[package_id] = (start, len(self.minutes))
+
+    # O(1)
+    def __contains__(self, package_id):
+        return package_id in self.spans
+
+    # O(1)
+    def package_ids(self):
+        return sorted(self.spans)
+
+    # returns the index of the entry in effect for a package at the given time
+    # O(log E) in the package's entries
+    def entry_at(self, package_id, time: datetime.datetime):
+        start, end = self.spans[package_id]
+        return bisect_right(self.minutes, minute_of(time), start, end) - 1
+
+    # returns the (status, address) of a package at the given time
+    # O(log E)
+    def status_at(self, package_id, time: datetime.datetime):
+        entry = self.entry_at(package_id, time)
+        return format_status(self.codes[entry], self.values[entry]), self.addresses[entry]
+
+    # returns {package ID: (status, address)} at the given time, for every package ID given that is known
+    # O(P log E) for P package IDs
+    def statuses_at(self, package_ids, time: datetime.datetime):
+        statuses = {}
+        for package_id in package_ids:
+            if package_id in self.spans:
+                statuses[package_id] = self.status_at(package_id, time)
+        return statuses
+
+    # yields (time, [(package ID, status, address)]) for each of the given times in order, packages in ID order
+    # each package's entries are walked forward once over all the times, rather than searched for each time
+    # raises ValueError if the times are not sorted
+    # O(T * P + E) for T times and P packages
+    def sweep(self, times):
+        package_ids = self.package_ids()
+        entries = [self.spans[package_id][0] for package_id in package_ids]
+        previous_minute = BEFORE_DAY
+        for time in times:
+            minute = minute_of(time)
+            if minute < previous_minute:
+                raise ValueError("query times must be sorted")
+            previous_minute = minute
+            states = []
+            for i, package_id in enumerate(package_ids):
+                entry = entries[i]
+                end = self.spans[package_id][1]
+                while entry + 1 < end and self.minutes[entry + 1] <= minute:
+                    entry += 1
+                entries[i] = entry
+                states.append((package_id, format_status(self.codes[entry], self.values[entry]), self.addresses[entry]))
+            yield time, states
+
+
+# simulates the day the same way main.py does, up to the given time or to the end of the day,
+# and returns the DeliveryDay
+# routes with at most exact_stop_limit stops are ordered exactly, and 0 orders every route by nearest neighbour
+# O(N^2)
+def simulate_day(data: Data, until: datetime.datetime = None, exact_stop_limit=STOP_LIMIT) -> DeliveryDay:
+    data.lookup_package(9).status = "on hold"
+    data.determine_package_lists()
+    day = DeliveryDay(data, parse_time("0800"), parse_time("0905"), parse_time("1020"), parse_time(END_OF_DAY),
+                      exact_stop_limit=exact_stop_limit)
+    day.run_until(until or day.end_of_day)
+    return day
+
+
+# StatusRequestHandler answers GET /status requests from the server's timeline as JSON
+class StatusRequestHandler(BaseHTTPRequestHandler):
+    # O(P log E)
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/status":
+            self.send_json(404, {"error": "unknown path " + url.path})
+            return
+        query = parse_qs(url.query)
+        timeline: StatusTimeline = self.server.timeline
+        try:
+            time = parse_time(query.get("time", [END_OF_DAY])[0])
+            package_ids = [int(package_id) for package_id in query["id"]] if "id" in query \
+                else timeline.package_ids()
+        except ValueError as error:
+            self.send_json(400, {"error": str(error)})
+            return
+
+        packages = []
+        for package_id, (status, address) in timeline.statuses_at(package_ids, time).items():
+            packages.append({"id": package_id, "status": status, "address": address})
+        self.send_json(200, {"time": datetime.datetime.strftime(time, "%H:%M"), "packages": packages})
+
+    # O(N) in the size of the body
+    def send_json(self, status_code, body):
+        encoded = json.dumps(body).encode('utf-8')
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    # requests are not logged, so a busy server does not spend its time writing to stderr
+    def log_message(self, format, *args):
+        pass
+
+
+# returns an HTTP server answering status queries from the given timeline, not yet serving
+# O(1)
+def make_server(timeline: StatusTimeline, host="127.0.0.1", port=8950) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), StatusRequestHandler)
+    server.timeline = timeline
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve package status queries for the simulated day.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8950)
+    args = parser.parse_args()
+
+    status_timeline = StatusTimeline(simulate_day(Data(snapshot_file='data_snapshot.bin')))
+    status_server = make_server(status_timeline, args.host, args.port)
+    print("Serving package status on http://" + args.host + ":" + str(args.port) + "/status")
+    try:
+        status_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        status_server.server_close()
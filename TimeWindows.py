@@ -0,0 +1,183 @@
+import heapq
+
+from Package import Package
+from Data import Data
+from TruckRoute import Route, stop_delivery_order, drive_minutes
+
+INFINITY = float('inf')
+
+# the positions re-checked exactly for each stop inserted
+CANDIDATE_POSITIONS = 4
+
+# the miles a route may be made longer by to deliver one more package by its deadline
+LATE_MILES = 10
+
+
+# TimeWindowRouteBuilder builds a route that delivers each package by its deadline where it can,
+# by inserting stops one at a time at the position that adds the fewest miles,
+# counting late_miles for each package the insertion makes late, so a large late_miles puts deadlines before miles
+# stops with deadlines are inserted first, earliest deadline first, then the rest, farthest from the depot first
+# the route is timed as DeliveryDay drives it, each leg counted down a minute at a time, see drive_minutes,
+# so the packages at a stop are delivered a minute apart, in the order of stop_delivery_order
+# each position keeps the minute its first package is delivered in, how many of its packages are late,
+# and the least slack of the on-time packages from it on, the minutes they could all be delayed by and still be on time,
+# so whether an insertion makes a package late is estimated in O(1)
+# the candidate_positions positions the estimate ranks cheapest are re-checked by timing the route after them
+# a package that is already late can be made later without counting again,
+# rather than every stop after it being pushed to the end of the route to keep from delaying it
+# the packages delivered late are reported
+# times are in minutes after midnight
+class TimeWindowRouteBuilder:
+    def __init__(self, data: Data, candidate_positions=CANDIDATE_POSITIONS, late_miles=LATE_MILES):
+        self.data = data
+        self.candidate_positions = candidate_positions
+        self.late_miles = late_miles
+
+        # (truck_id, package ID, deadline, arrival) for every package a built route delivers late
+        self.reports = []
+
+    # appends the given packages to the empty route in the order built
+    # departure_time is when the truck leaves its depot and mph is its speed
+    # returns (package ID, deadline, arrival) for each package delivered after its deadline
+    # O(K * N^2) for N stops and K candidate positions, times the minutes driven per leg
+    def build(self, route: Route, packages: [Package], departure_time, mph, truck_id=None):
+        data = self.data
+        depot_index = route.depot_index
+        departure_minutes = departure_time.hour * 60 + departure_time.minute if departure_time else 0
+        miles_per_minute = mph / 60
+        late_miles = self.late_miles
+
+        # group packages into stops, in the order each address first appears,
+        # with the packages of each in the order they are delivered
+        stop_packages = {}
+        for package in packages:
+            stop_packages.setdefault(data.get_address_index(package.get_address()), []).append(package)
+        stop_addresses = list(stop_packages)
+        stop_orders = [stop_delivery_order(stop_packages[address_index]) for address_index in stop_addresses]
+        stop_deadlines = [[package.get_deadline_minutes() for package in order] for order in stop_orders]
+
+        # the tour is stop numbers with the depot, as -1, at both ends
+        # firsts[p] and lasts[p] are the minutes the first and last packages at tour[p] are delivered in,
+        # and counters[p] the miles left on the truck's counter after, as TruckRoute.drive_to_next_address keeps it
+        # lates[p] is how many packages at tour[p] are late, and slacks[p] the least slack of the on-time packages
+        # at tour[p] and the stops after it
+        # the truck moves on the minute it departs, see TruckRoute.drive_from
+        tour = [-1, -1]
+        firsts = [departure_minutes - 1, INFINITY]
+        lasts = [departure_minutes - 1, INFINITY]
+        counters = [0.0, 0.0]
+        lates = [0, 0]
+        slacks = [INFINITY, INFINITY]
+
+        def address_of(stop):
+            return depot_index if stop < 0 else stop_addresses[stop]
+
+        # returns the minutes the first and last packages at stop are delivered in, and the counter after,
+        # driving from from_index, where the last package was delivered in minute last with counter left
+        # O(M + P) for M minutes driven and P packages at stop
+        def drive_to(stop, from_index, last, counter):
+            address_index = stop_addresses[stop]
+            first = None
+            for package in stop_orders[stop]:
+                counter += data.get_distance_by_index(from_index, address_index)
+                minutes, counter = drive_minutes(counter, miles_per_minute)
+                last += minutes
+                if first is None:
+                    first = last
+                from_index = address_index
+            return first, last, counter
+
+        # returns how many packages at stop are late, and the least slack of the others,
+        # when the first is delivered in minute first
+        # O(P)
+        def lateness_at(stop, first):
+            late = 0
+            slack = INFINITY
+            for position, deadline in enumerate(stop_deadlines[stop]):
+                if deadline is None:
+                    continue
+                if first + position > deadline:
+                    late += 1
+                else:
+                    slack = min(slack, deadline - first - position)
+            return late, slack
+
+        # returns how many more packages are late with stop inserted before tour[position]
+        # O(N * M)
+        def added_late(stop, position):
+            first, last, counter = drive_to(stop, address_of(tour[position - 1]), lasts[position - 1],
+                                            counters[position - 1])
+            late = lateness_at(stop, first)[0]
+            from_index = stop_addresses[stop]
+            for after in range(position, len(tour) - 1):
+                first, last, counter = drive_to(tour[after], from_index, last, counter)
+                late += lateness_at(tour[after], first)[0] - lates[after]
+                from_index = stop_addresses[tour[after]]
+            return late
+
+        # returns the position to insert stop before that adds the fewest miles, counting late_miles
+        # for each package it makes late
+        # O(N + K * N * M)
+        def find_position(stop):
+            address_index = stop_addresses[stop]
+            package_count = len(stop_orders[stop])
+
+            # each position is estimated in O(1): the first package arrives after the miles to it,
+            # and the stops after are delayed by the added miles and a minute for each package,
+            # making one more package late if that is more than their least slack
+            estimates = {}
+            for position in range(1, len(tour)):
+                before_index = address_of(tour[position - 1])
+                after_index = address_of(tour[position])
+                to_stop = data.get_distance_by_index(before_index, address_index)
+                added_miles = (to_stop + data.get_distance_by_index(address_index, after_index)
+                               - data.get_distance_by_index(before_index, after_index))
+                first = lasts[position - 1] + max(1.0, (counters[position - 1] + to_stop) / miles_per_minute)
+                late = lateness_at(stop, first)[0]
+                if added_miles / miles_per_minute + package_count > slacks[position]:
+                    late += 1
+                estimates[position] = (late * late_miles + added_miles, added_miles)
+
+            best_position = None
+            best_cost = None
+            for position in heapq.nsmallest(self.candidate_positions, estimates, key=estimates.get):
+                cost = added_late(stop, position) * late_miles + estimates[position][1]
+                if best_cost is None or cost < best_cost:
+                    best_position = position
+                    best_cost = cost
+            return best_position
+
+        # times the tour again from the given position on, and its slacks up to it
+        # O(N * M)
+        def retime(start):
+            for position in range(start, len(tour) - 1):
+                firsts[position], lasts[position], counters[position] = drive_to(
+                    tour[position], address_of(tour[position - 1]), lasts[position - 1], counters[position - 1])
+            for position in range(len(tour) - 2, 0, -1):
+                lates[position], own_slack = lateness_at(tour[position], firsts[position])
+                slacks[position] = min(own_slack, slacks[position + 1])
+
+        insertion_order = sorted(range(len(stop_addresses)), key=lambda stop: (
+            min((deadline for deadline in stop_deadlines[stop] if deadline is not None), default=INFINITY),
+            -data.get_distance_by_index(depot_index, stop_addresses[stop])))
+        for stop in insertion_order:
+            position = find_position(stop)
+            tour.insert(position, stop)
+            firsts.insert(position, 0)
+            lasts.insert(position, 0)
+            counters.insert(position, 0.0)
+            lates.insert(position, 0)
+            slacks.insert(position, INFINITY)
+            retime(position)
+
+        late_packages = []
+        for position in range(1, len(tour) - 1):
+            stop = tour[position]
+            for package_position, package in enumerate(stop_orders[stop]):
+                route.append(package)
+                deadline = stop_deadlines[stop][package_position]
+                arrival = firsts[position] + package_position
+                if deadline is not None and arrival > deadline:
+                    late_packages.append((package.get_id(), deadline, arrival))
+                    self.reports.append((truck_id, package.get_id(), deadline, arrival))
+        return late_packages
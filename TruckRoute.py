@@ -1,25 +1,70 @@
+import datetime
+import time
+
 from Package import Package
 from Data import Data
+from SpatialIndex import UniformGrid
+
+INFINITY = float('inf')
+
+
+# returns the packages of one stop in the order they are delivered:
+# the first package listed first, then the rest in reverse order,
+# the same order the package-by-package search in Data.find_nearest_in gives
+# O(N)
+def stop_delivery_order(packages):
+    return packages[:1] + packages[:0:-1]
+
+
+# returns the minutes a truck takes to drive the miles left on its counter, and what is left on it after,
+# counted down a minute at a time from the same floating point values as TruckRoute.drive_to_next_address,
+# so the minutes match the simulation's to the bit; at least one minute is taken, even for no miles
+# O(M) where M is the minutes driven
+def drive_minutes(counter, miles_per_minute):
+    minutes = 0
+    while True:
+        counter -= miles_per_minute
+        minutes += 1
+        if counter <= 0.0:
+            return minutes, counter
 
 
 # TruckRoute class keeps track and determines the routes the trucks will take
+# a route starts and ends at the truck's depot, the HUB unless another address is given
+# with an exact_solver such as HeldKarpSolver, routes with few enough stops are ordered exactly
+# with a plan_cache, a RoutePlanCache, a load whose stops were ordered before is given the same order again
 class TruckRoute:
-    def __init__(self, truck_id, data: Data, package_list):
+    def __init__(self, truck_id, data: Data, package_list, optimizer=None, departure_time=None, depot="HUB",
+                 mph=18, route_builder=None, exact_solver=None, plan_cache=None):
 
         self.packages_loaded = 0
         self.MAX_PACKAGES = 16
-        self.MPH = 18
+        self.MPH = mph
         self.MILES_PER_MINUTE = self.MPH / 60
         self.data = data
         self.at_hub = False
         self.truck_id = truck_id
-        self.route = Route(self.data)
+        self.hub_index = data.get_address_index(depot)
+        self.route = Route(self.data, depot_index=self.hub_index, mph=mph)
         self.package_list = package_list
+        self.departure_time = departure_time
+        self.exact_solver = exact_solver
+        self.plan_cache = plan_cache
+
+        # upon initialization, truck determines route from package_list,
+        # or has a route builder such as TimeWindowRouteBuilder build it
+        if route_builder:
+            route_builder.build(self.route, self.package_list, departure_time, self.MPH, truck_id)
+            self.package_list.clear()
+            self.route.curr = self.route.head
+        else:
+            self.determine_route()
 
-        # upon initialization, truck determines route from package_list
-        self.determine_route()
+        # the route can then be shortened by a RouteOptimizer before the truck leaves
+        if optimizer:
+            optimizer.improve(self.route, departure_time, self.MPH, truck_id)
         self.distance_traveled = 0.0
-        self.distance_to_next_address = data.get_distance_between("HUB", self.route.head.address)
+        self.distance_to_next_address = data.get_distance_by_index(self.hub_index, self.route.head.address_index)
 
     # returns distance traveled on this route
     # O(1)
@@ -31,63 +76,265 @@ class TruckRoute:
     def get_distance_to_next_address(self):
         return self.distance_to_next_address
 
+    # returns the node the truck is driving to, or None once it is driving back to its depot or is there
+    # O(1)
+    def get_next_stop(self):
+        route = self.route
+        if self.at_hub or route.curr is None:
+            return None
+        if not route.curr.visited:
+            return route.curr
+        return route.curr.next
+
+    # returns the miles left to drive, to the next stop and from it to the end of the route
+    # O(1)
+    def get_miles_remaining(self):
+        if self.at_hub:
+            return 0.0
+        next_stop = self.get_next_stop()
+        miles_after = self.route.sum_length() - (next_stop.miles if next_stop else self.route.sum_length())
+        return max(0.0, self.distance_to_next_address) + miles_after
+
+    # returns the time the truck is planned to reach the given package, or None if it is not on this route
+    # the plan has the truck leave at departure_time and drive without stopping, as the simulation does,
+    # though the simulation moves trucks a whole minute at a time, so deliveries fall within a minute or so of it
+    # O(1)
+    def get_eta(self, package_id):
+        node = self.route.find(package_id)
+        if node is None or self.departure_time is None:
+            return None
+        return self.departure_time + datetime.timedelta(minutes=node.miles / self.MILES_PER_MINUTE)
+
+    # returns the least slack, in minutes, of the packages with deadlines the truck has still to deliver,
+    # by how much later than planned it could reach each of them without being late,
+    # negative if one will be late, or None if none of them has a deadline
+    # O(1), or O(N) after the route changes
+    def get_deadline_slack(self):
+        next_stop = self.get_next_stop()
+        if next_stop is None or self.departure_time is None:
+            return None
+        latest_departure = self.route.latest_departure_from(next_stop)
+        if latest_departure == INFINITY:
+            return None
+        return latest_departure - (self.departure_time.hour * 60 + self.departure_time.minute)
+
     # keeps track of where the truck is and if it has reached its next destination
     # if the destination is reached, the truck will have a new address to go to
     # if the truck reaches the end of the route, the at_bub attribute is updated accordingly
-    # O(N)
+    # O(1)
     def increment(self, current_time):
         # increment distance
         self.distance_to_next_address -= self.MILES_PER_MINUTE
         self.distance_traveled += self.MILES_PER_MINUTE
 
-        if not self.at_hub and not self.route.tail.visited:
-            if self.distance_to_next_address <= 0.0:
-                self.route.visit_next(current_time)
-                if self.route.curr is not self.route.tail:
-                    next_address = self.route.curr.next.address
-                else:
-                    next_address = "HUB"
-                current_address = self.route.curr.address
-                self.distance_to_next_address += self.data.get_distance_between(current_address, next_address)  # O(N)
-        elif self.route.tail.visited and self.distance_to_next_address <= 0.0 and not self.at_hub:
+        if not self.at_hub and self.distance_to_next_address <= 0.0:
+            self.arrive(current_time)
+
+    # called when the truck reaches the address it was driving to
+    # unloads the next package and sets the distance to the following address,
+    # or marks the truck as at the HUB if every package has been delivered
+    # O(1)
+    def arrive(self, current_time):
+        if self.route.tail.visited:
             self.at_hub = True
             # print("Truck", self.id, "at HUB at", current_time)
+            return None
 
-    # dynamically determines route based on given package list using nearest neighbor algorithm
-    # O(N)
+        self.route.visit_next(current_time)
+        if self.route.curr is not self.route.tail:
+            next_index = self.route.curr.next.address_index
+        else:
+            next_index = self.hub_index
+        current_index = self.route.curr.address_index
+        self.distance_to_next_address += self.data.get_distance_by_index(current_index, next_index)  # O(1)
+        return self.route.curr.package_id
+
+    # drives the truck until it reaches the address it is driving to,
+    # without unloading anything, and returns the number of minutes it took
+    # the distance is counted down a minute at a time, exactly as increment does,
+    # so the arrival minute matches the minute-by-minute simulation to the bit
+    # O(M) where M is the minutes driven, with no other work per minute
+    def drive_to_next_address(self):
+        distance_to_next_address = self.distance_to_next_address
+        distance_traveled = self.distance_traveled
+        miles_per_minute = self.MILES_PER_MINUTE
+        minutes = 0
+        while True:
+            distance_to_next_address -= miles_per_minute
+            distance_traveled += miles_per_minute
+            minutes += 1
+            if distance_to_next_address <= 0.0:
+                break
+        self.distance_to_next_address = distance_to_next_address
+        self.distance_traveled = distance_traveled
+        return minutes
+
+    # drives the truck to the address it is driving to from the given time, and returns the time it arrives there
+    # a truck leaving its depot moves on the minute it departs, so with departing set it arrives a minute sooner
+    # than the minutes drive_to_next_address counts, as DeliveryDay and Fleet both time their trucks
+    # O(M) where M is the minutes driven
+    def drive_from(self, time, departing=False):
+        minutes = self.drive_to_next_address()
+        return time + datetime.timedelta(minutes=minutes - 1 if departing else minutes)
+
+    # dynamically determines route based on given package list using nearest neighbor algorithm,
+    # or the exact solver when it can order the stops, unless the plan cache has an order for them
+    # packages at the same address are one stop, and are delivered one after another
+    # O(N^2) with a distance matrix, O(N) searches of a few grid cells on average with a grid index, see StopIndex,
+    # or the exact solver's time, O(N) from the plan cache
     def determine_route(self):
-        p: Package
-        p = self.route.append(self.data.find_nearest_to_hub(self.package_list))  # O(N)
-        self.package_list.pop(self.package_list.index(p))
-        while self.package_list:  # O(16N)
-            p_address = p.get_address()
-            p = self.route.append(self.data.find_nearest_in(p_address, self.package_list))  # O(N)
-            self.package_list.pop(self.package_list.index(p))
+        # group packages into stops, in the order each address first appears in package_list
+        stops = {}
+        for package in self.package_list:
+            address_index = self.data.get_address_index(package.get_address())
+            if address_index in stops:
+                stops[address_index].append(package)
+            else:
+                stops[address_index] = [package]
+
+        order = None
+        plan_key = None
+        if self.plan_cache:
+            plan_key = self.plan_key(stops)
+            addresses = self.plan_cache.get(plan_key)
+            if addresses is not None:
+                order = [self.data.get_address_index(address) for address in addresses]
+
+        planned = order is None
+        planning_start = time.perf_counter()
+        if order is None and self.exact_solver:
+            order = self.exact_solver.solve(self.hub_index, stops, self.departure_time, self.MPH)
+        if order is None:
+            order = []
+            stop_index = StopIndex(self.data, stops)
+            current_index = self.hub_index
+            for i in range(len(stops)):
+                current_index = stop_index.pop_nearest(current_index)
+                order.append(current_index)
+        planning_seconds = time.perf_counter() - planning_start
+
+        for address_index in order:
+            packages = stops[address_index]
+
+            for package in stop_delivery_order(packages):
+                self.route.append(package)
 
+        if plan_key is not None and planned:
+            address_list = self.data.get_address_list()
+            self.plan_cache.put(plan_key, [address_list[address_index] for address_index in order],
+                                self.route.sum_length(), planning_seconds)
+        self.package_list.clear()
         self.route.curr = self.route.head
 
+    # returns the plan cache key of the given stops, {address index: [package]}, from this truck's depot
+    # the planner names what ordered them, since another planner, or speed, would order them differently
+    # O(N log N)
+    def plan_key(self, stops):
+        if self.exact_solver:
+            planner = "held-karp " + str(self.exact_solver.stop_limit)
+        else:
+            planner = "nearest"
+        address_list = self.data.get_address_list()
+        stop_deadlines = {}
+        for address_index, packages in stops.items():
+            deadlines = [package.get_deadline_minutes() for package in packages
+                         if package.get_deadline_minutes() is not None]
+            stop_deadlines[address_list[address_index]] = min(deadlines) if deadlines else None
+        return self.plan_cache.make_key(planner + " at " + str(self.MPH) + " mph", address_list[self.hub_index],
+                                        self.departure_time, stop_deadlines)
+
+
+# StopIndex finds the nearest unvisited stop on a route, and removes stops as they are visited
+# it holds only the route's own stops, never every address, so its time and memory follow the number of stops
+# with a distance matrix, the unvisited stops are kept in the order given and searched by the distance kernels,
+# and with a grid index, they are bucketed into a UniformGrid of their own, searched ring by ring out from the truck,
+# each stop leaving its cell when it is visited
+# stops at the same distance are chosen in the order they were given
+class StopIndex:
+    def __init__(self, data: Data, stops):
+        self.data = data
+        self.stop_addresses = list(stops)
+        self.positions = {}
+        for position, address_index in enumerate(self.stop_addresses):
+            self.positions[address_index] = position
+        self.grid = None
+        if data.spatial_index is not None:
+            self.grid = UniformGrid([data.spatial_index.points[address_index]
+                                     for address_index in self.stop_addresses])
+
+    # returns the address index of the unvisited stop nearest to current_index, and removes it
+    # O(R) with a distance matrix for R unvisited stops,
+    # O(K) with a grid index for the K stops in the cells searched, a few cells on average for stops spread evenly
+    def pop_nearest(self, current_index):
+        if self.grid is None:
+            stop_addresses = self.stop_addresses
+            position = self.data.kernels.nearest(current_index, stop_addresses, INFINITY)
+            if position == -1:
+                return None
+            del self.positions[stop_addresses[position]]
+            return stop_addresses.pop(position)
+
+        grid = self.grid
+        cell = grid.cell_of(self.data.spatial_index.points[current_index])
+        furthest_ring = grid.max_ring + abs(cell[0]) + abs(cell[1]) + 1
+        nearest = None  # (distance, position, address index)
+        ring = 0
+        # a stop in a cell k rings away is at least (k - 1) cell sizes away,
+        # so once the rings up to k - 1 are searched, no stop further out is as near as one nearer than that
+        while ring <= furthest_ring and (nearest is None or nearest[0] >= (ring - 1) * grid.cell_size):
+            for position in grid.ring(cell, ring):
+                address_index = self.stop_addresses[position]
+                candidate = (self.data.get_distance_by_index(current_index, address_index), position, address_index)
+                if nearest is None or candidate < nearest:
+                    nearest = candidate
+            ring += 1
+        if nearest is None:
+            return None
+
+        distance, position, address_index = nearest
+        grid.cells[grid.cell_of(grid.points[position])].remove(position)
+        del self.positions[address_index]
+        return address_index
+
 
 # RouteNode contains relational data for each package along the Route
+# miles is how far along the route the node is, from the depot, kept up to date by the Route
 class RouteNode:
     def __init__(self, package: Package):
         self.route_id = None
         self.package_id = package.get_id()
         self.address = package.get_address()
+        self.address_index = None
+        self.deadline_minutes = package.get_deadline_minutes()
+        self.miles = 0.0
+        self.latest_departure = INFINITY
         self.next = None
         self.prev = None
         self.visited = False
-        package.status = "En Route"
+        package.route_package()
 
 
 # Route is a linked list to keep track of the route the truck will take
+# alongside the links, each node keeps its miles from the depot, and the route its total length,
+# updated as nodes are appended, inserted, removed and reordered,
+# so the length of the route, and how far along it any package is, are known in O(1)
+# the latest departure of each node, for deadline slack, is worked out again when it is next asked for
 class Route:
-    def __init__(self, data: Data, head_node: RouteNode = None):
+    def __init__(self, data: Data, head_node: RouteNode = None, depot_index=None, mph=18):
         self.head: RouteNode = head_node
         self.tail: RouteNode = head_node
         self.curr = None
         self.length = 0.0
         self.data = data
         self.finished = False
+        self.minutes_per_mile = 60 / mph
+        self.nodes = {}  # package ID: node
+        self.deadlines_changed = True
+        # the address the route starts and ends at
+        self.depot_index = data.get_address_index("HUB") if depot_index is None else depot_index
+        if head_node:
+            self.nodes[head_node.package_id] = head_node
+            self.update_miles(head_node)
 
     # O(1)
     def print(self):
@@ -102,6 +349,7 @@ class Route:
     # O(1)
     def append(self, package: Package):
         new_node = RouteNode(package)
+        new_node.address_index = self.data.get_address_index(new_node.address)
         if self.head is None:
             self.head = new_node
             self.tail = new_node
@@ -109,8 +357,107 @@ class Route:
             self.tail.next = new_node
             new_node.prev = self.tail
             self.tail = new_node
+        self.nodes[new_node.package_id] = new_node
+        self.update_miles(new_node)
         return package
 
+    # links node into the route after after_node
+    # O(N) in the nodes after it, whose miles change
+    def insert_after(self, after_node: RouteNode, node: RouteNode):
+        node.prev = after_node
+        node.next = after_node.next
+        if after_node.next:
+            after_node.next.prev = node
+        else:
+            self.tail = node
+        after_node.next = node
+        self.nodes[node.package_id] = node
+        self.update_miles(node)
+
+    # unlinks a node that is not the first on the route
+    # O(N) in the nodes after it, whose miles change
+    def remove(self, node: RouteNode):
+        prev_node = node.prev
+        prev_node.next = node.next
+        if node.next:
+            node.next.prev = prev_node
+        else:
+            self.tail = prev_node
+        node.prev = None
+        node.next = None
+        del self.nodes[node.package_id]
+        self.update_miles(prev_node)
+
+    # returns the node delivering the given package, or None if it is not on this route
+    # O(1)
+    def find(self, package_id) -> RouteNode or None:
+        return self.nodes.get(package_id)
+
+    # sets the miles of node and of every node after it, from the node before it, and the length of the route
+    # the miles are summed from the depot in route order, so the length is the same sum as sum_length made
+    # O(N) in the nodes from node on
+    def update_miles(self, node: RouteNode):
+        distance_matrix = self.data.distance_matrix
+        address_count = self.data.address_count
+        if node.prev:
+            miles = node.prev.miles
+            previous_index = node.prev.address_index
+        else:
+            miles = 0.0
+            previous_index = self.depot_index
+        while node:
+            miles += distance_matrix[previous_index * address_count + node.address_index]
+            node.miles = miles
+            previous_index = node.address_index
+            node = node.next
+        self.length = miles + distance_matrix[previous_index * address_count + self.depot_index]
+        self.deadlines_changed = True
+
+    # returns the latest minute the truck could have left its depot and still reach node,
+    # and every node after it, by its package's deadline, or INFINITY if none of them has a deadline
+    # O(1), or O(N) after the route changes
+    def latest_departure_from(self, node: RouteNode):
+        if self.deadlines_changed:
+            latest_departure = INFINITY
+            curr_node = self.tail
+            while curr_node:
+                if curr_node.deadline_minutes is not None:
+                    latest_departure = min(latest_departure,
+                                           curr_node.deadline_minutes - curr_node.miles * self.minutes_per_mile)
+                curr_node.latest_departure = latest_departure
+                curr_node = curr_node.prev
+            self.deadlines_changed = False
+        return node.latest_departure
+
+    # returns the nodes of the route in order
+    # O(N)
+    def get_nodes(self):
+        nodes = []
+        curr_node = self.head
+        while curr_node:
+            nodes.append(curr_node)
+            curr_node = curr_node.next
+        return nodes
+
+    # relinks the given nodes into the route in the given order
+    # used to reorder a route before the truck leaves
+    # O(N)
+    def reorder(self, nodes: [RouteNode]):
+        prev_node = None
+        for node in nodes:
+            node.prev = prev_node
+            node.next = None
+            if prev_node:
+                prev_node.next = node
+            prev_node = node
+        self.head = nodes[0] if nodes else None
+        self.tail = prev_node
+        self.curr = self.head
+        if self.head:
+            self.update_miles(self.head)
+        else:
+            self.length = 0.0
+
     # sets curr to the next unvisited node
     # marks that node as visited
     # O(N)
@@ -122,14 +469,7 @@ class Route:
         p.unload_package(current_time)
         return self.curr.package_id
 
-    # returns length of route
-    # O(N)
+    # returns length of route, from the depot back to it
+    # O(1)
     def sum_length(self):
-        if self.length == 0.0:
-            curr_node = self.head
-            self.length += self.data.get_distance_between("HUB", self.head.address)  # O(N)
-            while curr_node.next:
-                self.length += self.data.get_distance_between(curr_node.address, curr_node.next.address)
-                curr_node = curr_node.next
-            self.length += self.data.get_distance_between(curr_node.address, "HUB")
         return self.length
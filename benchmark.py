@@ -0,0 +1,900 @@
+# benchmarks for the data structures and the pipeline used by main.py
+# run with: python benchmark.py [name ...]
+# with no names given, every benchmark is run
+
+import datetime
+import gc
+import json
+import math
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from Package import Package, PackageStatus
+from PackageTable import PackageTable
+from Data import Data, read_package_batches
+from CityGenerator import write_city_files, write_road_file
+from Assignment import AssignmentEngine, TruckPlan
+from Scenarios import parse_time
+from StatusService import StatusTimeline, simulate_day
+from DistanceKernels import make_kernels, numpy
+from Instrumentation import Instrumentation
+from TruckRoute import TruckRoute
+from Rerouting import Rerouter, AddressCorrection, NewPickup
+from RoadGraph import read_road_graph, build_road_distance_matrix
+from TimeWindows import TimeWindowRouteBuilder
+from RouteOptimizer import RouteOptimizer
+from Checkpoints import write_checkpoints, CsvCheckpointWriter
+from SharedTables import SharedTables
+from SpatialIndex import UniformGrid
+from HeldKarp import HeldKarpSolver
+from RouteCache import RoutePlanCache
+from PackageStore import PackageStore
+
+# each run of the pipeline benchmark is appended here, so runs on different commits can be compared
+RESULTS_FILE = 'benchmark_results.jsonl'
+
+
+# times PackageTable.lookup as the number of stored packages grows
+# the time per lookup should stay flat from 40 to 1,000,000 packages,
+# for sequential IDs and for IDs in steps of 4096, which share their low bits, as under a depot or date prefix
+def benchmark_package_table():
+    print("PackageTable lookup")
+    print("packages".rjust(10), "ids".rjust(12), "ns/insert".rjust(10), "ns/lookup".rjust(12))
+    for package_count in (40, 1_000, 10_000, 100_000, 1_000_000):
+        for label, stride in (("sequential", 1), ("step 4096", 4096)):
+            table = PackageTable()
+            packages = [Package(package_id * stride) for package_id in range(1, package_count + 1)]
+            start = time.perf_counter()
+            for package in packages:
+                table.insert(package)
+            insert_seconds = time.perf_counter() - start
+
+            # look up a fixed spread of IDs so every size does the same amount of work
+            step = max(1, package_count // 1000)
+            ids = [package_id * stride for package_id in range(1, package_count + 1, step)]
+            rounds = max(1, 100_000 // len(ids))
+            seconds = timeit.timeit(lambda: [table.lookup(i) for i in ids], number=rounds)
+            print(str(package_count).rjust(10), label.rjust(12),
+                  format(insert_seconds / package_count * 1e9, ".1f").rjust(10),
+                  format(seconds / (rounds * len(ids)) * 1e9, ".1f").rjust(12))
+            del table, packages
+
+
+# the Package layout before __slots__ and status codes, kept here to compare against
+class DictPackage:
+    def __init__(self, package_id, address, city, state, zipcode, deadline, weight, note):
+        self.id = package_id
+        self.address = address
+        self.city = city
+        self.state = state
+        self.zipcode = zipcode
+        self.deadline = deadline
+        self.weight = weight
+        self.note = note
+        self.status = "At Hub"
+        self.delivery_time = -1
+
+    def unload_package(self, delivery_time):
+        self.status = "Delivered at " + datetime.datetime.strftime(delivery_time, "%H:%M")
+        self.delivery_time = delivery_time
+
+
+# returns the bytes allocated per package for package_count packages of the given class
+# rows are split from CSV-like lines, so each package starts with its own copy of every string,
+# and every package is delivered, as at the end of the day
+def measure_package_memory(package_class, package_count):
+    delivery_times = [datetime.datetime(2022, 1, 1, 8 + minute // 60, minute % 60) for minute in range(600)]
+    gc.collect()
+    tracemalloc.start()
+    packages = []
+    for package_id in range(package_count):
+        row = (str(package_id) + ",195 W Oakland Ave,Salt Lake City,UT,84115,10:30 AM,21,").split(",")
+        package = package_class(int(row[0]), row[1], row[2], row[3], row[4], row[5], int(row[6]), row[7])
+        package.unload_package(delivery_times[package_id % 600])
+        packages.append(package)
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return allocated / package_count
+
+
+# compares bytes per package for the old dict-based layout and Package
+def benchmark_package_memory(package_count=1_000_000):
+    print("Package memory,", package_count, "packages")
+    print("layout".ljust(12), "bytes/package".rjust(14))
+    print("before".ljust(12), format(measure_package_memory(DictPackage, package_count), ".1f").rjust(14))
+    print("after".ljust(12), format(measure_package_memory(Package, package_count), ".1f").rjust(14))
+
+
+# compares reading a large manifest in batches with reading it all at once
+# the batches are dropped once read, as they would be once routed,
+# so the peak memory of the streaming reader should depend on the batch size, not the file size
+def benchmark_streaming_ingest(row_count=200_000):
+    with open('package_data.csv', mode='r', encoding='utf-8-sig') as package_file:
+        sample_rows = [line.rstrip('\n').split(',', 1)[1] for line in package_file if line.strip()]
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as manifest:
+        for package_id in range(1, row_count + 1):
+            manifest.write(str(package_id) + ',' + sample_rows[package_id % len(sample_rows)] + '\n')
+    print("Streaming ingest,", row_count, "rows,", os.path.getsize(manifest.name) // 1024, "KiB")
+    print("reader".ljust(16), "first batch ms".rjust(15), "total ms".rjust(10), "peak KiB".rjust(10))
+
+    try:
+        for batch_size in (1_000, 10_000, None):
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            first_batch = None
+            if batch_size is None:
+                label = "all at once"
+                packages = [package for batch in read_package_batches(manifest.name, row_count) for package in batch]
+                first_batch = time.perf_counter() - start
+                del packages
+            else:
+                label = "batches of " + str(batch_size)
+                for batch in read_package_batches(manifest.name, batch_size):
+                    if first_batch is None:
+                        first_batch = time.perf_counter() - start
+            total = time.perf_counter() - start
+            allocated, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(label.ljust(16), format(first_batch * 1000, ".1f").rjust(15),
+                  format(total * 1000, ".1f").rjust(10), str(peak // 1024).rjust(10))
+    finally:
+        os.remove(manifest.name)
+
+
+# compares Data startup from the CSV files with startup from a snapshot of them
+def benchmark_startup(address_count=2_000, package_count=10_000):
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_city_files(directory, address_count, package_count)
+        snapshot_file = os.path.join(directory, 'data_snapshot.bin')
+        print("Data startup,", address_count, "addresses,", package_count, "packages")
+        print("source".ljust(20), "seconds".rjust(10))
+        for label, snapshot in (("CSV", None), ("CSV, write snapshot", snapshot_file), ("snapshot", snapshot_file)):
+            start = time.perf_counter()
+            Data(*files, snapshot_file=snapshot)
+            print(label.ljust(20), format(time.perf_counter() - start, ".3f").rjust(10))
+
+
+# times the AssignmentEngine as the number of packages grows, spread over one truck per 16 packages
+def benchmark_assignment(address_count=500):
+    print("AssignmentEngine,", address_count, "addresses")
+    print("packages".rjust(10), "trucks".rjust(8), "seconds".rjust(10), "unassigned".rjust(12))
+    with tempfile.TemporaryDirectory() as directory:
+        for package_count in (100, 1_000, 10_000):
+            data = Data(*write_city_files(directory, address_count, package_count))
+            truck_plans = [TruckPlan(truck_id, 16, 8 * 60 + truck_id % 3 * 60)
+                           for truck_id in range(1, package_count // 16 + 2)]
+            packages = list(data.hash_table)
+            start = time.perf_counter()
+            loads, unassigned, held = AssignmentEngine(data).assign(packages, truck_plans)
+            print(str(package_count).rjust(10), str(len(truck_plans)).rjust(8),
+                  format(time.perf_counter() - start, ".3f").rjust(10), str(len(unassigned)).rjust(12))
+
+
+# compares answering status queries by simulating the day up to each query time
+# with answering them from the timeline of a day simulated once
+def benchmark_status_queries(query_count=1_000):
+    base_data = Data()
+    generator = random.Random(0)
+    queries = [(generator.randrange(1, 41), parse_time(format(generator.randrange(8, 18), "02d")
+                                                       + format(generator.randrange(60), "02d")))
+               for i in range(query_count)]
+    print("Status queries,", query_count, "queries")
+    print("source".ljust(16), "us/query".rjust(10))
+
+    start = time.perf_counter()
+    for package_id, query_time in queries:
+        simulate_day(base_data.copy(), query_time).data.lookup_package(package_id).get_status()
+    resimulate = time.perf_counter() - start
+    print("re-simulation".ljust(16), format(resimulate / query_count * 1e6, ".1f").rjust(10))
+
+    timeline = StatusTimeline(simulate_day(base_data.copy()))
+    start = time.perf_counter()
+    for package_id, query_time in queries:
+        timeline.status_at(package_id, query_time)
+    print("timeline".ljust(16), format((time.perf_counter() - start) / query_count * 1e6, ".1f").rjust(10))
+
+
+# compares the python and numpy DistanceKernels on random cities,
+# timing nearest-candidate searches over every address and the length of a tour through every address
+def benchmark_distance_kernels(query_count=200):
+    if numpy is None:
+        print("Distance kernels: NumPy is not installed, so there is only the python backend")
+        return
+    print("Distance kernels,", query_count, "nearest searches per city")
+    print("addresses".rjust(10), "backend".rjust(8), "us/nearest".rjust(12), "us/tour".rjust(10))
+    generator = numpy.random.default_rng(0)
+    for address_count in (100, 1_000, 10_000):
+        points = generator.uniform(0, 10, (address_count, 2))
+        matrix = numpy.sqrt(((points[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)).ravel()
+        distance_matrix = memoryview(matrix).cast('B').cast('d')
+        candidate_indexes = list(range(address_count))
+        tour = [int(i) for i in generator.permutation(address_count)]
+        for backend in ("python", "numpy"):
+            kernels = make_kernels(distance_matrix, address_count, backend)
+            start = time.perf_counter()
+            for i in range(query_count):
+                kernels.nearest(i % address_count, candidate_indexes, float("inf"))
+            nearest_seconds = (time.perf_counter() - start) / query_count
+            rounds = max(1, 100_000 // address_count)
+            start = time.perf_counter()
+            for i in range(rounds):
+                kernels.tour_length(tour)
+            tour_seconds = (time.perf_counter() - start) / rounds
+            print(str(address_count).rjust(10), backend.rjust(8), format(nearest_seconds * 1e6, ".1f").rjust(12),
+                  format(tour_seconds * 1e6, ".1f").rjust(10))
+        del matrix, distance_matrix
+
+
+# compares simulating the day with Instrumentation off and on
+def benchmark_instrumentation(rounds=200):
+    base_data = Data()
+    print("Instrumentation,", rounds, "simulated days")
+    print("instrumentation".ljust(16), "ms/day".rjust(10))
+    for label in ("off", "on"):
+        instruments = Instrumentation()
+        if label == "on":
+            instruments.enable()
+        start = time.perf_counter()
+        for i in range(rounds):
+            simulate_day(base_data.copy())
+        print(label.ljust(16), format((time.perf_counter() - start) / rounds * 1000, ".3f").rjust(10))
+        instruments.disable()
+
+
+# runs the whole pipeline on the given city files, as one process should:
+# parsing, assigning packages to trucks, building each truck's route and driving every route
+# returns the seconds each step took, the peak memory of the process and the miles driven
+def run_pipeline(files):
+    seconds = {}
+    start = time.perf_counter()
+    data = Data(*files)
+    seconds["parse"] = time.perf_counter() - start
+
+    # enough trucks for every package, two leaving at 8:00 for every one leaving at 9:05
+    package_count = len(data.hash_table)
+    truck_plans = [TruckPlan(truck_id, 16, 8 * 60 if truck_id % 3 else 9 * 60 + 5)
+                   for truck_id in range(1, math.ceil(package_count / 16 * 1.25) + 2)]
+    start = time.perf_counter()
+    loads, unassigned, held = AssignmentEngine(data).assign(list(data.hash_table), truck_plans)
+    seconds["assign"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    truck_routes = [TruckRoute(truck_id, data, load) for truck_id, load in loads.items() if load]
+    seconds["route"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for truck_route in truck_routes:
+        current_time = parse_time("0800")
+        while not truck_route.at_hub:
+            current_time += datetime.timedelta(minutes=truck_route.drive_to_next_address())
+            truck_route.arrive(current_time)
+    seconds["drive"] = time.perf_counter() - start
+
+    return {
+        "packages": package_count,
+        "addresses": data.address_count,
+        "trucks": len(truck_routes),
+        "unassigned": len(unassigned) + len(held),
+        "seconds": seconds,
+        "total_seconds": sum(seconds.values()),
+        # ru_maxrss is in KiB on Linux
+        "peak_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        "miles": sum(truck_route.route.sum_length() for truck_route in truck_routes),
+    }
+
+
+# returns the short hash of the checked out commit, or "unknown" outside a git checkout
+def current_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+# returns every result saved in RESULTS_FILE
+def read_results():
+    if not os.path.exists(RESULTS_FILE):
+        return []
+    with open(RESULTS_FILE, encoding='utf-8') as results_file:
+        return [json.loads(line) for line in results_file if line.strip()]
+
+
+# runs the pipeline on seeded synthetic cities from 40 to 100,000 packages, each in a fresh process,
+# saves the results to RESULTS_FILE and compares them with the latest results saved from another commit
+def benchmark_pipeline(package_counts=(40, 1_000, 10_000, 100_000), seed=0):
+    commit = current_commit()
+    earlier = {}
+    for result in read_results():
+        if result["commit"] != commit:
+            earlier[result["packages"]] = result
+
+    print("Pipeline, seed", seed, "at commit", commit)
+    print("packages".rjust(9), "addresses".rjust(10), "trucks".rjust(7), "seconds".rjust(9),
+          "peak MiB".rjust(9), "miles".rjust(10), "vs".rjust(9), "seconds".rjust(9), "miles".rjust(10))
+    context = multiprocessing.get_context('spawn')
+    for package_count in package_counts:
+        address_count = min(max(27, package_count // 10), 2_000)
+        with tempfile.TemporaryDirectory() as directory:
+            files = write_city_files(directory, address_count, package_count, seed)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_pipeline, files).result()
+        result.update({"benchmark": "pipeline", "commit": commit, "seed": seed,
+                       "recorded": datetime.datetime.now().isoformat(timespec='seconds')})
+        with open(RESULTS_FILE, 'a', encoding='utf-8') as results_file:
+            results_file.write(json.dumps(result) + "\n")
+
+        peak = format(result["peak_kib"] / 1024, ".1f") if result["peak_kib"] else "n/a"
+        line = (str(package_count).rjust(9) + " " + str(address_count).rjust(10) + " "
+                + str(result["trucks"]).rjust(7) + " " + format(result["total_seconds"], ".3f").rjust(9) + " "
+                + peak.rjust(9) + " " + format(result["miles"], ".1f").rjust(10))
+        previous = earlier.get(package_count)
+        if previous and previous.get("seed") == seed:
+            line += (" " + previous["commit"].rjust(9) + " "
+                     + format(result["total_seconds"] / previous["total_seconds"] - 1, "+.1%").rjust(9) + " "
+                     + format(result["miles"] - previous["miles"], "+.1f").rjust(10))
+        print(line)
+
+
+# times Rerouter.apply for address corrections and new pickups on routes driven halfway,
+# against building the changed route again from its unvisited packages
+def benchmark_rerouting(package_count=5_000, event_count=1_000, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        data = Data(*write_city_files(directory, 500, package_count, seed))
+    truck_plans = [TruckPlan(truck_id, 16, 8 * 60) for truck_id in range(1, math.ceil(package_count / 16 * 1.25) + 2)]
+    loads, unassigned, held = AssignmentEngine(data).assign(list(data.hash_table), truck_plans)
+    truck_routes = {}
+    for truck_id, load in loads.items():
+        if load:
+            truck_routes[truck_id] = TruckRoute(truck_id, data, load)
+
+    # every truck delivers half its packages and is on its way to the next
+    current_time = parse_time("0800")
+    on_road = []
+    for truck_route in truck_routes.values():
+        nodes = truck_route.route.get_nodes()
+        for i in range(len(nodes) // 2):
+            truck_route.drive_to_next_address()
+            truck_route.arrive(current_time)
+        truck_route.drive_to_next_address()
+        on_road.extend(node.package_id for node in nodes[len(nodes) // 2 + 1:])
+
+    generator = random.Random(seed)
+    rerouter = Rerouter(data, truck_routes)
+    for i in range(event_count):
+        address = generator.choice(data.address_list[1:])
+        if i % 2:
+            rerouter.apply(NewPickup(current_time, Package(package_count + i, address, "Salt Lake City", "UT",
+                                                           "84101", "EOD", 1, "")))
+        else:
+            rerouter.apply(AddressCorrection(current_time, generator.choice(on_road), address))
+
+    rebuild_seconds = []
+    for truck_route in list(truck_routes.values())[:200]:
+        packages = [data.lookup_package(node.package_id) for node in truck_route.route.get_nodes()
+                    if not node.visited]
+        start = time.perf_counter()
+        TruckRoute(truck_route.truck_id, data, packages)
+        rebuild_seconds.append(time.perf_counter() - start)
+
+    print("Rerouting,", package_count, "packages,", len(truck_routes), "routes")
+    print("event".ljust(20), "events".rjust(7), "mean us".rjust(9), "p50 us".rjust(9), "p95 us".rjust(9),
+          "max us".rjust(9))
+    for kind in (AddressCorrection.kind, NewPickup.kind, "route rebuild"):
+        if kind == "route rebuild":
+            seconds = sorted(rebuild_seconds)
+        else:
+            seconds = sorted(event_seconds for event_kind, event_seconds in rerouter.latencies if event_kind == kind)
+        print(kind.ljust(20), str(len(seconds)).rjust(7), format(sum(seconds) / len(seconds) * 1e6, ".1f").rjust(9),
+              format(seconds[len(seconds) // 2] * 1e6, ".1f").rjust(9),
+              format(seconds[int(len(seconds) * 0.95)] * 1e6, ".1f").rjust(9), format(seconds[-1] * 1e6, ".1f").rjust(9))
+
+
+# times building the distance matrix from a road graph of about 23,000 intersections,
+# and routing a day's packages over it with every distance found up front and with on-demand rows of a RowCache
+def benchmark_road_graph(address_counts=(27, 100), package_count=100):
+    print("Road graph distance matrix")
+    print("addresses".rjust(10), "nodes".rjust(8), "seconds".rjust(9))
+    for address_count in address_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            write_city_files(directory, address_count, 1, 0)
+            graph = read_road_graph(write_road_file(directory, address_count, 0))
+        addresses = [name for name in graph.node_names if not name.startswith("X")]
+        start = time.perf_counter()
+        build_road_distance_matrix(graph, addresses)
+        print(str(len(addresses)).rjust(10), str(graph.node_count()).rjust(8),
+              format(time.perf_counter() - start, ".3f").rjust(9))
+
+    print("Routing", package_count, "packages over", address_counts[-1], "addresses")
+    print("rows".rjust(10), "searches".rjust(9), "hit rate".rjust(9), "seconds".rjust(9), "miles".rjust(9))
+    with tempfile.TemporaryDirectory() as directory:
+        address_file, distance_file, package_file = write_city_files(directory, address_counts[-1], package_count, 0)
+        road_file = write_road_file(directory, address_counts[-1], 0)
+        for road_rows in (None, 16, 64):
+            start = time.perf_counter()
+            data = Data(address_file, None, package_file, road_graph_file=road_file, road_rows=road_rows)
+            truck_plans = [TruckPlan(truck_id, 16, 8 * 60) for truck_id in range(1, package_count // 12 + 2)]
+            loads = AssignmentEngine(data).assign(list(data.hash_table), truck_plans)[0]
+            miles = sum(TruckRoute(truck_id, data, load).route.sum_length()
+                        for truck_id, load in loads.items() if load)
+            seconds = time.perf_counter() - start
+            if road_rows:
+                cache = data.distance_matrix
+                searches = cache.misses
+                hit_rate = format(cache.hits / (cache.hits + cache.misses), ".1%")
+            else:
+                searches = data.address_count - 1
+                hit_rate = "-"
+            print(str(road_rows or "all pairs").rjust(10), str(searches).rjust(9), hit_rate.rjust(9),
+                  format(seconds, ".3f").rjust(9), format(miles, ".1f").rjust(9))
+
+
+# drives a route that has not left as DeliveryDay does, and returns the number of packages it delivers
+# after their deadline, the minutes they are late by in all, and the miles it drives
+def count_late(truck_route: TruckRoute, departure_time):
+    arrival_time = truck_route.drive_from(departure_time, departing=True)
+    while truck_route.arrive(arrival_time) is not None:
+        arrival_time = truck_route.drive_from(arrival_time)
+    late = 0
+    late_minutes = 0
+    departure_minutes = departure_time.hour * 60 + departure_time.minute
+    for node in truck_route.route.get_nodes():
+        package = truck_route.data.lookup_package(node.package_id)
+        deadline = package.get_deadline_minutes()
+        # from the departure time, as a long route is still driving after midnight
+        delivery_minutes = departure_minutes + int((package.get_status_value() - departure_time).total_seconds()) // 60
+        if deadline is not None and delivery_minutes > deadline:
+            late += 1
+            late_minutes += delivery_minutes - deadline
+    return late, late_minutes, truck_route.route.sum_length()
+
+
+# builds one route of N stops, a third of them with deadlines spread over the time a nearest neighbour route takes,
+# by nearest neighbour and by TimeWindowRouteBuilder, without and with a RouteOptimizer after, drives it,
+# and compares their time, lateness and miles, with the packages the builder reports late,
+# which should be those the drive delivers late
+def benchmark_time_windows(stop_counts=(16, 100, 300), seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_city_files(directory, max(stop_counts) + 1, 1, seed)
+        city_data = Data(files[0], files[1], None)
+    departure_time = parse_time("0600")
+    generator = random.Random(seed)
+    print("Time windows, one route")
+    print("stops".rjust(6), "builder".ljust(16), "ms".rjust(9), "late".rjust(6), "reported".rjust(9),
+          "late min".rjust(9), "miles".rjust(9))
+    for stop_count in stop_counts:
+        data = city_data.copy()
+        packages = [Package(i, data.address_list[i], "Salt Lake City", "UT", "84101", "EOD", 1, "")
+                    for i in range(1, stop_count + 1)]
+        route_minutes = TruckRoute(1, data, list(packages)).route.sum_length() * 60 / 18
+        for i in range(stop_count):
+            if generator.random() < 1 / 3:
+                minutes = min(23 * 60 + 59, 7 * 60 + generator.randrange(int(route_minutes)))
+                deadline = datetime.time(minutes // 60, minutes % 60).strftime("%I:%M %p")
+                packages[i] = Package(i + 1, packages[i].get_address(), "Salt Lake City", "UT", "84101", deadline, 1, "")
+            data.hash_table.insert(packages[i])
+
+        for label, route_builder, optimizer in (("nearest", None, None),
+                                                ("time windows", TimeWindowRouteBuilder(data), None),
+                                                ("windows, 2-opt", TimeWindowRouteBuilder(data), RouteOptimizer(data))):
+            start = time.perf_counter()
+            truck_route = TruckRoute(1, data, list(packages), optimizer, departure_time,
+                                     route_builder=route_builder)
+            seconds = time.perf_counter() - start
+            late, late_minutes, miles = count_late(truck_route, departure_time)
+            reported = str(len(route_builder.reports)) if route_builder and not optimizer else "-"
+            print(str(stop_count).rjust(6), label.ljust(16), format(seconds * 1000, ".1f").rjust(9),
+                  str(late).rjust(6), reported.rjust(9), str(late_minutes).rjust(9), format(miles, ".1f").rjust(9))
+
+
+# returns the miles left on a route that has not left, the minutes to reach the given package
+# and the least slack of its deadlines, by walking the route, as these were found before routes kept their miles
+def walk_route_queries(truck_route: TruckRoute, package_id):
+    data = truck_route.data
+    departure_minutes = truck_route.departure_time.hour * 60 + truck_route.departure_time.minute
+    miles = 0.0
+    eta_minutes = None
+    slack = None
+    previous_index = truck_route.hub_index
+    for node in truck_route.route.get_nodes():
+        miles += data.get_distance_by_index(previous_index, node.address_index)
+        previous_index = node.address_index
+        if node.package_id == package_id:
+            eta_minutes = miles / truck_route.MILES_PER_MINUTE
+        deadline = data.lookup_package(node.package_id).get_deadline_minutes()
+        if deadline is not None:
+            node_slack = deadline - departure_minutes - miles / truck_route.MILES_PER_MINUTE
+            slack = node_slack if slack is None else min(slack, node_slack)
+    miles += data.get_distance_by_index(previous_index, truck_route.hub_index)
+    return miles, eta_minutes, slack
+
+
+# times the miles remaining, ETA and deadline slack queries on one route, walking it against reading the miles
+# each node keeps, and the cost of keeping them as a stop is inserted near the start of the route
+def benchmark_route_queries(stop_counts=(16, 100, 1_000), query_count=1_000, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_city_files(directory, max(stop_counts) + 2, 1, seed)
+        city_data = Data(files[0], files[1], None)
+    departure_time = parse_time("0800")
+    generator = random.Random(seed)
+    print("Route queries,", query_count, "of each")
+    print("stops".rjust(6), "walk us".rjust(9), "kept us".rjust(9), "insert us".rjust(10))
+    for stop_count in stop_counts:
+        data = city_data.copy()
+        packages = []
+        for i in range(1, stop_count + 1):
+            deadline = "10:30 AM" if generator.random() < 1 / 3 else "EOD"
+            packages.append(Package(i, data.address_list[i], "Salt Lake City", "UT", "84101", deadline, 1, ""))
+            data.hash_table.insert(packages[-1])
+        truck_route = TruckRoute(1, data, list(packages), departure_time=departure_time)
+        package_ids = [generator.randrange(1, stop_count + 1) for i in range(query_count)]
+
+        start = time.perf_counter()
+        walked = [walk_route_queries(truck_route, package_id) for package_id in package_ids]
+        walk_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        kept = [(truck_route.get_miles_remaining(), truck_route.get_eta(package_id), truck_route.get_deadline_slack())
+                for package_id in package_ids]
+        kept_seconds = time.perf_counter() - start
+        for (miles, eta_minutes, slack), (kept_miles, eta, kept_slack) in zip(walked, kept):
+            assert math.isclose(miles, kept_miles)
+            assert math.isclose(eta_minutes, (eta - departure_time).total_seconds() / 60)
+            assert slack is None or math.isclose(slack, kept_slack, abs_tol=1e-9)
+
+        # a stop moved back and forth after the first, with the slack asked for after each move
+        node = truck_route.route.head.next
+        start = time.perf_counter()
+        for i in range(query_count):
+            truck_route.route.remove(node)
+            truck_route.route.insert_after(truck_route.route.head, node)
+            truck_route.get_deadline_slack()
+        insert_seconds = time.perf_counter() - start
+        print(str(stop_count).rjust(6), format(walk_seconds / query_count * 1e6, ".1f").rjust(9),
+              format(kept_seconds / query_count * 1e6, ".1f").rjust(9),
+              format(insert_seconds / query_count * 1e6, ".1f").rjust(10))
+
+
+# orders routes of N stops by nearest neighbour and exactly with HeldKarpSolver, and compares their time and miles,
+# and the time to plan the same load again from the solver's cache
+def benchmark_held_karp(stop_counts=(6, 9, 12, 14), route_count=5, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_city_files(directory, 200, 1, seed)
+        city_data = Data(files[0], files[1], None)
+    generator = random.Random(seed)
+    print("Held-Karp,", route_count, "routes of each size")
+    print("stops".rjust(6), "nearest ms".rjust(11), "exact ms".rjust(9), "cached us".rjust(10),
+          "nearest mi".rjust(11), "exact mi".rjust(9))
+    for stop_count in stop_counts:
+        solver = HeldKarpSolver(city_data, max(stop_counts))
+        times = {"nearest": 0.0, "exact": 0.0, "cached": 0.0}
+        miles = {"nearest": 0.0, "exact": 0.0}
+        for route_number in range(route_count):
+            address_indexes = generator.sample(range(1, city_data.address_count), stop_count)
+            packages = [Package(i, city_data.address_list[i], "Salt Lake City", "UT", "84101", "EOD", 1, "")
+                        for i in address_indexes]
+            for label, exact_solver in (("nearest", None), ("exact", solver), ("cached", solver)):
+                start = time.perf_counter()
+                truck_route = TruckRoute(1, city_data, list(packages), exact_solver=exact_solver)
+                times[label] += time.perf_counter() - start
+                if label in miles:
+                    miles[label] += truck_route.route.sum_length()
+        print(str(stop_count).rjust(6), format(times["nearest"] / route_count * 1000, ".2f").rjust(11),
+              format(times["exact"] / route_count * 1000, ".1f").rjust(9),
+              format(times["cached"] / route_count * 1e6, ".1f").rjust(10),
+              format(miles["nearest"] / route_count, ".1f").rjust(11),
+              format(miles["exact"] / route_count, ".1f").rjust(9))
+
+
+# checks the minute HeldKarpSolver predicts each package on a route it orders is delivered in
+# against the minute it is delivered in when the route is driven: on the day main.py simulates,
+# and on random loads of stops with up to three packages each, driven with TruckRoute.drive_from as DeliveryDay does
+def benchmark_held_karp_times(route_count=200, seed=0):
+    def count_differences(solver, truck_route, stops, departure_time):
+        order = solver.solve(truck_route.hub_index, stops, departure_time, truck_route.MPH)
+        if order is None:
+            return None
+        predicted = solver.delivery_minutes(truck_route.hub_index, order, stops, departure_time, truck_route.MPH)
+        differences = 0
+        for package_id, minute in predicted.items():
+            delivery_time = truck_route.data.lookup_package(package_id).get_status_value()
+            if delivery_time.hour * 60 + delivery_time.minute != minute:
+                differences += 1
+        return len(predicted), differences
+
+    print("Held-Karp delivery minutes against the simulation")
+    print("routes".rjust(16), "exact".rjust(6), "packages".rjust(9), "differ".rjust(7))
+
+    day = simulate_day(Data())
+    counts = [0, 0, 0]
+    for route_number, truck_route in day.truck_routes.items():
+        stops = {}
+        for package in day.package_lists[route_number]:
+            stops.setdefault(day.data.get_address_index(package.get_address()), []).append(package)
+        checked = count_differences(day.exact_solver, truck_route, stops, day.departure_times[route_number])
+        if checked:
+            counts = [counts[0] + 1, counts[1] + checked[0], counts[2] + checked[1]]
+    print("main.py day".rjust(16), str(counts[0]).rjust(6), str(counts[1]).rjust(9), str(counts[2]).rjust(7))
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_city_files(directory, 40, 1, seed)
+        city_data = Data(files[0], files[1], None)
+    generator = random.Random(seed)
+    solver = HeldKarpSolver(city_data)
+    departure_time = parse_time("0800")
+    counts = [0, 0, 0]
+    package_id = 0
+    for route_number in range(route_count):
+        packages = []
+        for address_index in generator.sample(range(1, city_data.address_count), generator.randrange(4, 11)):
+            for i in range(generator.randrange(1, 4)):
+                package_id += 1
+                deadline = generator.choice(("9:00 AM", "10:30 AM", "EOD", "EOD"))
+                packages.append(Package(package_id, city_data.address_list[address_index], "Salt Lake City", "UT",
+                                        "84101", deadline, 1, ""))
+        for package in packages:
+            city_data.hash_table.insert(package)
+        stops = {}
+        for package in packages:
+            stops.setdefault(city_data.get_address_index(package.get_address()), []).append(package)
+        truck_route = TruckRoute(1, city_data, list(packages), departure_time=departure_time, exact_solver=solver)
+        arrival_time = truck_route.drive_from(departure_time, departing=True)
+        while truck_route.arrive(arrival_time) is not None:
+            arrival_time = truck_route.drive_from(arrival_time)
+        checked = count_differences(solver, truck_route, stops, departure_time)
+        if checked:
+            counts = [counts[0] + 1, counts[1] + checked[0], counts[2] + checked[1]]
+    print((str(route_count) + " random").rjust(16), str(counts[0]).rjust(6), str(counts[1]).rjust(9),
+          str(counts[2]).rjust(7))
+
+
+# plans the same truck loads on several days through a RoutePlanCache saved between them,
+# with a new HeldKarpSolver each day as each run of main.py has, and reports the hit rate and time per day
+# each day's loads are the same stops in a new package order, and one load in five is new
+def benchmark_route_cache(day_count=4, load_count=40, stop_count=11, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_city_files(directory, 200, 1, seed)
+        city_data = Data(files[0], files[1], None)
+        cache_file = os.path.join(directory, 'route_cache.json')
+        generator = random.Random(seed)
+        loads = [generator.sample(range(1, city_data.address_count), stop_count) for i in range(load_count)]
+        print("Route cache,", load_count, "loads of", stop_count, "stops a day")
+        print("day".rjust(4), "hit rate".rjust(9), "ms".rjust(9), "ms saved".rjust(9))
+        for day in range(day_count):
+            plan_cache = RoutePlanCache(cache_file, files[:2])
+            solver = HeldKarpSolver(city_data)
+            if day > 0:
+                for i in range(0, load_count, 5):
+                    loads[i] = generator.sample(range(1, city_data.address_count), stop_count)
+            start = time.perf_counter()
+            for address_indexes in loads:
+                generator.shuffle(address_indexes)
+                packages = [Package(i, city_data.address_list[i], "Salt Lake City", "UT", "84101", "EOD", 1, "")
+                            for i in address_indexes]
+                TruckRoute(1, city_data, packages, exact_solver=solver, plan_cache=plan_cache)
+            seconds = time.perf_counter() - start
+            plan_cache.save()
+            print(str(day + 1).rjust(4), format(plan_cache.hit_rate(), ".0%").rjust(9),
+                  format(seconds * 1000, ".1f").rjust(9), format(plan_cache.seconds_saved * 1000, ".1f").rjust(9))
+
+
+# loads a manifest into a PackageStore, then compares resuming from it with reading the CSV files again,
+# indexed address and status queries with scans of the hash table, and times staged status writes
+def benchmark_package_store(package_count=100_000, address_count=500, query_count=200, seed=0):
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_city_files(directory, address_count, package_count, seed)
+        store_file = os.path.join(directory, 'packages.db')
+        print("Package store,", package_count, "packages at", address_count, "addresses")
+
+        start = time.perf_counter()
+        data = Data(*files)
+        print("read CSV files".ljust(28), format((time.perf_counter() - start) * 1000, ".1f").rjust(9), "ms")
+        package_store = PackageStore(store_file)
+        start = time.perf_counter()
+        package_store.insert_packages(data.hash_table)
+        print("bulk insert".ljust(28), format((time.perf_counter() - start) * 1000, ".1f").rjust(9), "ms")
+        package_store.close()
+
+        package_store = PackageStore(store_file)
+        start = time.perf_counter()
+        stored_data = Data(files[0], files[1], files[2], package_store=package_store)
+        print("resume from store".ljust(28), format((time.perf_counter() - start) * 1000, ".1f").rjust(9), "ms")
+
+        generator = random.Random(seed)
+        addresses = [generator.choice(data.address_list) for i in range(query_count)]
+        for label, query_data in (("address query, scan", data), ("address query, index", stored_data)):
+            start = time.perf_counter()
+            for address in addresses:
+                list(query_data.find_packages(address=address, status_code=PackageStatus.AT_HUB))
+            print(label.ljust(28), format((time.perf_counter() - start) / query_count * 1e6, ".1f").rjust(9), "us")
+
+        packages = list(stored_data.hash_table)
+        start = time.perf_counter()
+        for package in packages:
+            package.load_package()
+            stored_data.stage_packages([package])
+        package_store.commit()
+        seconds = time.perf_counter() - start
+        print("staged status writes".ljust(28), format(seconds / package_count * 1e6, ".2f").rjust(9), "us,",
+              package_store.batches_written, "batches")
+        package_store.close()
+
+
+# writes package and truck checkpoints at every half hour of the day from one simulation,
+# against simulating the day again for each checkpoint as separate runs of main.py would
+def benchmark_checkpoints():
+    times = [parse_time("0800") + datetime.timedelta(minutes=30 * i) for i in range(19)]
+    print("Checkpoints,", len(times), "times")
+    print("approach".ljust(16), "ms".rjust(9))
+
+    start = time.perf_counter()
+    day = simulate_day(Data())
+    with open(os.devnull, 'w', newline='') as output:
+        write_checkpoints(day, StatusTimeline(day), times, CsvCheckpointWriter(output))
+    print("one pass".ljust(16), format((time.perf_counter() - start) * 1000, ".1f").rjust(9))
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w', newline='') as output:
+        writer = CsvCheckpointWriter(output)
+        for checkpoint_time in times:
+            day = simulate_day(Data(), checkpoint_time)
+            write_checkpoints(day, StatusTimeline(day), [checkpoint_time], writer)
+    print("run per time".ljust(16), format((time.perf_counter() - start) * 1000, ".1f").rjust(9))
+
+
+# returns the KiB of memory only this process uses, from /proc/self/smaps_rollup, or None where there is none
+def private_kib():
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            return sum(int(line.split()[1]) for line in smaps if line.startswith(("Private_Clean", "Private_Dirty")))
+    except OSError:
+        return None
+
+
+# the work of one worker of benchmark_shared_tables: build its own Data from the files, or attach to shared tables,
+# read every package's status and address, and report its private memory
+def run_table_worker(source, results):
+    data = source.attach_data() if isinstance(source, SharedTables) else Data(*source)
+    status_counts = {}
+    for package in data.hash_table:
+        data.get_address_index(package.get_address())
+        status_counts[package.get_status_code()] = status_counts.get(package.get_status_code(), 0) + 1
+    results.put(private_kib())
+
+
+# compares the memory of workers that each build their own Data with workers attached to one SharedTables
+def benchmark_shared_tables(worker_counts=(1, 2, 4), package_count=100_000, address_count=1_000):
+    if private_kib() is None:
+        print("Shared tables: needs /proc/self/smaps_rollup to measure private memory")
+        return
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_city_files(directory, address_count, package_count, 0)
+        tables = SharedTables.publish(Data(*files), lock=context.Lock())
+        block_kib = tables.memory.size // 1024
+        print("Shared tables,", package_count, "packages,", address_count, "addresses, block", block_kib, "KiB")
+        print("workers".rjust(8), "tables".ljust(8), "private MiB".rjust(12), "total MiB".rjust(10))
+        for worker_count in worker_counts:
+            for label, source in (("own", files), ("shared", tables)):
+                results = context.Queue()
+                workers = [context.Process(target=run_table_worker, args=(source, results))
+                           for i in range(worker_count)]
+                for worker in workers:
+                    worker.start()
+                private = [results.get() for worker in workers]
+                for worker in workers:
+                    worker.join()
+                total_kib = sum(private) + (block_kib if label == "shared" else 0)
+                print(str(worker_count).rjust(8), label.ljust(8), format(sum(private) / worker_count / 1024, ".1f").rjust(12),
+                      format(total_kib / 1024, ".1f").rjust(10))
+        tables.close()
+        tables.unlink()
+
+
+# loads cities of growing address counts from coordinates and from a distance matrix, where it fits,
+# and compares the memory loaded, the time to fill the package lists, the time per nearest-package search
+# and the distances kept afterwards
+# the matrix grows with the square of the addresses, the coordinates and grid only linearly
+def benchmark_spatial_index(address_counts=(1_000, 10_000, 100_000), package_count=2_000, query_count=200,
+                            matrix_limit=2_000):
+    print("Spatial index,", package_count, "packages,", query_count, "nearest searches over 50 packages")
+    print("addresses".rjust(10), "source".rjust(12), "MiB".rjust(8), "fill ms".rjust(9), "us/search".rjust(10),
+          "kept".rjust(9))
+    for address_count in address_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            address_file, distance_file, package_file = write_city_files(
+                directory, address_count, package_count, 0, address_count <= matrix_limit)
+            for coordinates in (None, "grid"):
+                if coordinates is None and distance_file is None:
+                    continue
+                gc.collect()
+                tracemalloc.start()
+                data = Data(address_file, distance_file, package_file, coordinates=coordinates)
+                memory = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+
+                start = time.perf_counter()
+                data.determine_package_lists()
+                fill_seconds = time.perf_counter() - start
+
+                generator = random.Random(0)
+                packages = list(data.hash_table)
+                searches = [(generator.randrange(address_count), generator.sample(packages, 50))
+                            for i in range(query_count)]
+                start = time.perf_counter()
+                for current_index, candidates in searches:
+                    data.find_nearest_in_by_index(current_index, candidates)
+                search_seconds = time.perf_counter() - start
+
+                kept = len(data.distance_matrix.distances) if isinstance(data.spatial_index, UniformGrid) \
+                    else address_count * address_count
+                print(str(address_count).rjust(10), (coordinates or "matrix").rjust(12),
+                      format(memory / 2 ** 20, ".1f").rjust(8), format(fill_seconds * 1000, ".1f").rjust(9),
+                      format(search_seconds / query_count * 1e6, ".1f").rjust(10), str(kept).rjust(9))
+                del data, packages, searches
+
+
+# times building one nearest neighbour route over every package, a few hundred stops,
+# in cities of a few hundred and a few thousand addresses, from a distance matrix and from a grid index
+# the time should follow the number of stops, not the number of addresses
+def benchmark_nearest_stops(address_counts=(400, 5_000), package_count=300, seed=0):
+    print("Nearest stops,", package_count, "packages on one route")
+    print("addresses".rjust(10), "source".rjust(8), "stops".rjust(6), "ms".rjust(9), "miles".rjust(9))
+    for address_count in address_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            address_file, distance_file, package_file = write_city_files(directory, address_count, package_count,
+                                                                         seed)
+            for coordinates in (None, "grid"):
+                data = Data(address_file, distance_file, package_file, coordinates=coordinates)
+                packages = list(data.hash_table)
+                stop_count = len({package.get_address() for package in packages})
+                gc.collect()
+                start = time.perf_counter()
+                truck_route = TruckRoute(1, data, packages)
+                seconds = time.perf_counter() - start
+                print(str(address_count).rjust(10), (coordinates or "matrix").rjust(8), str(stop_count).rjust(6),
+                      format(seconds * 1000, ".1f").rjust(9), format(truck_route.route.sum_length(), ".1f").rjust(9))
+                del data, packages, truck_route
+
+
+BENCHMARKS = {
+    "package_table": benchmark_package_table,
+    "package_memory": benchmark_package_memory,
+    "streaming_ingest": benchmark_streaming_ingest,
+    "startup": benchmark_startup,
+    "assignment": benchmark_assignment,
+    "status_queries": benchmark_status_queries,
+    "distance_kernels": benchmark_distance_kernels,
+    "instrumentation": benchmark_instrumentation,
+    "pipeline": benchmark_pipeline,
+    "rerouting": benchmark_rerouting,
+    "road_graph": benchmark_road_graph,
+    "time_windows": benchmark_time_windows,
+    "checkpoints": benchmark_checkpoints,
+    "shared_tables": benchmark_shared_tables,
+    "spatial_index": benchmark_spatial_index,
+    "route_queries": benchmark_route_queries,
+    "held_karp": benchmark_held_karp,
+    "held_karp_times": benchmark_held_karp_times,
+    "route_cache": benchmark_route_cache,
+    "package_store": benchmark_package_store,
+    "nearest_stops": benchmark_nearest_stops,
+}
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
@@ -6,6 +6,14 @@
 from Package import Package
 from TruckRoute import TruckRoute
 from Data import Data
+from Scheduler import DeliveryDay
+from RouteOptimizer import RouteOptimizer
+from TimeWindows import TimeWindowRouteBuilder
+from RouteCache import RoutePlanCache
+from StatusService import StatusTimeline
+from Instrumentation import Instrumentation
+from Checkpoints import write_checkpoints, make_checkpoint_writer
+from Scenarios import parse_time
 import datetime
 
 # important times
@@ -16,37 +24,75 @@ nine_o_five_am = datetime.datetime(2022, 1, 1, 9, 5)
 ten_twenty_am = datetime.datetime(2022, 1, 1, 10, 20)
 five_pm = datetime.datetime(2022, 1, 1, 18, 0)
 
-# the start of the day
-time = eight_am
-
-# flags used to print different data for debugging
-print_route = False
+# flags used to print different data
 print_packages = True
-annotate_route = False
 input_mode = True
 print_all = False
 input_ID_int = None
 
+# when set, routes are shortened with 2-opt and Or-opt moves before each truck leaves
+optimize_routes = False
+optimize_time_budget = 0.5
+
+# routes with at most this many distinct stops are ordered exactly, as the shortest order with no package late,
+# and longer routes by nearest neighbour; 0 orders every route by nearest neighbour, see HeldKarp.py
+exact_stop_limit = 12
+
+# when set, such as to "route_cache.json", the visit order of each truck load is kept in route_cache_file,
+# and a load with the same stops, depot and departure time is given the same order on later runs
+# without planning it again, and a summary of the cache's hits and misses is printed, see RouteCache.py
+# the cache holds the route_cache_size most recently used plans, and is emptied whenever the distances change
+route_cache_file = None
+route_cache_size = 1000
+
+# when set, routes are built by inserting stops so that packages are delivered by their deadlines where they can be
+# for no more than a few extra miles each, and packages that would still be late are printed,
+# instead of by nearest neighbour, see TimeWindows.py
+deadline_routes = False
+
+# "python", or "numpy" to search and measure routes with NumPy; "auto" uses NumPy when it is installed
+distance_backend = "python"
+
+# when set, distances are the shortest paths over this road graph edge list instead of distance_data.csv,
+# for only the addresses in package_data.csv, see RoadGraph.py
+# with road_rows set too, the shortest paths are found as the routes need them instead of all at once,
+# keeping those from the road_rows addresses routed from most recently, see RowCache in RoadGraph.py
+road_graph_file = None
+road_rows = None
+
+# when set to "xy", "grid" or "latlon", distances are computed from the coordinates after each address
+# in address_list.csv as they are needed, with a grid index for nearest searches, see SpatialIndex.py
+coordinates = None
+
+# when set, the state of every package and truck at each of these HHMM times is written to checkpoint_file,
+# as CSV or, for a .jsonl file, as JSON Lines, from the one simulation of the day, see Checkpoints.py
+checkpoint_times = []
+checkpoint_file = "checkpoints.csv"
+
+# when set, hot paths are timed and each truck's miles, stops, idle minutes, deliveries and events
+# are written to instrumentation_report, as JSON or, for a .prom file, in the Prometheus text format
+instrument = False
+instrumentation_report = "instrumentation.json"
+
 # O(N^2)
 if __name__ == '__main__':
 
-    Data = Data()
+    instruments = Instrumentation()
+    if instrument:
+        instruments.enable()
+
+    # the parsed CSV files are cached in data_snapshot.bin, and parsed again whenever they change
+    with instruments.phase("ingestion"):
+        Data = Data(snapshot_file='data_snapshot.bin', kernel_backend=distance_backend,
+                    road_graph_file=road_graph_file, road_rows=road_rows, coordinates=coordinates)
 
     Data.lookup_package(9).status = "on hold"
 
     # Sorts the packages into multiple lists to be given to trucks
     # the order of the route is determined later
-    Data.determine_package_lists()  # O(N^2)
-
-    # placeholders for objects used in while loop below
-    truck_route1 = None
-    truck_route2 = None
-    truck_route3 = None
-    truck_route4 = None
-    list1 = None
-    list2 = None
-    list3 = None
-    list4 = None
+    with instruments.phase("assignment"):
+        Data.determine_package_lists()  # O(N^2)
+
     total_distance = 0.0
 
     if input_mode:
@@ -67,127 +113,67 @@ if __name__ == '__main__':
     else:
         input_time = five_pm
 
-    # the main thread that runs until the end of the day
-    while time <= five_pm:
-        p9: Package = Data.lookup_package(9)
-
-        # at 8 am Truck 1 is sent
-        if time == eight_am:
-            if annotate_route:
-                print(datetime.datetime.strftime(time, "%H:%M"), end=": ")
-                print("Send truck 1")
-            list1 = Data.package_list1.copy()
-            truck_route1 = TruckRoute(1, Data, Data.package_list1)
-
-        # at 9:05 truck 3 is sent
-        if time == nine_o_five_am:
-            if annotate_route:
-                print(datetime.datetime.strftime(time, "%H:%M"), end=": ")
-                print("Send truck 3")
-            list3 = Data.package_list3.copy()
-            truck_route3 = TruckRoute(3, Data, Data.package_list3)
-
-        # if truck 1 has returned and truck 2 hasn't been initialized yet,
-        # truck 2 is sent
-        if truck_route1.at_hub and truck_route2 is None:
-            if annotate_route:
-                print(datetime.datetime.strftime(time, "%H:%M"), end=": ")
-                print("Send truck 2")
-            list2 = Data.package_list2.copy()
-            truck_route2 = TruckRoute(2, Data, Data.package_list2)
-
-        # at 10:20 the address for package 9 is corrected and loaded into a package list
-        if time == ten_twenty_am:
-            if annotate_route:
-                print(datetime.datetime.strftime(time, "%H:%M"), end=": ")
-                print("Package 9 address updated")
-            p9.set_address("410 S State St")
-            Data.load_package(p9, Data.package_list3)
-            list4 = Data.package_list3.copy()
-
-        # if truck 3 has returned to hub,
-        # it will deliver package 9
-        if truck_route3:
-            if truck_route3.at_hub and p9.status == "At hub":
-                if annotate_route:
-                    print(datetime.datetime.strftime(time, "%H:%M"), end=": ")
-                    print("Send truck 3 again")
-                truck_route4 = TruckRoute(3, Data, Data.package_list3)
-
-        # once all trucks have returned, the day is over
-        if truck_route4:
-            if truck_route1.at_hub and truck_route2.at_hub and truck_route3.at_hub and truck_route4.at_hub:
-                print("Every package delivered and truck returned to hub at", datetime.datetime.strftime(time, "%H:%M"))
-                break
-
-        # update truck statuses before incrementing time or breaking out of while loop
-        # determine truck distance to next location
-        # decrement distance per 1 minute
-        # if distance reaches 0
-        # unload package and subtract remaining distance decrement to next trip
-        if truck_route1:
-            truck_route1.increment(time)
-        if truck_route2:
-            truck_route2.increment(time)
-        if truck_route3:
-            truck_route3.increment(time)
-        if truck_route4:
-            truck_route4.increment(time)
-        if time == input_time:
-            # print(datetime.datetime.strftime(time, "%H: %M"))
-            break
-        # increment time of day
-        time += datetime.timedelta(0, 60)
-        # print(time)
+    # the day is simulated once, as a sequence of truck departures, arrivals and returns
+    # rather than minute by minute, and the status at the input time is read from its timeline
+    # a time before the start of the day is never reached, so the end of the day is shown
+    if input_time < eight_am:
+        input_time = five_pm
+    optimizer = RouteOptimizer(Data, optimize_time_budget) if optimize_routes else None
+    route_builder = TimeWindowRouteBuilder(Data) if deadline_routes else None
+    plan_cache = None
+    if route_cache_file:
+        plan_cache = RoutePlanCache(route_cache_file, ['address_list.csv', road_graph_file or 'distance_data.csv'],
+                                    route_cache_size)
+    day = DeliveryDay(Data, eight_am, nine_o_five_am, ten_twenty_am, five_pm,
+                      instruments=instruments, optimizer=optimizer, route_builder=route_builder,
+                      exact_stop_limit=exact_stop_limit, plan_cache=plan_cache)
+    with instruments.phase("simulation"):
+        day.run()  # O(N^2)
+    if plan_cache:
+        plan_cache.save()
+    with instruments.phase("timeline"):
+        timeline = StatusTimeline(day)  # O(E)
+    instruments.record_day(day)
+
+    if checkpoint_times:
+        with instruments.phase("checkpoints"), open(checkpoint_file, mode='w', encoding='utf-8', newline='') as output:
+            write_checkpoints(day, timeline, sorted(parse_time(hhmm) for hhmm in checkpoint_times),
+                              make_checkpoint_writer(output, checkpoint_file))
+
+    # once all trucks have returned, the day is over
+    if day.is_finished_at(input_time):
+        print("Every package delivered and truck returned to hub at",
+              datetime.datetime.strftime(day.finish_time, "%H:%M"))
 
     if print_packages:
         if print_all:
-            Data.print_all()
+            Data.print_all(timeline, input_time)
         else:
             if input_ID_int:
-                Data.print_package(input_ID_int)
-    if print_route:
-        if list1:
-            print("truck 1")
-            for package in list1:
-                print(package.get_id(), "|", end=" ")
-                print(datetime.datetime.strftime(package.delivery_time, "%H:%M"), end=" ")
-                print("|", package.deadline, end=" ")
-                print("|", package.note)
-            print("----------")
-        if list2:
-            print("truck 2")
-            for package in list2:
-                print(package.get_id(), "|", end=" ")
-                print(datetime.datetime.strftime(package.delivery_time, "%H:%M"), end=" ")
-                print("|", package.deadline, end=" ")
-                print("|", package.note)
-            print("----------")
-        if list3:
-            print("truck 3")
-            for package in list3:
-                print(package.get_id(), "|", end=" ")
-                print(datetime.datetime.strftime(package.delivery_time, "%H:%M"), end=" ")
-                print("|", package.deadline, end=" ")
-                print("|", package.note)
-            print("----------")
-        if list4:
-            print("truck 3")
-            for package in list4:
-                print(package.get_id(), "|", end=" ")
-                if package.delivery_time != -1:
-                    print(datetime.datetime.strftime(package.delivery_time, "%H:%M"), end=" ")
-                print("|", package.deadline, end=" ")
-                print("|", package.note)
-            print("----------")
+                Data.print_package(input_ID_int, timeline, input_time)
     print("Distance:")
 
-    if truck_route1:
-        total_distance += truck_route1.route.sum_length()
-    if truck_route2:
-        total_distance += truck_route2.route.sum_length()
-    if truck_route3:
-        total_distance += truck_route3.route.sum_length()
-    if truck_route4:
-        total_distance += truck_route4.route.sum_length()
+    # the distance of every route that had left by the input time, in route order
+    for route_number in sorted(day.truck_routes):
+        truck_route = day.get_truck_route(route_number, input_time)
+        if truck_route:
+            total_distance += truck_route.route.sum_length()
     print(total_distance)
+
+    if optimizer:
+        print("Route optimization:")
+        for truck_id, pass_name, before, after in optimizer.reports:
+            print("truck", truck_id, "|", pass_name, "|", round(before, 1), "->", round(after, 1))
+
+    if route_builder:
+        print("Late packages:")
+        for truck_id, package_id, deadline, arrival in route_builder.reports:
+            print("truck", truck_id, "| package", package_id, "| due", str(deadline // 60) + ":" + str(deadline % 60).zfill(2),
+                  "| arrives", str(int(arrival) // 60) + ":" + str(int(arrival) % 60).zfill(2))
+
+    if plan_cache:
+        print(plan_cache.summary())
+
+    if instrument:
+        instruments.disable()
+        instruments.write_report(instrumentation_report)